@@ -32,6 +32,12 @@ def expand_user_path(path_str: str) -> str:
     
     return path_str
 
+def get_cache_dir() -> Path:
+    """获取缓存目录，可通过 cache_path 环境变量覆盖，默认为 ~/.think-mcp-server/cache。"""
+    cache_dir = Path(expand_user_path(os.getenv('cache_path') or '~/.think-mcp-server/cache'))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
 def create_file_if_not_exists(file_path: Path, content: str):
     """如果文件不存在，则创建文件并写入内容。"""
     if file_path.exists():
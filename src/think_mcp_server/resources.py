@@ -1,12 +1,14 @@
 """Resource management module."""
 from pathlib import Path
 import os
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict
 import mcp.types as types
 from pydantic import AnyUrl
 import yaml
 import urllib.parse
 from think_llm_client.utils.logger import logging
+from .tools.article_analysis import ARTICLE_URI_SCHEME, resolve_article_uri
+from .tools.ffmpeg_capabilities import CAPABILITIES_URI, FFMPEG_URI_SCHEME, capabilities_resource_text
 
 # 获取模块的日志记录器
 logger = logging.getLogger("think-mcp-server")
@@ -31,15 +33,13 @@ def parse_frontmatter(content: str) -> tuple[Optional[Dict], str]:
         logger.warning("Failed to parse frontmatter in content")
         return None, content
 
-def list_resources() -> List[types.Resource]:
-    """List available resources from resources directory."""
-    resources = []
-
+def iter_resource_files() -> Iterator[Path]:
+    """Yield the files of every directory listed in resources_path."""
     # 从环境变量获取资源目录路径
     resources_path = os.getenv('resources_path', '')
     if not resources_path:
         logger.warning("resources_path not set in .env file")
-        return resources
+        return
 
     # 处理所有的资源目录
     for resource_dir in resources_path.split(','):
@@ -53,34 +53,49 @@ def list_resources() -> List[types.Resource]:
             logger.warning(f"资源目录不存在: {resource_dir}")
             continue
 
-        # 添加资源目录中的文件
         for file_path in sorted(base_dir.glob("*")):
             if file_path.is_file():
-                absolute_path = file_path.absolute()
-                try:
-                    content = file_path.read_text(encoding='utf-8')
-                    frontmatter, _ = parse_frontmatter(content)
-                    
-                    # 使用文件名作为资源名称，确保它是解码后的
-                    file_name = file_path.name
-                    decoded_file_name = urllib.parse.unquote(file_name)
-                    
-                    description = (
-                        frontmatter.get('description', f"Resource file: {decoded_file_name}")
-                        if frontmatter else f"Resource file: {decoded_file_name}"
-                    )
-                    
-                    resources.append(
-                        types.Resource(
-                            uri=AnyUrl(f"file://{absolute_path}"),
-                            name=decoded_file_name,
-                            description=description,
-                            mimeType="text/plain",
-                        )
-                    )
-                except Exception as e:
-                    logger.warning(f"处理文件 {file_path} 失败: {e}")
+                yield file_path
+
+def list_resources() -> List[types.Resource]:
+    """List available resources from resources directory."""
+    resources = []
 
+    # 添加资源目录中的文件
+    for file_path in iter_resource_files():
+        absolute_path = file_path.absolute()
+        try:
+            content = file_path.read_text(encoding='utf-8')
+            frontmatter, _ = parse_frontmatter(content)
+            
+            # 使用文件名作为资源名称，确保它是解码后的
+            file_name = file_path.name
+            decoded_file_name = urllib.parse.unquote(file_name)
+            
+            description = (
+                frontmatter.get('description', f"Resource file: {decoded_file_name}")
+                if frontmatter else f"Resource file: {decoded_file_name}"
+            )
+            
+            resources.append(
+                types.Resource(
+                    uri=AnyUrl(f"file://{absolute_path}"),
+                    name=decoded_file_name,
+                    description=description,
+                    mimeType="text/plain",
+                )
+            )
+        except Exception as e:
+            logger.warning(f"处理文件 {file_path} 失败: {e}")
+
+    resources.append(
+        types.Resource(
+            uri=AnyUrl(CAPABILITIES_URI),
+            name="ffmpeg capabilities",
+            description="ffmpeg/ffprobe 的路径、版本、可用的编码器和封装格式（缓存结果，URI 加 ?refresh=true 重新检测）",
+            mimeType="application/json",
+        )
+    )
     return sorted(resources, key=lambda x: x.name)
 
 def read_resource(uri: AnyUrl) -> str:
@@ -104,5 +119,19 @@ def read_resource(uri: AnyUrl) -> str:
         logger.error(f"File not found: {decoded_path}")
         raise ValueError(f"File not found: {decoded_path}")
     
+    if uri.scheme == ARTICLE_URI_SCHEME:
+        file_path = Path(resolve_article_uri(uri.path or ""))
+        if file_path.is_file():
+            logger.info(f"Found article at {file_path}")
+            return file_path.read_text(encoding='utf-8')
+
+        logger.error(f"Article not found: {file_path}")
+        raise ValueError(f"Article not found: {uri}")
+
+    if uri.scheme == FFMPEG_URI_SCHEME:
+        query = urllib.parse.parse_qs(uri.query or "")
+        refresh = query.get("refresh", ["false"])[0].lower() in ("1", "true", "yes")
+        return capabilities_resource_text(refresh)
+
     logger.error(f"Unsupported URI scheme: {uri.scheme}")
     raise ValueError(f"Unsupported URI scheme: {uri.scheme}")
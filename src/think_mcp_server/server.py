@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 """MCP Server implementation."""
+import asyncio
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -12,6 +13,7 @@ from pydantic import AnyUrl
 from think_llm_client.utils.logger import logging
 from . import tools, prompts, resources
 from .init import ensure_user_config_files
+from .tools.ffmpeg_capabilities import ensure_ffmpeg_capabilities
 
 # 获取日志记录器
 logger = logging.getLogger("think-mcp-server")
@@ -40,7 +42,8 @@ async def handle_list_resources() -> list[types.Resource]:
 async def handle_read_resource(uri: AnyUrl) -> str:
     """Read a specific resource's content by its URI."""
     logger.debug("Reading resource: %s", uri)
-    return resources.read_resource(uri)
+    # 读取文件或刷新 ffmpeg 能力信息都可能较慢，放到线程中执行
+    return await asyncio.to_thread(resources.read_resource, uri)
 
 
 @server.list_prompts()
@@ -72,7 +75,17 @@ async def handle_call_tool(
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Handle tool execution requests."""
     logger.debug("Calling tool: %s with arguments: %s", name, arguments)
-    return await tools.call_tool(name, arguments, server.request_context.session)
+    request_context = server.request_context
+    progress_token = request_context.meta.progressToken if request_context.meta else None
+    return await tools.call_tool(name, arguments, request_context.session, progress_token)
+
+
+async def _detect_ffmpeg() -> None:
+    """Detect ffmpeg capabilities in the background so tool calls find them cached."""
+    try:
+        await ensure_ffmpeg_capabilities()
+    except Exception as e:
+        logger.warning("ffmpeg capability detection failed: %s", str(e))
 
 
 async def main():
@@ -83,16 +96,21 @@ async def main():
     except PackageNotFoundError:
         server_version = "0.2.0"
     logger.info("Server version: %s", server_version)
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="think-mcp-server",
-                server_version=server_version,
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    # 在后台检测一次 ffmpeg 能力并缓存，之后的请求不再启动探测进程
+    detect_task = asyncio.create_task(_detect_ffmpeg())
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="think-mcp-server",
+                    server_version=server_version,
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        detect_task.cancel()
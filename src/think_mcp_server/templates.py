@@ -11,9 +11,61 @@ resources_path=~/.think-mcp-server/resources
 # 文章分析工具配置
 article_base_path=~/src_code/nas/knowledge/Articles
 max_tokens_limit=89600
+# 文章挑选策略：greedy、exact、approx、recency、auto
+article_packing_strategy=auto
+# 近似重复检测及其相似度阈值
+article_dedup=false
+article_dedup_threshold=0.8
+# related_content 工具的向量维度，修改后会重建向量索引（需要安装 numpy）
+related_content_dim=4096
+token_cache_max_entries=200000
+# 并行统计 token 的进程数，0 表示使用 CPU 核数
+tokenizer_workers=0
+# 估算模式下每种语言用于校准的精确统计样本数
+token_calibration_samples=32
 
 # 内容分析工具配置
 content_analyzer_prompt_path=~/.think-mcp-server/resources/tool_content_analyzer_prompt.md
+# 目录模式下同时分析的文件数
+content_analyzer_concurrency=4
+# 目录模式下把小文件合并为一个请求时每个请求的 token 上限，0 表示不合并
+content_analyzer_batch_tokens=0
+# 正文超过该 token 数时分段摘要后再归约，0 表示不分段；以及单个文件分段摘要的并发数
+content_analyzer_chunk_tokens=24000
+content_analyzer_chunk_concurrency=4
+# 单个请求的输出 token 上限（按 tokenizer 计数，达到后截断），以及流式输出停顿多少秒后放弃请求
+content_analyzer_max_output_tokens=4096
+content_analyzer_stream_idle_timeout=120
+# 内容分析的模型路由，格式为 类型/供应商/模型：输入不超过 small_max_tokens 的请求使用 small 模型（为空时不分流），
+# 其余使用 large 模型（为空时使用 llm/硅基流动/Pro/deepseek-ai/DeepSeek-V3）；超时或限流时依次换用 fallbacks 中的模型（逗号分隔）
+content_analyzer_model_small=
+content_analyzer_small_max_tokens=8000
+content_analyzer_model_large=
+content_analyzer_model_fallbacks=
+# 目录模式下额外排除的 .gitignore 风格规则和允许的扩展名（逗号分隔，扩展名为空表示不限制），以及是否遵循 .gitignore
+content_analyzer_exclude=
+content_analyzer_extensions=
+content_analyzer_use_gitignore=true
+# 重写有多个硬链接的文件时是否保留硬链接：为 true 时把新内容写回原文件（非原子，中途崩溃可能损坏文件），
+# 默认原子替换文件，其他硬链接仍指向旧内容
+content_analyzer_keep_hard_links=false
+# dry_run 预估使用的每个请求输出 token 数、输出速度（token/秒）和每百万 token 单价（元）
+content_analyzer_plan_output_tokens=300
+content_analyzer_plan_output_tps=30
+content_analyzer_price_input=2
+content_analyzer_price_output=8
+# 按模型设置的单价，逗号分隔的 类型/供应商/模型=输入单价:输出单价，未列出的模型使用上面的单价
+content_analyzer_model_prices=
+# 每个模型保留的空闲 LLM 客户端数，客户端共享同一个 HTTP 连接池
+llm_pool_max_idle=8
+# 同时读取的 LLM 流式响应数上限，每个流占用一个专用线程，超出的请求排队等待
+llm_stream_workers=32
+# LLM 响应缓存的容量上限（MB），0 表示不缓存；llm_cache_path 可指定缓存文件位置（须位于本地磁盘）
+llm_cache_max_mb=256
+
+# 视频音频提取配置
+# ffmpeg 的最长运行时间（秒），0 表示不限制
+video_audio_extractor_timeout=3600
 
 # 语音识别配置
 # 科大讯飞API凭证
@@ -42,9 +94,61 @@ resources_path={home_dir}/.think-mcp-server/resources
 # 文章分析工具配置
 article_base_path={home_dir}/src_code/nas/knowledge/Articles
 max_tokens_limit=89600
+# 文章挑选策略：greedy、exact、approx、recency、auto
+article_packing_strategy=auto
+# 近似重复检测及其相似度阈值
+article_dedup=false
+article_dedup_threshold=0.8
+# related_content 工具的向量维度，修改后会重建向量索引（需要安装 numpy）
+related_content_dim=4096
+token_cache_max_entries=200000
+# 并行统计 token 的进程数，0 表示使用 CPU 核数
+tokenizer_workers=0
+# 估算模式下每种语言用于校准的精确统计样本数
+token_calibration_samples=32
 
 # 内容分析工具配置
 content_analyzer_prompt_path={home_dir}/.think-mcp-server/resources/tool_content_analyzer_prompt.md
+# 目录模式下同时分析的文件数
+content_analyzer_concurrency=4
+# 目录模式下把小文件合并为一个请求时每个请求的 token 上限，0 表示不合并
+content_analyzer_batch_tokens=0
+# 正文超过该 token 数时分段摘要后再归约，0 表示不分段；以及单个文件分段摘要的并发数
+content_analyzer_chunk_tokens=24000
+content_analyzer_chunk_concurrency=4
+# 单个请求的输出 token 上限（按 tokenizer 计数，达到后截断），以及流式输出停顿多少秒后放弃请求
+content_analyzer_max_output_tokens=4096
+content_analyzer_stream_idle_timeout=120
+# 内容分析的模型路由，格式为 类型/供应商/模型：输入不超过 small_max_tokens 的请求使用 small 模型（为空时不分流），
+# 其余使用 large 模型（为空时使用 llm/硅基流动/Pro/deepseek-ai/DeepSeek-V3）；超时或限流时依次换用 fallbacks 中的模型（逗号分隔）
+content_analyzer_model_small=
+content_analyzer_small_max_tokens=8000
+content_analyzer_model_large=
+content_analyzer_model_fallbacks=
+# 目录模式下额外排除的 .gitignore 风格规则和允许的扩展名（逗号分隔，扩展名为空表示不限制），以及是否遵循 .gitignore
+content_analyzer_exclude=
+content_analyzer_extensions=
+content_analyzer_use_gitignore=true
+# 重写有多个硬链接的文件时是否保留硬链接：为 true 时把新内容写回原文件（非原子，中途崩溃可能损坏文件），
+# 默认原子替换文件，其他硬链接仍指向旧内容
+content_analyzer_keep_hard_links=false
+# dry_run 预估使用的每个请求输出 token 数、输出速度（token/秒）和每百万 token 单价（元）
+content_analyzer_plan_output_tokens=300
+content_analyzer_plan_output_tps=30
+content_analyzer_price_input=2
+content_analyzer_price_output=8
+# 按模型设置的单价，逗号分隔的 类型/供应商/模型=输入单价:输出单价，未列出的模型使用上面的单价
+content_analyzer_model_prices=
+# 每个模型保留的空闲 LLM 客户端数，客户端共享同一个 HTTP 连接池
+llm_pool_max_idle=8
+# 同时读取的 LLM 流式响应数上限，每个流占用一个专用线程，超出的请求排队等待
+llm_stream_workers=32
+# LLM 响应缓存的容量上限（MB），0 表示不缓存；llm_cache_path 可指定缓存文件位置（须位于本地磁盘）
+llm_cache_max_mb=256
+
+# 视频音频提取配置
+# ffmpeg 的最长运行时间（秒），0 表示不限制
+video_audio_extractor_timeout=3600
 
 # 语音识别配置
 # 科大讯飞API凭证
@@ -2,7 +2,8 @@
 from typing import List
 import mcp.types as types
 from think_llm_client.utils.logger import logging
-from . import article_analysis, content_analyzer, video_audio_extractor, speech_to_text
+from . import article_analysis, article_packing, article_search, content_analyzer, related_content, video_audio_extractor, speech_to_text
+from .progress import progress_scope
 
 # 获取模块的日志记录器
 logger = logging.getLogger("think-mcp-server")
@@ -20,11 +21,93 @@ async def list_tools() -> List[types.Tool]:
                     "date_input": {
                         "type": "string",
                         "description": "Single date (YYYY-MM-DD) or date range (YYYY-MM-DD~YYYY-MM-DD)",
+                    },
+                    "refresh_cache": {
+                        "type": "boolean",
+                        "description": "清除 article_base_path 下的 token 计数缓存和文章索引后重新统计，默认为 false"
+                    },
+                    "rollup_only": {
+                        "type": "boolean",
+                        "description": "只返回按日期汇总的文章数和 token 数，不返回文章内容，默认为 false"
+                    },
+                    "count_mode": {
+                        "type": "string",
+                        "enum": ["exact", "estimate"],
+                        "description": "exact 用 tiktoken 精确统计全部文章；estimate 按文件字节数和分语言校准的比例快速估算并给出误差界，只对选中的文章精确统计。默认为 exact"
+                    },
+                    "output_mode": {
+                        "type": "string",
+                        "enum": ["full", "manifest"],
+                        "description": "full 返回全部文章内容；manifest 只返回标题、日期、token 数和 article:// 资源 URI，正文通过 read_resource 按需读取。默认为 full"
+                    },
+                    "packing_strategy": {
+                        "type": "string",
+                        "enum": list(article_packing.PACKING_STRATEGIES),
+                        "description": "在 max_tokens_limit 内挑选文章的策略：greedy 按 token 数降序贪心；exact 精确求解尽量用满预算；approx 适合大量文章的近似求解；recency 优先最新的文章；auto 按文章数在 exact 和 approx 之间选择。默认为 auto"
+                    },
+                    "dedup": {
+                        "type": "boolean",
+                        "description": "检测近似重复的文章（转载、不同版本），每组只保留一篇参与挑选并报告被合并的文章。默认取 article_dedup 配置"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "manifest 模式的分页游标，取上一页返回的 next_cursor"
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": "manifest 模式每页的文章数，默认为 200"
                     }
                 },
                 "required": ["date_input"],
             },
         ),
+        types.Tool(
+            name="search_articles",
+            description="Full-text search over articles, returning ranked hits with snippets and token counts",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "检索词，以空格分隔，文章需包含全部检索词；双引号内的内容作为一个短语"
+                    },
+                    "date_input": {
+                        "type": "string",
+                        "description": "可选的日期范围，格式同 article_token_content_analysis：YYYY-MM-DD 或 YYYY-MM-DD~YYYY-MM-DD"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "最多返回的结果数，默认为 20，最大为 200"
+                    },
+                    "refresh_cache": {
+                        "type": "boolean",
+                        "description": "清空全文索引后重建，默认为 false"
+                    }
+                },
+                "required": ["query"],
+            },
+        ),
+        types.Tool(
+            name="related_content",
+            description="Find articles and resource files related to a text or to an existing file, fully offline",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "用于查找相关内容的文本"
+                    },
+                    "file_path": {
+                        "type": "string",
+                        "description": "已有文章或资源文件的路径，查找与其相关的内容（不含自身）；与 query 二选一"
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": "返回的结果数，默认为 10"
+                    }
+                },
+            },
+        ),
         types.Tool(
             name="analyze_content",
             description="Analyze content of a file or directory and generate front matter description",
@@ -38,6 +121,37 @@ async def list_tools() -> List[types.Tool]:
                     "update_after": {
                         "type": "string",
                         "description": "只更新指定日期之后的内容，格式为 'YYYY-MM-DD'，默认为 '2025-01-01'"
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": "目录模式下同时分析的文件数，默认取 content_analyzer_concurrency 配置（4）"
+                    },
+                    "batch_tokens": {
+                        "type": "integer",
+                        "description": "目录模式下把小文件合并到一个 LLM 请求中，每个请求的正文 token 上限；0 表示逐个分析，默认取 content_analyzer_batch_tokens 配置"
+                    },
+                    "include": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "目录模式下只分析匹配这些 .gitignore 风格规则的文件，例如 ['docs/**', '*.md']"
+                    },
+                    "exclude": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "目录模式下额外排除的 .gitignore 风格规则，默认取 content_analyzer_exclude 配置；.git、node_modules 等目录总是被排除"
+                    },
+                    "extensions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "目录模式下允许的扩展名，例如 ['.md', '.txt']，默认取 content_analyzer_extensions 配置，为空时不限制"
+                    },
+                    "use_gitignore": {
+                        "type": "boolean",
+                        "description": "目录模式下是否遵循目录中的 .gitignore 文件，默认为 true"
+                    },
+                    "dry_run": {
+                        "type": "boolean",
+                        "description": "只预估将要分析和跳过的文件数、输入 token 数、费用和耗时，不调用 LLM，也不修改文件"
                     }
                 },
                 "required": ["file_path"],
@@ -64,6 +178,14 @@ async def list_tools() -> List[types.Tool]:
                     "output_filename": {
                         "type": "string",
                         "description": "输出文件名，默认从视频URL中提取"
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": "ffmpeg 的最长运行时间（秒），默认取 video_audio_extractor_timeout 配置（3600），0 表示不限制"
+                    },
+                    "stream_copy": {
+                        "type": "boolean",
+                        "description": "源音频编码与输出格式兼容时直接复制音频流而不重新编码，默认为 true"
                     }
                 },
                 "required": ["video_url"],
@@ -101,12 +223,30 @@ async def list_tools() -> List[types.Tool]:
 async def call_tool(
     name: str,
     arguments: dict | None,
-    session
+    session,
+    progress_token: str | int | None = None,
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
-    """Handle tool execution requests."""
+    """Handle tool execution requests.
+
+    If the client sent a progressToken, tools can report progress through
+    progress.current_progress() while the call runs.
+    """
     logger.debug("Calling tool: %s with arguments: %s", name, arguments)
+    with progress_scope(session, progress_token):
+        return await _dispatch_tool(name, arguments)
+
+
+async def _dispatch_tool(
+    name: str,
+    arguments: dict | None,
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Run the named tool."""
     if name == "article_token_content_analysis":
         return await article_analysis.analyze_token_content(arguments)
+    elif name == "search_articles":
+        return await article_search.search_articles(arguments)
+    elif name == "related_content":
+        return await related_content.related_content(arguments)
     elif name == "analyze_content":
         return await content_analyzer.analyze_content(arguments)
     elif name == "extract_audio_from_video":
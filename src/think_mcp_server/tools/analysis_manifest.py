@@ -0,0 +1,96 @@
+"""Sidecar manifest for incremental directory analysis."""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 清单文件名，保存在被分析的目录下
+MANIFEST_FILENAME = ".content_analyzer_manifest.json"
+
+# 每记录多少个文件保存一次清单，中断后重新运行时从这里继续
+SAVE_EVERY = 10
+
+MANIFEST_VERSION = 1
+
+
+class AnalysisManifest:
+    """目录分析清单，记录每个文件分析后的大小、修改时间、正文哈希和分析时间。
+
+    重新运行时只需 os.stat 就能判断文件是否在上次分析后被改动过，未改动的文件不再打开。
+    清单在运行过程中定期原子写入，被中断的运行再次执行时会跳过已完成的文件。
+    记录和保存可能在多个工作线程中同时进行，由锁保护。
+    """
+
+    def __init__(self, directory: Path):
+        """加载（或新建）目录的清单。
+
+        Args:
+            directory: 被分析的目录
+        """
+        self.directory = Path(directory)
+        self.path = self.directory / MANIFEST_FILENAME
+        self.files: Dict[str, dict] = {}
+        self._unsaved = 0
+        self._lock = threading.RLock()
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("version") == MANIFEST_VERSION:
+                    self.files = data.get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable manifest %s: %s", self.path, str(e))
+
+    def _key(self, file_path: Path) -> str:
+        return Path(file_path).relative_to(self.directory).as_posix()
+
+    def is_current(self, file_path: Path, stat: Optional[os.stat_result] = None) -> bool:
+        """文件的大小和修改时间与清单记录一致时返回 True。"""
+        entry = self.files.get(self._key(file_path))
+        if entry is None:
+            return False
+        stat = stat or os.stat(file_path)
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def record(self, file_path: Path, content_hash: str) -> None:
+        """记录文件当前（重写 front matter 之后）的状态，并按需保存清单。"""
+        stat = os.stat(file_path)
+        with self._lock:
+            self.files[self._key(file_path)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "content_hash": content_hash,
+                "analyzed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self.save()
+
+    def prune(self, existing_files: Iterable[Path]) -> None:
+        """移除已不存在的文件的记录。"""
+        existing = {self._key(file_path) for file_path in existing_files}
+        with self._lock:
+            for key in [key for key in self.files if key not in existing]:
+                del self.files[key]
+                self._unsaved += 1
+
+    def save(self) -> None:
+        """原子地写入清单：先写临时文件，再替换原文件。"""
+        with self._lock:
+            if not self._unsaved:
+                return
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            try:
+                temp_path.write_text(
+                    json.dumps({"version": MANIFEST_VERSION, "files": self.files}, ensure_ascii=False),
+                    encoding="utf-8",
+                )
+                os.replace(temp_path, self.path)
+                self._unsaved = 0
+            except OSError as e:
+                logger.warning("Failed to save manifest %s: %s", self.path, str(e))
@@ -1,14 +1,311 @@
 """Article analysis tool."""
+import asyncio
 import os
 from datetime import datetime
 import json
+import math
+import urllib.parse
+from typing import Dict, List, Tuple
 import tiktoken
 import mcp.types as types
 from think_llm_client.utils.logger import logging
+from .article_catalog import DATE_DIR_PATTERN, get_article_catalog
+from .article_dedup import (
+    DEFAULT_THRESHOLD as DEFAULT_DEDUP_THRESHOLD,
+    compute_signatures,
+    find_duplicate_clusters,
+    get_signature_cache,
+)
+from .article_packing import pack_articles
+from .token_cache import get_token_cache
+from .token_estimator import detect_language, get_token_estimator, pick_calibration_samples
+from .tokenizer_pool import count_tokens
 
 # 获取模块的日志记录器
 logger = logging.getLogger("think-mcp-server")
 
+# 文章资源 URI 的 scheme，格式为 article:///YYYY-MM-DD/文件名
+ARTICLE_URI_SCHEME = "article"
+
+# manifest 模式默认每页的文章数
+DEFAULT_MANIFEST_PAGE_SIZE = 200
+
+
+def article_uri(date_str: str, file_path: str) -> str:
+    """Build the resource URI of an article."""
+    filename = urllib.parse.quote(os.path.basename(file_path))
+    return f"{ARTICLE_URI_SCHEME}:///{date_str}/{filename}"
+
+
+def resolve_article_uri(uri_path: str) -> str:
+    """Resolve the path of an article:// URI to a file under article_base_path."""
+    base_path = os.getenv("article_base_path")
+    if not base_path:
+        raise ValueError("article_base_path not set in environment variables")
+
+    date_str, _, filename = urllib.parse.unquote(uri_path).lstrip("/").partition("/")
+    if not DATE_DIR_PATTERN.match(date_str) or not filename or "/" in filename or os.sep in filename \
+            or filename in (".", ".."):
+        raise ValueError(f"Invalid article URI path: {uri_path}")
+    return os.path.join(os.path.expanduser(base_path), date_str, filename)
+
+
+def _load_selected_content(
+    selected: List[dict],
+    file_stats: Dict[str, Tuple[int, int]],
+    max_tokens_limit: int,
+    encoder,
+) -> None:
+    """Second pass: read content only for the selected articles.
+
+    Files changed since they were counted are recounted, and their content is dropped if
+    it no longer fits, so the loaded content never exceeds max_tokens_limit.
+    """
+    loaded_total = 0
+    loaded_count = 0
+    for article in selected:
+        file_path = article["file_path"]
+        try:
+            stat = os.stat(file_path)
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except Exception as e:
+            logger.error("Error reading %s: %s", file_path, str(e))
+            article["error"] = str(e)
+            continue
+
+        if (stat.st_size, stat.st_mtime_ns) != file_stats[file_path]:
+            article["token_count"] = len(encoder.encode(content))
+            logger.debug("%s changed since counting, recounted %d tokens", file_path, article["token_count"])
+        if loaded_total + article["token_count"] > max_tokens_limit:
+            logger.debug("Skipped content for %s due to token limit", article["title"])
+            continue
+        loaded_total += article["token_count"]
+        loaded_count += 1
+        article["content"] = content
+    logger.info("Loaded content for %d/%d selected articles, %d tokens", loaded_count, len(selected), loaded_total)
+
+
+def _build_manifest(
+    articles: List[dict],
+    selected: List[dict],
+    result: dict,
+    arguments: dict,
+) -> list[types.TextContent]:
+    """Build a compact, paginated manifest; bodies are fetched through read_resource."""
+    try:
+        offset = int(arguments.get("cursor") or 0)
+        page_size = int(arguments.get("page_size") or DEFAULT_MANIFEST_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("cursor and page_size must be integers")
+    if offset < 0 or page_size <= 0:
+        raise ValueError("cursor must be >= 0 and page_size must be > 0")
+
+    selected_paths = {article["file_path"] for article in selected}
+    page = []
+    for article in articles[offset:offset + page_size]:
+        item = {
+            "title": article["title"],
+            "date": article["date"],
+            "uri": article_uri(article["date"], article["file_path"]),
+        }
+        if "error" in article:
+            item["error"] = article["error"]
+        else:
+            item["token_count"] = article["token_count"]
+            if article.get("estimated"):
+                item["estimated"] = True
+            if "duplicate_of" in article:
+                item["duplicate_of"] = article["duplicate_of"]
+            item["selected"] = article["file_path"] in selected_paths
+        page.append(item)
+
+    manifest = {
+        "articles": page,
+        "total_tokens": result["total_tokens"],
+        "article_count": len(articles),
+        "packing": result["packing"],
+    }
+    for key in ("error_bound", "duplicates"):
+        if key in result:
+            manifest[key] = result[key]
+    if offset + page_size < len(articles):
+        manifest["next_cursor"] = str(offset + page_size)
+    logger.info("Returning manifest page of %d/%d articles", len(page), len(articles))
+
+    return [
+        types.TextContent(
+            type="text",
+            text=json.dumps(manifest, ensure_ascii=False, separators=(",", ":")),
+        )
+    ]
+
+
+def parse_date_range(date_input: str) -> Tuple[str, str]:
+    """Parse a single date (YYYY-MM-DD) or a date range (YYYY-MM-DD~YYYY-MM-DD)."""
+    parts = [part.strip() for part in date_input.split("~")]
+    if len(parts) > 2:
+        raise ValueError(f"Invalid date_input: {date_input}")
+    start_date = datetime.strptime(parts[0], "%Y-%m-%d").date()
+    end_date = datetime.strptime(parts[-1], "%Y-%m-%d").date()
+    if end_date < start_date:
+        raise ValueError(f"Invalid date range: {date_input}")
+    return start_date.isoformat(), end_date.isoformat()
+
+
+def _stat_entries(entries: List[dict]) -> None:
+    """Re-stat catalog entries so in-place edits are noticed without listing directories."""
+    for entry in entries:
+        try:
+            stat = os.stat(entry["file_path"])
+        except OSError as e:
+            entry["error"] = str(e)
+            continue
+        if (stat.st_size, stat.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+            entry["token_count"] = None
+
+
+async def ensure_token_counts(entries: List[dict], catalog, cache, encoder) -> None:
+    """Fill in missing token counts from the token cache or the tokenizer pool."""
+    await asyncio.to_thread(_stat_entries, entries)
+    pending = [
+        entry for entry in entries
+        if not entry.get("error") and (entry["token_count"] is None or entry["encoding"] != encoder.name)
+    ]
+    if not pending:
+        return
+
+    file_stats = [(entry["file_path"], entry["size"], entry["mtime_ns"]) for entry in pending]
+    token_counts = cache.get_many(file_stats, encoder.name) if cache else {}
+    logger.info("Token cache hits: %d/%d", len(token_counts), len(file_stats))
+
+    # Count the remaining files off the event loop, in parallel for large ranges
+    misses = [stat for stat in file_stats if stat[0] not in token_counts]
+    miss_results = await count_tokens([path for path, _, _ in misses], encoder)
+    new_records = []
+    for file_path, size, mtime_ns in misses:
+        token_count, error = miss_results[file_path]
+        if error is None:
+            token_counts[file_path] = token_count
+            new_records.append((file_path, size, mtime_ns, token_count))
+    if cache and new_records:
+        cache.put_many(new_records, encoder.name)
+
+    for entry in pending:
+        file_path = entry["file_path"]
+        if file_path in token_counts:
+            entry["token_count"] = token_counts[file_path]
+            entry["encoding"] = encoder.name
+            logger.debug("Processed %s: %d tokens", file_path, entry["token_count"])
+        else:
+            entry["error"] = miss_results[file_path][1]
+            logger.error("Error processing %s: %s", file_path, entry["error"])
+    catalog.update_files(
+        [(entry["file_path"], entry["size"], entry["mtime_ns"], entry["token_count"]) for entry in pending],
+        encoder.name,
+    )
+
+
+def _detect_languages(entries: List[dict]) -> None:
+    """Detect the language class of each entry from a small file prefix."""
+    for entry in entries:
+        try:
+            entry["language"] = detect_language(entry["file_path"])
+        except OSError as e:
+            entry["error"] = str(e)
+
+
+async def _estimate_token_counts(entries: List[dict], catalog, cache, encoder) -> dict:
+    """Estimate token counts from file sizes, calibrated per language against exact counts.
+
+    Entries that already have an exact count keep it. Languages without enough calibration
+    samples are calibrated first by exactly counting a few evenly spread articles of that
+    language. Returns the estimated part of the total with its absolute and relative error bound.
+    """
+    await asyncio.to_thread(_stat_entries, entries)
+    estimator = get_token_estimator(encoder.name)
+
+    def has_exact_count(entry: dict) -> bool:
+        return entry["token_count"] is not None and entry["encoding"] == encoder.name
+
+    unknown = [entry for entry in entries if not entry.get("error") and entry["language"] is None]
+    if unknown:
+        await asyncio.to_thread(_detect_languages, unknown)
+        catalog.update_languages(
+            [(entry["file_path"], entry["language"]) for entry in unknown if not entry.get("error")]
+        )
+
+    valid = [entry for entry in entries if not entry.get("error")]
+    sample_size = int(os.getenv("token_calibration_samples", "32"))
+    for language in sorted({entry["language"] for entry in valid}):
+        if estimator.is_calibrated(language):
+            continue
+        samples = [entry for entry in valid if entry["language"] == language and has_exact_count(entry)]
+        samples = pick_calibration_samples(samples, language, sample_size)
+        if len(samples) < sample_size:
+            uncounted = [entry for entry in valid if entry["language"] == language and not has_exact_count(entry)]
+            to_count = pick_calibration_samples(uncounted, language, sample_size - len(samples))
+            await ensure_token_counts(to_count, catalog, cache, encoder)
+            samples += [entry for entry in to_count if not entry.get("error")]
+        estimator.calibrate(
+            (language, entry["file_path"], entry["size"], entry["token_count"]) for entry in samples
+        )
+
+    estimated_total = 0
+    error_tokens = 0.0
+    for entry in entries:
+        if entry.get("error") or has_exact_count(entry):
+            continue
+        entry["token_count"] = estimator.estimate(entry["size"], entry["language"])
+        entry["estimated"] = True
+        estimated_total += entry["token_count"]
+        error_tokens += entry["token_count"] * estimator.relative_error(entry["language"])
+    logger.info("Estimated %d tokens (±%d)", estimated_total, error_tokens)
+    return {
+        "estimated_tokens": estimated_total,
+        "tokens": int(math.ceil(error_tokens)),
+        "relative": round(error_tokens / estimated_total, 4) if estimated_total else 0.0,
+    }
+
+
+async def _collapse_duplicates(entries: List[dict], articles: List[dict]) -> dict:
+    """Cluster near-duplicate articles and mark all but one per cluster as duplicates."""
+    valid = [entry for entry in entries if not entry.get("error")]
+    signatures = await asyncio.to_thread(compute_signatures, valid, get_signature_cache())
+    threshold = float(os.getenv("article_dedup_threshold", str(DEFAULT_DEDUP_THRESHOLD)))
+    clusters = find_duplicate_clusters(valid, signatures, threshold)
+
+    articles_by_path = {article["file_path"]: article for article in articles}
+    report = []
+    collapsed_tokens = 0
+    for cluster in clusters:
+        representative = cluster["representative"]
+        collapsed = []
+        for entry, similarity in cluster["duplicates"]:
+            articles_by_path[entry["file_path"]]["duplicate_of"] = article_uri(
+                representative["date"], representative["file_path"])
+            collapsed_tokens += entry["token_count"]
+            collapsed.append({
+                "title": entry["title"],
+                "date": entry["date"],
+                "file_path": entry["file_path"],
+                "token_count": entry["token_count"],
+                "similarity": round(similarity, 3),
+            })
+        report.append({
+            "representative": {
+                "title": representative["title"],
+                "date": representative["date"],
+                "file_path": representative["file_path"],
+            },
+            "collapsed": collapsed,
+        })
+    logger.info("Collapsed %d duplicate articles (%d tokens)",
+                sum(len(cluster["collapsed"]) for cluster in report), collapsed_tokens)
+    return {"clusters": report, "collapsed_tokens": collapsed_tokens}
+
 
 async def analyze_token_content(arguments: dict | None) -> list[types.TextContent]:
     """Analyze articles' token count and content."""
@@ -32,72 +329,114 @@ async def analyze_token_content(arguments: dict | None) -> list[types.TextConten
     encoder = tiktoken.encoding_for_model("gpt-4")
     result = {"articles": [], "total_tokens": 0}
 
-    # Parse date input
-    if "~" in date_input:
-        start_date_str, end_date_str = date_input.split("~")
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
-        date_list = []
-        current_date = start_date
-        while current_date <= end_date:
-            date_list.append(current_date.strftime("%Y-%m-%d"))
-            current_date = current_date.replace(day=current_date.day + 1)
+    start_date, end_date = parse_date_range(date_input)
+    logger.info("Processing dates: %s ~ %s", start_date, end_date)
+
+    # Initialize token cache
+    cache = None
+    try:
+        cache = get_token_cache()
+    except Exception as e:
+        logger.warning("Token cache unavailable, counting without cache: %s", str(e))
+
+    # Refresh the date index incrementally instead of listing every day
+    catalog = get_article_catalog(base_path)
+    if arguments.get("refresh_cache"):
+        if cache:
+            cache.invalidate(base_path)
+        catalog.clear()
+        get_signature_cache().invalidate(base_path)
+        get_token_estimator(encoder.name).reset()
+    await asyncio.to_thread(catalog.refresh)
+    entries = catalog.articles_in_range(start_date, end_date)
+    count_mode = arguments.get("count_mode") or "exact"
+    if count_mode == "estimate":
+        result["error_bound"] = await _estimate_token_counts(entries, catalog, cache, encoder)
+    elif count_mode == "exact":
+        await ensure_token_counts(entries, catalog, cache, encoder)
     else:
-        date_list = [date_input]
+        raise ValueError(f"Unknown count_mode: {count_mode}")
 
-    logger.info("Processing dates: %s", date_list)
+    daily_totals = {}
+    for entry in entries:
+        day = daily_totals.setdefault(entry["date"], {"articles": 0, "tokens": 0})
+        day["articles"] += 1
+        if not entry.get("error"):
+            day["tokens"] += entry["token_count"]
+    result["total_tokens"] = sum(day["tokens"] for day in daily_totals.values())
+    if arguments.get("rollup_only"):
+        logger.info("Total tokens in range: %d", result["total_tokens"])
+        rollup = {
+            "daily_totals": daily_totals,
+            "article_count": len(entries),
+            "total_tokens": result["total_tokens"],
+        }
+        if "error_bound" in result:
+            rollup["error_bound"] = result["error_bound"]
+        return [
+            types.TextContent(
+                type="text",
+                text=json.dumps(rollup, ensure_ascii=False, indent=2),
+            )
+        ]
 
-    # Process each date and collect articles
     articles = []
-    for date_str in date_list:
-        folder_path = os.path.join(base_path, date_str)
-        if os.path.exists(folder_path):
-            logger.debug("Processing folder: %s", folder_path)
-            for filename in os.listdir(folder_path):
-                if filename.endswith((".md", ".markdown", ".txt")):
-                    file_path = os.path.join(folder_path, filename)
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                            token_count = len(encoder.encode(content))
-                            article_title = os.path.splitext(filename)[0]
-                            articles.append({
-                                "title": article_title,
-                                "date": date_str,
-                                "token_count": token_count,
-                                "file_path": str(file_path),
-                                "content": content
-                            })
-                            result["total_tokens"] += token_count
-                            logger.debug("Processed %s: %d tokens", filename, token_count)
-                    except Exception as e:
-                        logger.error("Error processing %s: %s", file_path, str(e))
-                        articles.append({
-                            "title": os.path.splitext(filename)[0],
-                            "date": date_str,
-                            "error": str(e),
-                            "file_path": str(file_path),
-                            "content": ""
-                        })
+    for entry in entries:
+        if entry.get("error"):
+            articles.append({
+                "title": entry["title"],
+                "date": entry["date"],
+                "error": entry["error"],
+                "file_path": entry["file_path"],
+                "content": ""
+            })
+        else:
+            articles.append({
+                "title": entry["title"],
+                "date": entry["date"],
+                "token_count": entry["token_count"],
+                "file_path": entry["file_path"],
+                "content": ""
+            })
+            if entry.get("estimated"):
+                articles[-1]["estimated"] = True
 
     # Sort articles by token count in descending order
     articles.sort(key=lambda x: x.get("token_count", 0), reverse=True)
+    packing_strategy = arguments.get("packing_strategy") or os.getenv("article_packing_strategy", "auto")
+    dedup = arguments.get("dedup")
+    if dedup is None:
+        dedup = os.getenv("article_dedup", "false").lower() == "true"
+    if dedup:
+        result["duplicates"] = await _collapse_duplicates(entries, articles)
+    candidates = [article for article in articles if "duplicate_of" not in article]
+    selected, result["packing"] = pack_articles(candidates, max_tokens_limit, packing_strategy)
+    if count_mode == "estimate":
+        # Count the selected articles exactly and repack them with the exact counts
+        entries_by_path = {entry["file_path"]: entry for entry in entries}
+        selected_entries = [entries_by_path[article["file_path"]] for article in selected]
+        await ensure_token_counts(selected_entries, catalog, cache, encoder)
+        for article in selected:
+            entry = entries_by_path[article["file_path"]]
+            article.pop("estimated", None)
+            if entry.get("error"):
+                article.pop("token_count", None)
+                article["error"] = entry["error"]
+            else:
+                article["token_count"] = entry["token_count"]
+        candidate_count = result["packing"]["candidate_count"]
+        selected, result["packing"] = pack_articles(selected, max_tokens_limit, packing_strategy)
+        result["packing"]["candidate_count"] = candidate_count
 
-    # Process content based on max_tokens_limit
-    current_total = 0
-    for article in articles:
-        if "error" in article:  # Skip articles with errors
-            continue
+    if arguments.get("output_mode") == "manifest":
+        return _build_manifest(articles, selected, result, arguments)
 
-        token_count = article["token_count"]
-        if current_total + token_count <= max_tokens_limit:
-            current_total += token_count
-        else:
-            # Clear content for articles that would exceed the limit
-            article["content"] = ""
-            logger.debug("Skipped content for %s due to token limit", article["title"])
+    # First pass only produced token counts; load content for the selected articles
+    file_stats = {entry["file_path"]: (entry["size"], entry["mtime_ns"]) for entry in entries}
+    await asyncio.to_thread(_load_selected_content, selected, file_stats, max_tokens_limit, encoder)
 
     result["articles"] = articles
+    result["daily_totals"] = daily_totals
     logger.info("Total tokens processed: %d", result["total_tokens"])
 
     return [
@@ -0,0 +1,225 @@
+"""Date-indexed article catalog for article analysis."""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 文章所在的日期目录名，例如 2025-01-31
+DATE_DIR_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# 参与统计的文章扩展名
+ARTICLE_EXTENSIONS = (".md", ".markdown", ".txt")
+
+
+class ArticleCatalog:
+    """文章目录索引，将日期映射到文章文件及其 token 数。
+
+    索引保存在 SQLite 中，首次使用时完整构建一次，之后根据目录的修改时间增量刷新：
+    只有修改时间变化的日期目录才会被重新列出，未变化文件的 token 数原样保留。
+    """
+
+    def __init__(self, base_path: str, db_path: str):
+        """初始化文章索引。
+
+        Args:
+            base_path: 文章根目录，其下为 YYYY-MM-DD 格式的日期目录
+            db_path: SQLite 数据库文件路径
+        """
+        self.base_path = base_path
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dirs (
+                    date TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS articles (
+                    path TEXT PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    encoding TEXT,
+                    token_count INTEGER,
+                    language TEXT
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(articles)")}
+            if "language" not in columns:
+                self._conn.execute("ALTER TABLE articles ADD COLUMN language TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_date ON articles (date)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)"
+            )
+
+    def refresh(self) -> int:
+        """根据目录修改时间增量刷新索引，返回重新列出的日期目录数。"""
+        with self._lock:
+            known_dirs = dict(self._conn.execute("SELECT date, mtime_ns FROM dirs").fetchall())
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'base_mtime_ns'").fetchone()
+
+        try:
+            base_mtime_ns = os.stat(self.base_path).st_mtime_ns
+        except FileNotFoundError:
+            logger.warning("Article base path does not exist: %s", self.base_path)
+            base_mtime_ns = None
+
+        # 根目录未变化时，日期目录集合不变，只需检查各日期目录自身的修改时间
+        current_dirs: Dict[str, int] = {}
+        if base_mtime_ns is None:
+            pass
+        elif row is not None and row[0] == base_mtime_ns:
+            for date_str in known_dirs:
+                try:
+                    current_dirs[date_str] = os.stat(os.path.join(self.base_path, date_str)).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+        else:
+            for entry in os.scandir(self.base_path):
+                if entry.is_dir() and DATE_DIR_PATTERN.match(entry.name):
+                    current_dirs[entry.name] = entry.stat().st_mtime_ns
+
+        changed = [date_str for date_str, mtime_ns in current_dirs.items()
+                   if known_dirs.get(date_str) != mtime_ns]
+        removed = [date_str for date_str in known_dirs if date_str not in current_dirs]
+
+        for date_str in changed:
+            self._rescan_dir(date_str, current_dirs[date_str])
+        with self._lock, self._conn:
+            for date_str in removed:
+                self._conn.execute("DELETE FROM articles WHERE date = ?", (date_str,))
+                self._conn.execute("DELETE FROM dirs WHERE date = ?", (date_str,))
+            if base_mtime_ns is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('base_mtime_ns', ?)",
+                    (base_mtime_ns,),
+                )
+
+        if changed or removed:
+            logger.info("Article catalog refreshed: %d dirs rescanned, %d removed",
+                        len(changed), len(removed))
+        return len(changed)
+
+    def _rescan_dir(self, date_str: str, mtime_ns: int) -> None:
+        """重新列出单个日期目录，保留未变化文件的 token 数。"""
+        folder_path = os.path.join(self.base_path, date_str)
+        files = {}
+        try:
+            for entry in os.scandir(folder_path):
+                if entry.is_file() and entry.name.endswith(ARTICLE_EXTENSIONS):
+                    stat = entry.stat()
+                    files[entry.path] = (entry.name, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+
+        with self._lock, self._conn:
+            existing = {
+                path: (size, file_mtime_ns)
+                for path, size, file_mtime_ns in self._conn.execute(
+                    "SELECT path, size, mtime_ns FROM articles WHERE date = ?", (date_str,)
+                )
+            }
+            for path in existing.keys() - files.keys():
+                self._conn.execute("DELETE FROM articles WHERE path = ?", (path,))
+            for path, (name, size, file_mtime_ns) in files.items():
+                if existing.get(path) == (size, file_mtime_ns):
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO articles "
+                    "(path, date, title, size, mtime_ns, encoding, token_count, language) "
+                    "VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL)",
+                    (path, date_str, os.path.splitext(name)[0], size, file_mtime_ns),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dirs (date, mtime_ns) VALUES (?, ?)", (date_str, mtime_ns)
+            )
+
+    def articles_in_range(self, start_date: str, end_date: str) -> List[dict]:
+        """查询日期范围内（含两端）的全部文章，按日期和路径排序。"""
+        return self._query_articles("WHERE date BETWEEN ? AND ?", (start_date, end_date))
+
+    def all_articles(self) -> List[dict]:
+        """查询索引中的全部文章，按日期和路径排序。"""
+        return self._query_articles("", ())
+
+    def _query_articles(self, where: str, params: tuple) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, date, title, size, mtime_ns, encoding, token_count, language FROM articles "
+                f"{where} ORDER BY date, path",
+                params,
+            ).fetchall()
+        return [
+            {
+                "file_path": path,
+                "date": date_str,
+                "title": title,
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "encoding": encoding,
+                "token_count": token_count,
+                "language": language,
+            }
+            for path, date_str, title, size, mtime_ns, encoding, token_count, language in rows
+        ]
+
+    def update_files(self, records: Iterable[Tuple[str, int, int, Optional[int]]], encoding: str) -> None:
+        """更新文章的 (路径, 大小, 修改时间, token 数)，token 数为 None 表示需要重新统计。"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE articles SET size = ?, mtime_ns = ?, encoding = ?, token_count = ? WHERE path = ?",
+                [
+                    (size, mtime_ns, encoding if token_count is not None else None, token_count, path)
+                    for path, size, mtime_ns, token_count in records
+                ],
+            )
+
+    def update_languages(self, records: Iterable[Tuple[str, str]]) -> None:
+        """更新文章的 (路径, 语言) 记录，供 token 估算使用。"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE articles SET language = ? WHERE path = ?",
+                [(language, path) for path, language in records],
+            )
+
+    def clear(self) -> None:
+        """清空索引，下次刷新时完整重建。"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM articles")
+            self._conn.execute("DELETE FROM dirs")
+            self._conn.execute("DELETE FROM meta")
+
+    def close(self) -> None:
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
+
+
+_catalogs: Dict[str, ArticleCatalog] = {}
+
+
+def get_article_catalog(base_path: str) -> ArticleCatalog:
+    """获取指定文章根目录的共享索引实例，每个根目录对应一个数据库文件。"""
+    base_path = os.path.abspath(base_path)
+    if base_path not in _catalogs:
+        digest = hashlib.sha1(base_path.encode("utf-8")).hexdigest()[:12]
+        db_path = get_cache_dir() / f"article_catalog_{digest}.db"
+        logger.info("Using article catalog for %s: %s", base_path, db_path)
+        _catalogs[base_path] = ArticleCatalog(base_path, str(db_path))
+    return _catalogs[base_path]
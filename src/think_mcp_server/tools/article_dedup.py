@@ -0,0 +1,254 @@
+"""Near-duplicate article detection with MinHash signatures and LSH."""
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 字符 shingle 长度，对中文和英文都适用
+SHINGLE_SIZE = 5
+
+# 签名长度（分桶数），以及 LSH 的分段数和每段行数
+SIGNATURE_SIZE = 128
+LSH_BANDS = 16
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+
+# 默认的相似度阈值，估算的 Jaccard 相似度不低于该值视为近似重复
+DEFAULT_THRESHOLD = 0.8
+
+# 单个 LSH 桶最多两两比较的文章数，超过时每篇只与桶内前 OVERSIZED_BUCKET_ANCHORS 篇比较，避免退化为 O(n²)
+MAX_BUCKET_SIZE = 256
+OVERSIZED_BUCKET_ANCHORS = 16
+
+# 空桶的取值，没有任何 shingle 的文本的签名全部为该值
+_EMPTY_BIN = 0xFFFFFFFF
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def minhash_signature(text: str) -> List[int]:
+    """Compute a one-permutation MinHash signature of the text's character shingles.
+
+    Each shingle is hashed once with CRC32; the low bits pick one of SIGNATURE_SIZE bins
+    and each bin keeps its smallest remaining value. Empty bins borrow the value of the
+    next non-empty bin (rotation densification) so short texts still get full signatures.
+    """
+    normalized = _WHITESPACE_PATTERN.sub(" ", text).strip().lower()
+    if len(normalized) < SHINGLE_SIZE:
+        shingles = {normalized} if normalized else set()
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+    empty = _EMPTY_BIN
+    bins = [empty] * SIGNATURE_SIZE
+    for shingle in shingles:
+        value = zlib.crc32(shingle.encode("utf-8"))
+        index = value % SIGNATURE_SIZE
+        value //= SIGNATURE_SIZE
+        if value < bins[index]:
+            bins[index] = value
+
+    if all(value == empty for value in bins):
+        return bins
+    signature = list(bins)
+    for index in range(SIGNATURE_SIZE):
+        offset = 0
+        while bins[(index + offset) % SIGNATURE_SIZE] == empty:
+            offset += 1
+        if offset:
+            # 借用的值加上偏移量，避免不同空桶之间产生虚假的相等
+            signature[index] = bins[(index + offset) % SIGNATURE_SIZE] + offset * (empty // SIGNATURE_SIZE + 1)
+    return signature
+
+
+def is_empty_signature(signature: Sequence[int]) -> bool:
+    """Whether the signature belongs to a text without any shingles."""
+    return all(value == _EMPTY_BIN for value in signature)
+
+
+def estimate_similarity(first: Sequence[int], second: Sequence[int]) -> float:
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / SIGNATURE_SIZE
+
+
+class SignatureCache:
+    """基于 SQLite 的 MinHash 签名缓存，文件大小和修改时间不变时直接复用。"""
+
+    def __init__(self, db_path: Path):
+        """初始化签名缓存。
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS signatures (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    signature BLOB NOT NULL
+                )
+                """
+            )
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[List[int]]:
+        """查询文件的签名，未命中返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, signature FROM signatures WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or (row[0], row[1]) != (size, mtime_ns):
+            return None
+        return array("Q", row[2]).tolist()
+
+    def put_many(self, records: Iterable[Tuple[str, int, int, List[int]]]) -> None:
+        """批量写入 (路径, 大小, 修改时间, 签名) 记录。"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO signatures (path, size, mtime_ns, signature) VALUES (?, ?, ?, ?)",
+                [
+                    (path, size, mtime_ns, array("Q", signature).tobytes())
+                    for path, size, mtime_ns, signature in records
+                ],
+            )
+
+    def invalidate(self, path_prefix: str) -> None:
+        """清除该目录下的签名。"""
+        prefix = path_prefix.rstrip(os.sep) + os.sep
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM signatures WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            )
+
+
+_signature_cache: Optional[SignatureCache] = None
+
+
+def get_signature_cache() -> SignatureCache:
+    """获取进程内共享的签名缓存，保存在缓存目录下的 minhash_signatures.db。"""
+    global _signature_cache
+    if _signature_cache is None:
+        _signature_cache = SignatureCache(get_cache_dir() / "minhash_signatures.db")
+    return _signature_cache
+
+
+def compute_signatures(entries: List[dict], cache: SignatureCache) -> Dict[str, List[int]]:
+    """获取每篇文章的签名，只读取缓存未命中的文件。"""
+    signatures: Dict[str, List[int]] = {}
+    new_records = []
+    for entry in entries:
+        path = entry["file_path"]
+        signature = cache.get(path, entry["size"], entry["mtime_ns"])
+        if signature is None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    signature = minhash_signature(f.read())
+            except Exception as e:
+                logger.warning("Skipping %s in duplicate detection: %s", path, str(e))
+                continue
+            new_records.append((path, entry["size"], entry["mtime_ns"], signature))
+        signatures[path] = signature
+    if new_records:
+        cache.put_many(new_records)
+    logger.debug("Computed %d new signatures, %d from cache",
+                 len(new_records), len(signatures) - len(new_records))
+    return signatures
+
+
+def find_duplicate_clusters(
+    entries: List[dict],
+    signatures: Dict[str, List[int]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[dict]:
+    """用 LSH 找出近似重复的文章并聚类。
+
+    签名分成 LSH_BANDS 段，任意一段完全相同的文章成为候选对，估算相似度不低于 threshold
+    的候选对用并查集合并。每个类保留日期最新（其次 token 数最多）的一篇作为代表。
+    空文章不参与比较；签名完全相同的文章直接合并，每组只取一篇分桶；
+    超过 MAX_BUCKET_SIZE 篇的桶不做两两比较，只把每篇与桶内前 OVERSIZED_BUCKET_ANCHORS 篇比较。
+
+    Returns:
+        [{"representative": 代表文章, "duplicates": [(文章, 相似度), ...]}, ...]
+    """
+    by_path = {
+        entry["file_path"]: entry for entry in entries
+        if entry["file_path"] in signatures and not is_empty_signature(signatures[entry["file_path"]])
+    }
+    parent = {path: path for path in by_path}
+
+    def find(path: str) -> str:
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    # 签名完全相同的文章（例如模板化的短文）相似度为 1，直接合并
+    distinct: Dict[Tuple[int, ...], str] = {}
+    for path in by_path:
+        key = tuple(signatures[path])
+        if key in distinct:
+            parent[find(path)] = find(distinct[key])
+        else:
+            distinct[key] = path
+
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+    for path in distinct.values():
+        signature = signatures[path]
+        for band in range(LSH_BANDS):
+            key = (band, tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]))
+            buckets.setdefault(key, []).append(path)
+
+    checked = set()
+    for paths in buckets.values():
+        anchors = len(paths)
+        if anchors > MAX_BUCKET_SIZE:
+            logger.debug("Comparing LSH bucket with %d articles against its first %d",
+                         len(paths), OVERSIZED_BUCKET_ANCHORS)
+            anchors = OVERSIZED_BUCKET_ANCHORS
+        for i in range(anchors):
+            for j in range(i + 1, len(paths)):
+                pair = (paths[i], paths[j])
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                if estimate_similarity(signatures[pair[0]], signatures[pair[1]]) >= threshold:
+                    parent[find(pair[0])] = find(pair[1])
+
+    groups: Dict[str, List[str]] = {}
+    for path in by_path:
+        groups.setdefault(find(path), []).append(path)
+
+    clusters = []
+    for paths in groups.values():
+        if len(paths) < 2:
+            continue
+        members = sorted(
+            (by_path[path] for path in paths),
+            key=lambda entry: (date.fromisoformat(entry["date"]), entry.get("token_count") or 0, entry["file_path"]),
+            reverse=True,
+        )
+        representative = members[0]
+        clusters.append({
+            "representative": representative,
+            "duplicates": [
+                (member, estimate_similarity(signatures[representative["file_path"]], signatures[member["file_path"]]))
+                for member in members[1:]
+            ],
+        })
+    logger.info("Found %d near-duplicate clusters among %d articles", len(clusters), len(by_path))
+    return clusters
@@ -0,0 +1,170 @@
+"""Token budget packing strategies for article selection."""
+import math
+import time
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 可选的打包策略
+PACKING_STRATEGIES = ("greedy", "exact", "approx", "recency", "auto")
+
+# exact 策略的最大候选数，超出时 auto 会改用 approx
+EXACT_MAX_ITEMS = 500
+
+# 子集和动态规划保存的位数上限（候选数 × 预算），约 32MB
+MAX_DP_CELLS = 1 << 28
+
+# approx 策略把预算缩放到的格子数，决定精度与耗时
+APPROX_RESOLUTION = 4096
+
+# 单次打包的最长耗时（秒），超时后退回 greedy
+DEFAULT_TIME_LIMIT = 2.0
+
+
+class PackingTimeout(Exception):
+    """打包超出时间限制。"""
+    pass
+
+
+def _greedy(weights: Sequence[int], budget: int, order: Sequence[int]) -> List[int]:
+    """First-fit in the given order: take every item that still fits."""
+    chosen = []
+    used = 0
+    for index in order:
+        if used + weights[index] <= budget:
+            used += weights[index]
+            chosen.append(index)
+    return chosen
+
+
+def _subset_sum(weights: Sequence[int], budget: int, deadline: float) -> List[int]:
+    """Pick the subset with the largest total weight not exceeding budget.
+
+    Reachable sums are tracked as bits of a Python integer, so each item costs one shift
+    and one OR over budget + 1 bits; the bitsets before each item are kept to rebuild
+    the chosen subset.
+    """
+    mask = (1 << (budget + 1)) - 1
+    reachable = 1
+    history = []
+    for weight in weights:
+        if time.monotonic() > deadline:
+            raise PackingTimeout()
+        history.append(reachable)
+        if weight <= budget:
+            reachable = (reachable | (reachable << weight)) & mask
+
+    target = reachable.bit_length() - 1
+    chosen = []
+    for index in range(len(weights) - 1, -1, -1):
+        if (history[index] >> target) & 1:
+            continue
+        chosen.append(index)
+        target -= weights[index]
+    return chosen
+
+
+def _approx_subset_sum(weights: Sequence[int], budget: int, deadline: float) -> List[int]:
+    """Subset sum on weights scaled down to APPROX_RESOLUTION cells.
+
+    The resolution shrinks for very large candidate sets to keep memory bounded. Scaled
+    weights are rounded up, so the chosen subset always fits the real budget;
+    the capacity lost to rounding is then refilled first-fit with the remaining items.
+    """
+    resolution = max(64, min(APPROX_RESOLUTION, MAX_DP_CELLS // max(1, len(weights))))
+    scale = max(1, math.ceil(budget / resolution))
+    scaled = [math.ceil(weight / scale) for weight in weights]
+    chosen = _subset_sum(scaled, budget // scale, deadline)
+
+    used = sum(weights[index] for index in chosen)
+    taken = set(chosen)
+    for index in sorted(range(len(weights)), key=lambda i: weights[i], reverse=True):
+        if index not in taken and used + weights[index] <= budget:
+            used += weights[index]
+            chosen.append(index)
+    return chosen
+
+
+def pack_articles(
+    articles: List[dict],
+    budget: int,
+    strategy: str = "auto",
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> Tuple[List[dict], dict]:
+    """从文章中选出总 token 数不超过预算的一组。
+
+    Args:
+        articles: 带 token_count 和 date 的文章，含 error 的文章不参与打包
+        budget: token 预算
+        strategy: greedy（按 token 数降序首次适应）、exact（精确子集和，用满预算）、
+            approx（缩放后的近似子集和，适合大量候选）、recency（优先最新日期）、
+            auto（候选数不超过 EXACT_MAX_ITEMS 时用 exact，否则用 approx）
+        time_limit: 最长耗时（秒），超时退回 greedy
+
+    Returns:
+        (选中的文章, 打包统计)，选中的文章按 token 数降序排列
+    """
+    if strategy not in PACKING_STRATEGIES:
+        raise ValueError(f"Unknown packing strategy: {strategy}, expected one of {PACKING_STRATEGIES}")
+
+    budget = max(0, budget)
+    candidates = [article for article in articles if "error" not in article]
+    weights = [article["token_count"] for article in candidates]
+    by_size = sorted(range(len(candidates)), key=lambda i: weights[i], reverse=True)
+
+    start = time.monotonic()
+    deadline = start + time_limit
+    fallback: Optional[str] = None
+    exact_feasible = (len(candidates) <= EXACT_MAX_ITEMS
+                      and len(candidates) * (budget + 1) <= MAX_DP_CELLS)
+    used_strategy = strategy
+    if strategy == "auto":
+        used_strategy = "exact" if exact_feasible else "approx"
+    elif strategy == "exact" and not exact_feasible:
+        logger.warning("Too many candidates for exact packing, using approx")
+        used_strategy = fallback = "approx"
+    if used_strategy == "greedy":
+        chosen = _greedy(weights, budget, by_size)
+    elif used_strategy == "recency":
+        newest_first = sorted(
+            range(len(candidates)),
+            key=lambda i: (date.fromisoformat(candidates[i]["date"]), weights[i]),
+            reverse=True,
+        )
+        chosen = _greedy(weights, budget, newest_first)
+    else:
+        greedy_chosen = _greedy(weights, budget, by_size)
+        try:
+            if used_strategy == "exact":
+                chosen = _subset_sum(weights, budget, deadline)
+            else:
+                chosen = _approx_subset_sum(weights, budget, deadline)
+            # 近似解不一定优于贪心，取两者中用量更大的一个
+            if sum(weights[i] for i in greedy_chosen) > sum(weights[i] for i in chosen):
+                chosen = greedy_chosen
+        except PackingTimeout:
+            logger.warning("Packing with %s exceeded %.1fs, falling back to greedy", used_strategy, time_limit)
+            fallback = "greedy"
+            chosen = greedy_chosen
+
+    # 零 token 的文章不占预算，总是选中
+    chosen_set = set(chosen) | {i for i, weight in enumerate(weights) if weight == 0}
+    selected = [candidates[i] for i in by_size if i in chosen_set]
+    used_tokens = sum(weights[i] for i in chosen_set)
+    stats = {
+        "strategy": used_strategy,
+        "budget": budget,
+        "used_tokens": used_tokens,
+        "utilization": round(used_tokens / budget, 4) if budget > 0 else 0.0,
+        "selected_count": len(selected),
+        "candidate_count": len(candidates),
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 2),
+    }
+    if fallback:
+        stats["fallback"] = fallback
+    logger.info("Packed %d/%d articles with %s: %d/%d tokens",
+                len(selected), len(candidates), used_strategy, used_tokens, budget)
+    return selected, stats
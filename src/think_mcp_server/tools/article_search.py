@@ -0,0 +1,373 @@
+"""Full-text search over the article corpus with SQLite FTS5."""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import tiktoken
+import mcp.types as types
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir
+from .article_analysis import article_uri, ensure_token_counts, parse_date_range
+from .article_catalog import ArticleCatalog, get_article_catalog
+from .token_cache import get_token_cache
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 默认和最多返回的结果数
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+
+# 标题命中在 bm25 排序中的权重（正文为 1）
+TITLE_WEIGHT = 5.0
+
+# 摘要最多包含的 token 数，以及用 LIKE 匹配时摘要前后保留的字符数
+SNIPPET_TOKENS = 24
+SNIPPET_CONTEXT_CHARS = 60
+
+# trigram 分词器的最短检索词长度，更短的词（例如两个字的中文词）改用 LIKE 匹配
+TRIGRAM_MIN_TERM = 3
+
+# 同步索引时每批读取并提交的文章数，限制首次建索引时的内存占用
+SYNC_BATCH_SIZE = 100
+
+_TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def split_query(query: str) -> List[str]:
+    """Split a query into terms; double-quoted text is kept as one phrase."""
+    return [phrase or word for phrase, word in _TERM_PATTERN.findall(query) if (phrase or word).strip()]
+
+
+def _quote_term(term: str) -> str:
+    """Quote a term as an FTS5 string so operators and punctuation are matched literally."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ArticleSearchIndex:
+    """文章全文倒排索引。
+
+    使用 SQLite FTS5，优先采用 trigram 分词器以支持中文等无空格分隔的文本，
+    当前 SQLite 不支持时退回 unicode61。sync 根据文件当前的大小和修改时间增量更新，
+    只重新读取新增或变化的文章。
+    """
+
+    def __init__(self, db_path: str):
+        """初始化全文索引。
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    date TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_date ON docs (date)")
+            self.tokenizer = self._create_fts_table()
+        logger.debug("Article search index %s uses the %s tokenizer", db_path, self.tokenizer)
+
+    def _create_fts_table(self) -> str:
+        """Create the FTS5 table if needed and return the tokenizer it uses."""
+        row = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'article_fts'"
+        ).fetchone()
+        if row is not None:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+        try:
+            self._conn.execute("CREATE VIRTUAL TABLE article_fts USING fts5(title, body, tokenize='trigram')")
+            return "trigram"
+        except sqlite3.OperationalError as e:
+            logger.warning("FTS5 trigram tokenizer unavailable, using unicode61: %s", str(e))
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE article_fts USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+            return "unicode61"
+
+    def sync(self, entries: List[dict], batch_size: int = SYNC_BATCH_SIZE) -> int:
+        """让索引与文章列表一致，返回重新索引的文章数。
+
+        逐个 stat 文章并与索引记录的大小和修改时间比较：目录只在日期文件夹变化时重新列出，
+        原地编辑的文章只能这样发现，而 stat 的开销远小于读取正文。变化的文章按 batch_size
+        篇一批读取、写入并提交，不会把全部正文同时放在内存中；无法 stat 的文章从索引中移除。
+
+        Args:
+            entries: 文章目录中的全部文章（含 file_path、date、title、size、mtime_ns）
+            batch_size: 每批读取并提交的文章数
+        """
+        with self._lock:
+            indexed = {
+                path: (doc_id, size, mtime_ns)
+                for doc_id, path, size, mtime_ns in self._conn.execute(
+                    "SELECT id, path, size, mtime_ns FROM docs"
+                )
+            }
+
+        # 使用文件当前的大小和修改时间，不修改调用方的 entries
+        current = {}
+        for entry in entries:
+            try:
+                stat = os.stat(entry["file_path"])
+            except OSError:
+                continue
+            current[entry["file_path"]] = {**entry, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        removed = [doc_id for path, (doc_id, _, _) in indexed.items() if path not in current]
+        changed = [
+            entry for entry in current.values()
+            if indexed.get(entry["file_path"], (None, None, None))[1:] != (entry["size"], entry["mtime_ns"])
+        ]
+        if not changed and not removed:
+            return 0
+
+        if removed:
+            with self._lock, self._conn:
+                for doc_id in removed:
+                    self._conn.execute("DELETE FROM article_fts WHERE rowid = ?", (doc_id,))
+                    self._conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+
+        updated = 0
+        for start in range(0, len(changed), batch_size):
+            batch: List[Tuple[dict, str]] = []
+            for entry in changed[start:start + batch_size]:
+                try:
+                    with open(entry["file_path"], "r", encoding="utf-8", errors="replace") as f:
+                        batch.append((entry, f.read()))
+                except OSError as e:
+                    logger.warning("Failed to index %s: %s", entry["file_path"], str(e))
+            with self._lock, self._conn:
+                for entry, body in batch:
+                    self._index_article(entry, body, indexed.get(entry["file_path"]))
+            updated += len(batch)
+        logger.info("Search index updated: %d articles indexed, %d removed", updated, len(removed))
+        return updated
+
+    def _index_article(self, entry: dict, body: str, known: Optional[Tuple[int, int, int]]) -> None:
+        """Insert or replace one article; must be called inside a transaction."""
+        path = entry["file_path"]
+        if known is not None:
+            self._conn.execute("DELETE FROM article_fts WHERE rowid = ?", (known[0],))
+            self._conn.execute(
+                "UPDATE docs SET date = ?, size = ?, mtime_ns = ? WHERE id = ?",
+                (entry["date"], entry["size"], entry["mtime_ns"], known[0]),
+            )
+            doc_id = known[0]
+        else:
+            doc_id = self._conn.execute(
+                "INSERT INTO docs (path, date, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                (path, entry["date"], entry["size"], entry["mtime_ns"]),
+            ).lastrowid
+        self._conn.execute(
+            "INSERT INTO article_fts (rowid, title, body) VALUES (?, ?, ?)",
+            (doc_id, entry["title"], body),
+        )
+
+    def search(
+        self,
+        query: str,
+        start_date: str = "0000-00-00",
+        end_date: str = "9999-99-99",
+        limit: int = DEFAULT_SEARCH_LIMIT,
+    ) -> List[dict]:
+        """检索包含全部检索词的文章，按相关度排序。
+
+        Args:
+            query: 以空白分隔的检索词，双引号内的内容作为一个短语
+            start_date: 起始日期（含）
+            end_date: 结束日期（含）
+            limit: 最多返回的结果数
+
+        Returns:
+            [{"file_path", "date", "snippet", "score"}, ...]，score 越小越相关
+        """
+        terms = split_query(query)
+        if not terms:
+            raise ValueError("Search query is empty")
+
+        if self.tokenizer == "trigram":
+            match_terms = [term for term in terms if len(term) >= TRIGRAM_MIN_TERM]
+            like_terms = [term for term in terms if len(term) < TRIGRAM_MIN_TERM]
+        else:
+            match_terms, like_terms = terms, []
+
+        conditions = ["docs.date BETWEEN ? AND ?"]
+        params: list = [start_date, end_date]
+        for term in like_terms:
+            conditions.append("(article_fts.title LIKE ? ESCAPE '\\' OR article_fts.body LIKE ? ESCAPE '\\')")
+            pattern = f"%{_escape_like(term)}%"
+            params.extend([pattern, pattern])
+
+        if match_terms:
+            sql = (
+                "SELECT docs.path, docs.date, "
+                f"snippet(article_fts, 1, '[', ']', '…', {SNIPPET_TOKENS}), "
+                f"bm25(article_fts, {TITLE_WEIGHT}, 1.0) AS score "
+                "FROM article_fts JOIN docs ON docs.id = article_fts.rowid "
+                f"WHERE article_fts MATCH ? AND {' AND '.join(conditions)} "
+                "ORDER BY score LIMIT ?"
+            )
+            params = [" ".join(_quote_term(term) for term in match_terms)] + params + [limit]
+        else:
+            # 只有短词时无法使用倒排索引，按 LIKE 过滤并优先返回最新的文章
+            sql = (
+                "SELECT docs.path, docs.date, article_fts.body, 0.0 "
+                "FROM article_fts JOIN docs ON docs.id = article_fts.rowid "
+                f"WHERE {' AND '.join(conditions)} "
+                "ORDER BY docs.date DESC, docs.path LIMIT ?"
+            )
+            params = params + [limit]
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        hits = []
+        for path, date_str, snippet, score in rows:
+            if not match_terms:
+                snippet = _like_snippet(snippet, like_terms[0])
+            hits.append({"file_path": path, "date": date_str, "snippet": snippet, "score": round(score, 4)})
+        return hits
+
+    def clear(self) -> None:
+        """清空索引，下次同步时完整重建。"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM article_fts")
+            self._conn.execute("DELETE FROM docs")
+
+    def close(self) -> None:
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
+
+
+def _like_snippet(body: str, term: str) -> str:
+    """Cut a snippet around the first occurrence of term, marked like FTS5 snippets."""
+    index = body.lower().find(term.lower())
+    if index < 0:
+        return body[:SNIPPET_CONTEXT_CHARS * 2].strip()
+    start = max(0, index - SNIPPET_CONTEXT_CHARS)
+    end = index + len(term) + SNIPPET_CONTEXT_CHARS
+    snippet = body[start:index] + "[" + body[index:index + len(term)] + "]" + body[index + len(term):end]
+    return ("…" if start > 0 else "") + snippet.strip() + ("…" if end < len(body) else "")
+
+
+_indexes: Dict[str, ArticleSearchIndex] = {}
+
+
+def get_article_search_index(base_path: str) -> ArticleSearchIndex:
+    """获取指定文章根目录的共享全文索引，每个根目录对应一个数据库文件。"""
+    base_path = os.path.abspath(base_path)
+    if base_path not in _indexes:
+        digest = hashlib.sha1(base_path.encode("utf-8")).hexdigest()[:12]
+        db_path = get_cache_dir() / f"article_search_{digest}.db"
+        logger.info("Using article search index for %s: %s", base_path, db_path)
+        _indexes[base_path] = ArticleSearchIndex(str(db_path))
+    return _indexes[base_path]
+
+
+def _sync_index(catalog: ArticleCatalog, index: ArticleSearchIndex) -> List[dict]:
+    """Refresh the catalog, bring the search index up to date and return all articles.
+
+    The catalog only lists date folders whose mtime changed. The index stats each
+    article, so in-place edits are picked up, but only reads changed ones.
+    """
+    catalog.refresh()
+    entries = catalog.all_articles()
+    index.sync(entries)
+    return entries
+
+
+async def search_articles(arguments: dict | None) -> list[types.TextContent]:
+    """Search articles by content and return ranked hits with snippets and token counts."""
+    if not arguments or not arguments.get("query"):
+        logger.error("Missing query argument")
+        raise ValueError("Missing query argument")
+
+    base_path = os.getenv("article_base_path")
+    if not base_path:
+        logger.error("article_base_path not set in environment variables")
+        raise ValueError("article_base_path not set in environment variables")
+    base_path = os.path.expanduser(base_path)
+
+    start_date, end_date = "0000-00-00", "9999-99-99"
+    if arguments.get("date_input"):
+        start_date, end_date = parse_date_range(arguments["date_input"])
+    try:
+        limit = int(arguments.get("limit") or DEFAULT_SEARCH_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 0 < limit <= MAX_SEARCH_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+
+    catalog = get_article_catalog(base_path)
+    index = get_article_search_index(base_path)
+    if arguments.get("refresh_cache"):
+        index.clear()
+
+    started = time.monotonic()
+    entries = await asyncio.to_thread(_sync_index, catalog, index)
+    hits = await asyncio.to_thread(index.search, arguments["query"], start_date, end_date, limit)
+    logger.info("Search %r returned %d hits in %.1fms", arguments["query"], len(hits),
+                (time.monotonic() - started) * 1000)
+
+    # Token counts come from the catalog; only hits that were never counted are tokenized
+    entries_by_path = {entry["file_path"]: entry for entry in entries}
+    hit_entries = [entries_by_path[hit["file_path"]] for hit in hits if hit["file_path"] in entries_by_path]
+    cache = None
+    try:
+        cache = get_token_cache()
+    except Exception as e:
+        logger.warning("Token cache unavailable, counting without cache: %s", str(e))
+    await ensure_token_counts(hit_entries, catalog, cache, tiktoken.encoding_for_model("gpt-4"))
+
+    results = []
+    for hit in hits:
+        entry = entries_by_path.get(hit["file_path"])
+        if entry is None:
+            continue
+        item = {
+            "title": entry["title"],
+            "date": hit["date"],
+            "uri": article_uri(hit["date"], hit["file_path"]),
+            "file_path": hit["file_path"],
+            "snippet": hit["snippet"],
+            "score": hit["score"],
+        }
+        if entry.get("error"):
+            item["error"] = entry["error"]
+        else:
+            item["token_count"] = entry["token_count"]
+        results.append(item)
+
+    return [
+        types.TextContent(
+            type="text",
+            text=json.dumps(
+                {
+                    "query": arguments["query"],
+                    "hits": results,
+                    "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+                },
+                ensure_ascii=False,
+                indent=2,
+            ),
+        )
+    ]
@@ -1,27 +1,303 @@
 """Content analysis tool."""
+import asyncio
+import json
 from pathlib import Path
 import yaml
-import re
 import os
 import mcp.types as types
-from think_llm_client import LLMClient
+import tiktoken
 from think_llm_client.utils.logger import logging
 from datetime import datetime
+from .analysis_manifest import MANIFEST_FILENAME, AnalysisManifest
+from .front_matter import hash_file_body, read_body, read_body_and_hash, read_front_matter, rewrite_front_matter
+from .llm_cache import get_response_cache, response_cache_key, response_cache_stats
+from .llm_pool import get_llm_pool, stream_chat
+from .model_router import format_model_spec, get_model_router, parse_model_spec, usage_scope
+from .path_filter import PathFilter, is_binary_file
+from .progress import current_progress
+from .token_cache import get_token_cache
 
 # 获取模块的日志记录器
 logger = logging.getLogger("think-mcp-server")
 
+# 目录模式下默认同时分析的文件数
+DEFAULT_CONCURRENCY = 4
+
+# 批量模式下每个请求最多包含的文件数
+MAX_BATCH_FILES = 20
+
+# 正文超过该 token 数时分段摘要后再归约（map-reduce），0 表示不分段
+DEFAULT_CHUNK_TOKENS = 24000
+
+# 分段摘要时单个文件同时发送的请求数
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+# 单个请求的输出 token 上限，达到后截断；以及流式输出的最长停顿（秒）
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+DEFAULT_STREAM_IDLE_TIMEOUT = 120
+
+# 分段摘要的提示词
+CHUNK_SUMMARY_PROMPT = "以下是文件《{name}》的第 {index}/{total} 部分，请概括这部分的主要内容和关键信息，保留重要的名词、数据和结论："
+
+# 预估时每个请求的输出 token 数、输出速度（token/秒）和固定开销（秒）
+DEFAULT_PLAN_OUTPUT_TOKENS = 300
+DEFAULT_PLAN_OUTPUT_TPS = 30
+PLAN_REQUEST_OVERHEAD_SECONDS = 2.0
+
+# 预估费用使用的单价（每百万 token），默认是硅基流动 DeepSeek-V3 的价格（元）
+DEFAULT_PRICE_INPUT = 2.0
+DEFAULT_PRICE_OUTPUT = 8.0
+
+# 内容分析默认使用的模型，可以通过 content_analyzer_model_* 配置按大小分流
+MODEL_TYPE = "llm"
+MODEL_PROVIDER = "硅基流动"
+MODEL_NAME = "Pro/deepseek-ai/DeepSeek-V3"
+
+# 批量模式下正文字节数超过 batch_tokens 的该倍数时，不读取正文直接单独分析
+BATCH_MAX_BYTES_PER_TOKEN = 16
+
+# 提示词模板缓存：((路径, 修改时间, 大小), 模板内容)
+_prompt_cache = None
+
+
+def _get_concurrency(arguments: dict) -> int:
+    """获取目录模式的并发数，优先取参数 concurrency，其次取 content_analyzer_concurrency 环境变量。"""
+    value = arguments.get("concurrency") or os.getenv("content_analyzer_concurrency") or DEFAULT_CONCURRENCY
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid concurrency: {value}")
+    if concurrency <= 0:
+        raise ValueError(f"concurrency must be > 0, got {concurrency}")
+    return concurrency
+
+
+def _get_batch_tokens(arguments: dict) -> int:
+    """获取批量模式每个请求的 token 上限，优先取参数 batch_tokens，其次取 content_analyzer_batch_tokens 环境变量，0 表示不批量。"""
+    value = arguments.get("batch_tokens")
+    if value is None:
+        value = os.getenv("content_analyzer_batch_tokens", "0")
+    try:
+        batch_tokens = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid batch_tokens: {value}")
+    return max(0, batch_tokens)
+
+
+def _get_patterns(arguments: dict, name: str) -> list[str]:
+    """获取规则列表参数，参数可以是列表或逗号分隔的字符串，未提供时取 content_analyzer_{name} 环境变量。"""
+    value = arguments.get(name)
+    if value is None:
+        value = os.getenv(f"content_analyzer_{name}", "")
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise ValueError(f"Invalid {name}: {value}")
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _get_path_filter(path: Path, arguments: dict) -> PathFilter:
+    """根据参数和环境变量构造目录模式的文件过滤器。"""
+    use_gitignore = arguments.get("use_gitignore")
+    if use_gitignore is None:
+        use_gitignore = os.getenv("content_analyzer_use_gitignore", "true").lower() != "false"
+    return PathFilter(
+        path,
+        include=_get_patterns(arguments, "include"),
+        exclude=_get_patterns(arguments, "exclude") + [MANIFEST_FILENAME + "*"],
+        extensions=_get_patterns(arguments, "extensions"),
+        use_gitignore=bool(use_gitignore),
+    )
+
+
+def _collect_files(
+    path: Path,
+    arguments: dict,
+    manifest: AnalysisManifest,
+) -> tuple[list[Path], list[tuple[Path, str]]]:
+    """Walk the directory and drop binary files; runs in a worker thread.
+
+    Rules prune the walk first, and only files not current in the manifest are sniffed.
+    A file that cannot be read, or disappears during the walk, is returned as an error
+    instead of aborting the whole run.
+
+    Returns:
+        ([待分析的文件, ...], [(无法读取的文件, 错误信息), ...])
+    """
+    candidates = sorted(_get_path_filter(path, arguments).walk())
+    files = []
+    errors = []
+    for file in candidates:
+        try:
+            if file.is_file() and (manifest.is_current(file) or not is_binary_file(file)):
+                files.append(file)
+        except OSError as e:
+            logger.error("Error processing file %s: %s", file, str(e))
+            errors.append((file, str(e)))
+    skipped = len(candidates) - len(files) - len(errors)
+    if skipped:
+        logger.info("Skipped %d binary or special files", skipped)
+    return files, errors
+
+
+def _get_chunk_tokens() -> int:
+    """获取分段摘要的 token 阈值（content_analyzer_chunk_tokens 环境变量），0 表示不分段。"""
+    return int(os.getenv("content_analyzer_chunk_tokens", str(DEFAULT_CHUNK_TOKENS)))
+
+
+def get_prompt_template() -> str:
+    """Return the content analyzer prompt, re-reading the file only when its mtime or size changes."""
+    global _prompt_cache
+    prompt_path = os.getenv('content_analyzer_prompt_path')
+    if prompt_path is None:
+        logger.error("content_analyzer_prompt_path environment variable not set")
+        raise ValueError("content_analyzer_prompt_path environment variable not set")
+
+    # 展开路径中的 ~ 符号
+    prompt_path = os.path.expanduser(prompt_path)
+    try:
+        stat = os.stat(prompt_path)
+    except FileNotFoundError:
+        logger.error("Prompt template file not found at: %s", prompt_path)
+        raise FileNotFoundError(f"Prompt template file not found at: {prompt_path}")
+
+    key = (prompt_path, stat.st_mtime_ns, stat.st_size)
+    if _prompt_cache is None or _prompt_cache[0] != key:
+        with open(prompt_path, 'r', encoding='utf-8') as f:
+            _prompt_cache = (key, f.read().strip())
+        logger.debug("Prompt template loaded from: %s", prompt_path)
+    return _prompt_cache[1]
+
+
+def _router():
+    """Return the shared model router, defaulting to MODEL_TYPE/MODEL_PROVIDER/MODEL_NAME."""
+    return get_model_router((MODEL_TYPE, MODEL_PROVIDER, MODEL_NAME))
+
+
+def _count_tokens(text: str) -> int:
+    """Count the tokens of a piece of streamed output."""
+    return len(tiktoken.encoding_for_model("gpt-4").encode(text))
+
+
+async def _chat(message: str, tokens: int | None = None) -> str:
+    """Send one message through the model router and return the streamed response text.
+
+    The router picks the model by tokens, the input token count the caller already
+    knows. Without it the message's UTF-8 size is used, which is an upper bound, so
+    the message is never tokenized here. The router moves to the configured fallback
+    models on timeouts, rate limits and server errors. Each streamed chunk advances
+    the progress of the current tool call, if the client asked for progress. The
+    output is capped at content_analyzer_max_output_tokens, counted with the
+    tokenizer rather than by streamed chunks, and a stream idle for
+    content_analyzer_stream_idle_timeout seconds is abandoned.
+    """
+    max_tokens = int(os.getenv("content_analyzer_max_output_tokens", str(DEFAULT_MAX_OUTPUT_TOKENS)))
+    idle_timeout = float(os.getenv("content_analyzer_stream_idle_timeout", str(DEFAULT_STREAM_IDLE_TIMEOUT)))
+    progress = current_progress()
+
+    async def on_delta(_: str) -> None:
+        await progress.advance()
+
+    async def request(model) -> str:
+        async with get_llm_pool(*model).client() as client:
+            response = await stream_chat(
+                client,
+                message,
+                max_tokens=max_tokens or None,
+                idle_timeout=idle_timeout or None,
+                on_delta=on_delta if progress is not None else None,
+                count_tokens=_count_tokens,
+            )
+        if not response:
+            raise RuntimeError("LLM request failed")
+        return response
+
+    # token 数不会超过 UTF-8 字节数
+    if tokens is None:
+        tokens = len(message.encode('utf-8'))
+    return await _router().call(tokens, len(message), request)
+
+
+def split_by_tokens(text: str, encoder, chunk_tokens: int) -> list[str]:
+    """Split text into chunks of at most about chunk_tokens tokens.
+
+    Chunks are cut at line boundaries; a single line longer than chunk_tokens is cut
+    into token slices.
+    """
+    chunks = []
+    current: list[str] = []
+    used = 0
+    for line in text.splitlines(keepends=True):
+        tokens = encoder.encode(line)
+        if len(tokens) > chunk_tokens:
+            if current:
+                chunks.append("".join(current))
+                current, used = [], 0
+            chunks.extend(
+                encoder.decode(tokens[start:start + chunk_tokens])
+                for start in range(0, len(tokens), chunk_tokens)
+            )
+            continue
+        if current and used + len(tokens) > chunk_tokens:
+            chunks.append("".join(current))
+            current, used = [], 0
+        current.append(line)
+        used += len(tokens)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+async def _map_reduce_analyze(name: str, content: str, prompt_template: str, encoder, chunk_tokens: int) -> str:
+    """Analyze a file larger than chunk_tokens.
+
+    The file is split into chunks that are summarized concurrently. The joined
+    summaries are then analyzed with the prompt template. Summaries that are still
+    too long are summarized again. Chunk summaries are cached, so a re-run after a
+    local edit only resends the changed chunks.
+    """
+    model = _router().name
+    cache = get_response_cache()
+    concurrency = max(1, int(os.getenv("content_analyzer_chunk_concurrency", str(DEFAULT_CHUNK_CONCURRENCY))))
+    semaphore = asyncio.Semaphore(concurrency)
+    # 每段不超过 chunk_tokens 个 token，与预估一样按上限选择模型
+    chunk_request_tokens = len(encoder.encode(CHUNK_SUMMARY_PROMPT)) + chunk_tokens
+    prompt_tokens = len(encoder.encode(prompt_template))
+
+    async def summarize(index: int, total: int, chunk: str) -> str:
+        cache_key = response_cache_key(model, CHUNK_SUMMARY_PROMPT, chunk)
+        summary = cache.get(cache_key)
+        if summary is None:
+            async with semaphore:
+                summary = await _chat(
+                    f"{CHUNK_SUMMARY_PROMPT.format(name=name, index=index, total=total)}\n\n{chunk}",
+                    chunk_request_tokens,
+                )
+            cache.put(cache_key, model, summary)
+        return summary
+
+    text = content
+    text_tokens = len(encoder.encode(text))
+    while True:
+        chunks = split_by_tokens(text, encoder, chunk_tokens)
+        logger.info("Summarizing %s in %d chunks (concurrency %d)", name, len(chunks), concurrency)
+        summaries = await asyncio.gather(
+            *(summarize(index, len(chunks), chunk) for index, chunk in enumerate(chunks, 1))
+        )
+        text = "\n\n".join(f"[第 {index} 部分]\n{summary}" for index, summary in enumerate(summaries, 1))
+        # 摘要仍然超长且确实在变短时继续归约
+        summary_tokens = len(encoder.encode(text))
+        if len(chunks) == 1 or summary_tokens <= chunk_tokens or summary_tokens >= text_tokens:
+            break
+        text_tokens = summary_tokens
+    return await _chat(
+        f"{prompt_template}（以下是一个长文件按顺序分段的摘要）：\n\n{text}", prompt_tokens + summary_tokens
+    )
+
+
 async def analyze_file_content(file_path: str) -> dict:
     """Analyze file content using LLM and return a description."""
     try:
-        client = LLMClient()
-        logger.debug("LLM client created successfully")
-        model_type = "llm"
-        model_provider = "硅基流动"
-        model_name = "Pro/deepseek-ai/DeepSeek-V3"
-        client.set_model(model_type, model_provider, model_name)
-        logger.debug("Model set to %s/%s/%s", model_type, model_provider, model_name)
-
         # Read file content
         path = Path(file_path)
         if not path.is_file():
@@ -29,36 +305,47 @@ async def analyze_file_content(file_path: str) -> dict:
             raise ValueError(f"Path {file_path} is not a file")
 
         logger.info("Analyzing file: %s", file_path)
-        prompt_path = os.getenv('content_analyzer_prompt_path')
-        if prompt_path is None:
-            logger.error("content_analyzer_prompt_path environment variable not set")
-            raise ValueError("content_analyzer_prompt_path environment variable not set")
-        logger.debug("Using prompt template from: %s", prompt_path)
+        prompt_template = get_prompt_template()
         
-        # 展开路径中的 ~ 符号
-        prompt_path = os.path.expanduser(prompt_path)
-        
-        if not os.path.exists(prompt_path):
-            logger.error("Prompt template file not found at: %s", prompt_path)
-            raise FileNotFoundError(f"Prompt template file not found at: {prompt_path}")
-            
-        with open(str(prompt_path), 'r', encoding='utf-8') as f:
-            prompt_template = f.read().strip()
-        logger.debug("Prompt template loaded successfully")
-        
-        content = path.read_text(encoding='utf-8')
+        # 只发送正文，front matter 是本工具生成的，发送它只会让相同内容无法命中缓存
+        _, body_offset = await asyncio.to_thread(read_front_matter, path)
+        content = await asyncio.to_thread(read_body, path, body_offset)
         logger.debug("File content loaded successfully, length: %d chars", len(content))
-        
-        # Call LLM to analyze content
-        logger.debug("Sending request to LLM...")
-        _, response = await client.chat(f"{prompt_template}：\n\n{content}", stream=False)
+
+        model = _router().name
+        cache = get_response_cache()
+        cache_key = response_cache_key(model, prompt_template, content)
+        response = cache.get(cache_key)
+        if response is not None:
+            logger.debug("LLM response cache hit for %s", file_path)
+            return {"type": "text", "text": response}
+
+        chunk_tokens = _get_chunk_tokens()
+        router = _router()
+        size = len(content.encode('utf-8'))
+        # token 数不会超过 UTF-8 字节数：字节数既不超过分段阈值、也不超过小模型上限的文件无需分词；
+        # 需要时从 token 缓存取正文的 token 数，与预估使用同一个计数
+        body_tokens = None
+        if (chunk_tokens > 0 and size > chunk_tokens) or (router.small is not None and size > router.small_max_tokens):
+            encoder = tiktoken.encoding_for_model("gpt-4")
+            body_tokens = await asyncio.to_thread(
+                _count_body_tokens, path, body_offset, encoder, _get_token_cache(), content
+            )
+        if body_tokens is not None and chunk_tokens > 0 and body_tokens > chunk_tokens:
+            response = await _map_reduce_analyze(path.name, content, prompt_template, encoder, chunk_tokens)
+        else:
+            # Call LLM to analyze content with a pooled client
+            logger.debug("Sending request to LLM...")
+            tokens = None if body_tokens is None else len(encoder.encode(prompt_template)) + body_tokens
+            response = await _chat(f"{prompt_template}：\n\n{content}", tokens)
         logger.debug("Received response from LLM, length: %d chars", len(response))
+        cache.put(cache_key, model, response)
         return {"type": "text", "text": response}
     except Exception as e:
         logger.error("Error analyzing content: %s", str(e), exc_info=True)
-        return {"type": "text", "text": f"Error analyzing content: {str(e)}"}
+        return {"type": "text", "text": f"Error analyzing content: {str(e)}", "error": str(e)}
 
-def generate_front_matter(file_path: str, description: str) -> str:
+def generate_front_matter(file_path: str, description: str, content_hash: str | None = None) -> str:
     """Generate front matter for a file."""
     path = Path(file_path)
     current_time = datetime.now().strftime("%Y-%m-%d")
@@ -67,9 +354,491 @@ def generate_front_matter(file_path: str, description: str) -> str:
         "description": description,
         "edit_time": current_time
     }
+    if content_hash:
+        front_matter["content_hash"] = content_hash
     return f"---\n{yaml.dump(front_matter, allow_unicode=True)}---\n"
 
 
+def _skip_reason(existing_front_matter: dict | None, content_hash: str, update_after: str | None) -> str | None:
+    """Return why a file needs no analysis ("content_unchanged" or "edited_after"), or None."""
+    # 正文哈希与记录一致时直接跳过，不再调用 LLM
+    if existing_front_matter and existing_front_matter.get("content_hash"):
+        if existing_front_matter["content_hash"] == content_hash:
+            return "content_unchanged"
+    # 没有记录哈希的旧文件，如果指定了更新截止日期，检查文件的edit_time
+    elif update_after and existing_front_matter and "edit_time" in existing_front_matter:
+        try:
+            file_edit_time = datetime.strptime(str(existing_front_matter["edit_time"]), "%Y-%m-%d")
+            update_after_time = datetime.strptime(update_after, "%Y-%m-%d")
+            # 如果文件的编辑时间晚于指定的更新截止日期，则不需要更新
+            if file_edit_time > update_after_time:
+                return "edited_after"
+        except Exception as e:
+            logger.warning("Error parsing front matter for date check: %s", str(e))
+            # 如果解析出错，继续更新文件
+    return None
+
+
+def _prepare_file(
+    path: Path,
+    update_after: str | None,
+    manifest: AnalysisManifest | None = None,
+) -> tuple[list[types.TextContent] | None, int, str]:
+    """Read a file's front matter, hash its body and decide whether it needs analysis.
+
+    Only the header is parsed; the body is hashed as a stream and never loaded.
+
+    Returns:
+        (跳过时的结果，需要分析时为 None, 正文起始偏移, 正文哈希)
+    """
+    file_path = str(path)
+    existing_front_matter, body_offset = read_front_matter(path)
+    content_hash = hash_file_body(path, body_offset)
+    reason = _skip_reason(existing_front_matter, content_hash, update_after)
+    if reason == "content_unchanged":
+        logger.info("File %s is unchanged since last analysis, skipping", file_path)
+        if manifest is not None:
+            manifest.record(path, content_hash)
+        return [types.TextContent(type="text", text=f"File: {file_path} - No update needed (content unchanged)")], body_offset, content_hash
+    if reason == "edited_after":
+        logger.info("File %s was updated after %s, skipping", file_path, update_after)
+        return [types.TextContent(type="text", text=f"File: {file_path} - No update needed (last edit was after {update_after})")], body_offset, content_hash
+    return None, body_offset, content_hash
+
+
+def _write_description(
+    path: Path,
+    content_hash: str,
+    description: dict,
+    manifest: AnalysisManifest | None = None,
+) -> list[types.TextContent]:
+    """Replace the file's front matter with one holding the new description."""
+    file_path = str(path)
+    logger.debug("Got description result: %s", description)
+    
+    # 分析失败时不记录哈希，下次运行会重新分析
+    logger.debug("Generating front matter...")
+    front_matter = generate_front_matter(
+        file_path, description["text"], None if description.get("error") else content_hash
+    )
+    logger.debug("Front matter generated successfully")
+    
+    # 用新的front matter替换现有的front matter（如果存在），正文流式复制后原子替换；
+    # 只有显式开启 content_analyzer_keep_hard_links 时才以非原子写回的方式保留硬链接
+    keep_hard_links = os.getenv("content_analyzer_keep_hard_links", "false").lower() == "true"
+    rewrite_front_matter(path, front_matter, keep_hard_links)
+    logger.info("File updated successfully with new front matter")
+    if manifest is not None and not description.get("error"):
+        manifest.record(path, content_hash)
+    
+    return [types.TextContent(type="text", text=f"File: {file_path} {front_matter}")]
+
+
+async def analyze_single_file(
+    path: Path,
+    update_after: str | None,
+    manifest: AnalysisManifest | None = None,
+) -> list[types.TextContent]:
+    """Analyze one file and rewrite its front matter unless its body is unchanged.
+
+    Files whose front matter records the hash of the current body are skipped. Files
+    without a recorded hash fall back to the edit_time check against update_after.
+    Files whose hash is known to be current are recorded in the manifest, if given.
+    Hashing the body and rewriting the file run in a worker thread.
+    """
+    skipped, _, content_hash = await asyncio.to_thread(_prepare_file, path, update_after, manifest)
+    if skipped is not None:
+        return skipped
+    description = await analyze_file_content(str(path))
+    return await asyncio.to_thread(_write_description, path, content_hash, description, manifest)
+
+
+def _parse_batch_response(response: str, count: int) -> dict[int, str]:
+    """Parse the JSON object of a batch response into {file number: description}."""
+    start = response.find("{")
+    end = response.rfind("}")
+    if start < 0 or end <= start:
+        raise ValueError("No JSON object in batch response")
+    data = json.loads(response[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("Batch response is not a JSON object")
+    descriptions = {}
+    for key, value in data.items():
+        try:
+            number = int(key)
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= count and value:
+            descriptions[number] = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return descriptions
+
+
+async def analyze_batch_content(
+    items: list[tuple[str, str]], body_tokens: dict[str, int] | None = None
+) -> dict[str, dict]:
+    """Analyze several small files with one LLM request.
+
+    Files already in the response cache are answered from it. The rest are sent
+    together, and the model is asked for a JSON object keyed by file number. Files
+    missing from a malformed or partial answer fall back to one request each.
+
+    Args:
+        items: [(文件路径, 正文), ...]
+        body_tokens: {文件路径: 正文 token 数}，用于选择模型，缺少时按请求的字节数选择
+
+    Returns:
+        {文件路径: 与 analyze_file_content 相同格式的结果}
+    """
+    prompt_template = get_prompt_template()
+    model = _router().name
+    cache = get_response_cache()
+    results: dict[str, dict] = {}
+    pending = []
+    for file_path, body in items:
+        cached = cache.get(response_cache_key(model, prompt_template, body))
+        if cached is not None:
+            results[file_path] = {"type": "text", "text": cached}
+        else:
+            pending.append((file_path, body))
+
+    if len(pending) > 1:
+        sections = "\n\n".join(
+            f"=== 文件 {number}: {Path(file_path).name} ===\n{body}"
+            for number, (file_path, body) in enumerate(pending, 1)
+        )
+        message = (
+            f"{prompt_template}\n\n下面共有 {len(pending)} 个文件，请按上述要求分别分析每个文件。"
+            f"只输出一个 JSON 对象，键为文件编号（\"1\" 到 \"{len(pending)}\"），"
+            f"值为对应文件的分析结果文本，不要输出其他内容。\n\n{sections}"
+        )
+        tokens = None
+        if body_tokens is not None and all(file_path in body_tokens for file_path, _ in pending):
+            tokens = len(tiktoken.encoding_for_model("gpt-4").encode(prompt_template)) + sum(
+                body_tokens[file_path] for file_path, _ in pending
+            )
+        logger.info("Sending batch request for %d files", len(pending))
+        try:
+            descriptions = _parse_batch_response(await _chat(message, tokens), len(pending))
+        except Exception as e:
+            logger.warning("Batch request failed, analyzing files one by one: %s", str(e))
+            descriptions = {}
+        for number, (file_path, body) in enumerate(pending, 1):
+            if number in descriptions:
+                # 批量得到的结果同样按单个文件的键缓存
+                cache.put(response_cache_key(model, prompt_template, body), model, descriptions[number])
+                results[file_path] = {"type": "text", "text": descriptions[number]}
+        if len(descriptions) < len(pending):
+            logger.warning("Batch response covered %d/%d files", len(descriptions), len(pending))
+
+    for file_path, _ in items:
+        if file_path not in results:
+            results[file_path] = await analyze_file_content(file_path)
+    return results
+
+
+def _pack_batches(items: list, batch_tokens: int, tokens_of) -> list[list]:
+    """Pack items in order into batches of at most batch_tokens tokens and MAX_BATCH_FILES items."""
+    batches = []
+    current = []
+    used = 0
+    for item in items:
+        tokens = tokens_of(item)
+        if current and (used + tokens > batch_tokens or len(current) >= MAX_BATCH_FILES):
+            batches.append(current)
+            current = []
+            used = 0
+        current.append(item)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _get_token_cache():
+    """Return the shared token cache, or None if it cannot be opened."""
+    try:
+        return get_token_cache()
+    except Exception as e:
+        logger.warning("Token cache unavailable, counting without cache: %s", str(e))
+        return None
+
+
+def _count_body_tokens(path: Path, body_offset: int, encoder, cache, body: str | None = None) -> int:
+    """Count the body tokens of a file, cached by the file's size and mtime.
+
+    The body is read only on a cache miss, unless the caller already has it.
+    """
+    stat = os.stat(path)
+    # 与整个文件的 token 数区分开，使用单独的编码键
+    encoding = f"{encoder.name}:body"
+    if cache is not None:
+        token_count = cache.get(str(path), stat.st_size, stat.st_mtime_ns, encoding)
+        if token_count is not None:
+            return token_count
+    token_count = len(encoder.encode(read_body(path, body_offset) if body is None else body))
+    if cache is not None:
+        cache.put(str(path), stat.st_size, stat.st_mtime_ns, token_count, encoding)
+    return token_count
+
+
+def _sort_for_batching(
+    files: list[Path],
+    update_after: str | None,
+    manifest: AnalysisManifest,
+    batch_tokens: int,
+    file_results: list[list[types.TextContent]],
+) -> tuple[list, list]:
+    """Decide for each file whether it is skipped, batched or analyzed alone.
+
+    Skipped files and errors are stored in file_results. Body token counts come from
+    the token cache, so unchanged files are not tokenized again; bodies are not kept.
+
+    Returns:
+        ([(序号, 文件, 正文起始偏移, 正文哈希, token 数), ...], [(序号, 文件), ...])
+    """
+    encoder = tiktoken.encoding_for_model("gpt-4")
+    cache = _get_token_cache()
+    small = []
+    large = []
+    for index, file in enumerate(files):
+        try:
+            if manifest.is_current(file):
+                file_results[index] = [types.TextContent(type="text", text=f"File: {file} - No update needed (unchanged since last run)")]
+                continue
+            skipped, body_offset, content_hash = _prepare_file(file, update_after, manifest)
+            if skipped is not None:
+                file_results[index] = skipped
+                continue
+            # 正文明显超过批量上限的文件不统计 token，直接单独分析
+            if os.stat(file).st_size - body_offset > batch_tokens * BATCH_MAX_BYTES_PER_TOKEN:
+                large.append((index, file))
+                continue
+            tokens = _count_body_tokens(file, body_offset, encoder, cache)
+        except Exception as e:
+            logger.error("Error processing file %s: %s", file, str(e))
+            file_results[index] = [types.TextContent(type="text", text=f"Error processing {file.name}: {str(e)}")]
+            continue
+        if tokens <= batch_tokens // 2:
+            small.append((index, file, body_offset, content_hash, tokens))
+        else:
+            large.append((index, file))
+    return small, large
+
+
+async def _analyze_files_batched(
+    files: list[Path],
+    update_after: str | None,
+    manifest: AnalysisManifest,
+    semaphore: asyncio.Semaphore,
+    batch_tokens: int,
+) -> list[list[types.TextContent]]:
+    """Directory mode with batching: small files share LLM requests up to batch_tokens.
+
+    Files of at most batch_tokens / 2 tokens are packed in file order into batches of up
+    to batch_tokens tokens and MAX_BATCH_FILES files; larger files are analyzed alone.
+    Sorting the files runs in a worker thread, and bodies are read only when their
+    batch is sent.
+    """
+    file_results: list[list[types.TextContent]] = [[] for _ in files]
+    small, large = await asyncio.to_thread(
+        _sort_for_batching, files, update_after, manifest, batch_tokens, file_results
+    )
+
+    batches = _pack_batches(small, batch_tokens, lambda item: item[4])
+    logger.info("Packed %d small files into %d batches, %d files analyzed alone",
+                len(small), len(batches), len(large))
+
+    def read_bodies(batch: list) -> list[tuple[str, str]]:
+        items = []
+        for index, file, body_offset, _, _ in batch:
+            try:
+                items.append((str(file), read_body(file, body_offset)))
+            except Exception as e:
+                logger.error("Error processing file %s: %s", file, str(e))
+                file_results[index] = [types.TextContent(type="text", text=f"Error processing {file.name}: {str(e)}")]
+        return items
+
+    async def run_batch(batch: list) -> None:
+        async with semaphore:
+            items = await asyncio.to_thread(read_bodies, batch)
+            try:
+                body_tokens = {str(file): tokens for _, file, _, _, tokens in batch}
+                descriptions = await analyze_batch_content(items, body_tokens) if items else {}
+            except Exception as e:
+                logger.error("Error analyzing batch: %s", str(e))
+                descriptions = {}
+            read = {file_path for file_path, _ in items}
+            for index, file, _, content_hash, _ in batch:
+                if str(file) not in read:
+                    continue
+                try:
+                    description = descriptions.get(str(file)) or await analyze_file_content(str(file))
+                    file_results[index] = await asyncio.to_thread(
+                        _write_description, file, content_hash, description, manifest
+                    )
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", file, str(e))
+                    file_results[index] = [types.TextContent(type="text", text=f"Error processing {file.name}: {str(e)}")]
+
+    async def run_single(index: int, file: Path) -> None:
+        async with semaphore:
+            try:
+                file_results[index] = await analyze_single_file(file, update_after, manifest)
+            except Exception as e:
+                logger.error("Error processing file %s: %s", file, str(e))
+                file_results[index] = [types.TextContent(type="text", text=f"Error processing {file.name}: {str(e)}")]
+
+    await asyncio.gather(
+        *(run_batch(batch) for batch in batches),
+        *(run_single(index, file) for index, file in large),
+    )
+    return file_results
+
+
+def _get_model_prices() -> dict[str, tuple[float, float]]:
+    """Parse content_analyzer_model_prices into {model spec: (input price, output price)}.
+
+    The setting is a comma-separated list of type/provider/model=input:output entries;
+    models not listed use content_analyzer_price_input / content_analyzer_price_output.
+    """
+    prices = {}
+    for entry in os.getenv("content_analyzer_model_prices", "").split(","):
+        if not entry.strip():
+            continue
+        spec, separator, price = entry.rpartition("=")
+        price_input, colon, price_output = price.partition(":")
+        if not separator or not colon:
+            raise ValueError(f"Invalid model price: {entry.strip()!r}, expected 'type/provider/model=input:output'")
+        prices[format_model_spec(parse_model_spec(spec))] = (float(price_input), float(price_output))
+    return prices
+
+
+def plan_analysis(
+    files: list[Path],
+    update_after: str | None,
+    manifest: AnalysisManifest | None,
+    concurrency: int,
+    batch_tokens: int,
+) -> dict:
+    """Estimate what analyze_content would do, without calling the LLM or writing files.
+
+    Files go through the same skip checks as a real run. Files whose response is
+    already in the LLM response cache need no request and are reported as
+    cached_files. Body token counts are cached by file size and mtime, so repeated
+    plans of a large tree only tokenize changed files. Requests, tokens, cost and wall time follow the single, batched and
+    map-reduce paths, and each request is counted and priced against the model the
+    router would pick. Output tokens and generation speed come from
+    content_analyzer_plan_output_tokens and content_analyzer_plan_output_tps, and
+    prices from content_analyzer_model_prices, falling back to
+    content_analyzer_price_input / content_analyzer_price_output.
+    """
+    encoder = tiktoken.encoding_for_model("gpt-4")
+    cache = _get_token_cache()
+    response_cache = get_response_cache()
+    model_name = _router().name
+    prompt_template = get_prompt_template()
+    prompt_tokens = len(encoder.encode(prompt_template))
+    chunk_prompt_tokens = len(encoder.encode(CHUNK_SUMMARY_PROMPT))
+    chunk_tokens = _get_chunk_tokens()
+    output_tokens = int(os.getenv("content_analyzer_plan_output_tokens", str(DEFAULT_PLAN_OUTPUT_TOKENS)))
+    output_tps = float(os.getenv("content_analyzer_plan_output_tps", str(DEFAULT_PLAN_OUTPUT_TPS)))
+    default_price = (
+        float(os.getenv("content_analyzer_price_input", str(DEFAULT_PRICE_INPUT))),
+        float(os.getenv("content_analyzer_price_output", str(DEFAULT_PRICE_OUTPUT))),
+    )
+    model_prices = _get_model_prices()
+
+    skipped = {"unchanged_since_last_run": 0, "content_unchanged": 0, "edited_after": 0}
+    errors = []
+    planned = []
+    cached_files = 0
+    for file in files:
+        try:
+            if manifest is not None and manifest.is_current(file):
+                skipped["unchanged_since_last_run"] += 1
+                continue
+            existing_front_matter, body_offset = read_front_matter(file)
+            # 正文只读取一次，同时用于跳过判断、响应缓存查询和 token 计数
+            body, content_hash = read_body_and_hash(file, body_offset)
+            reason = _skip_reason(existing_front_matter, content_hash, update_after)
+            if reason is not None:
+                skipped[reason] += 1
+                continue
+            # 与实际运行一样，先按正文查询响应缓存，命中的文件不会发送请求
+            if response_cache.has(response_cache_key(model_name, prompt_template, body)):
+                cached_files += 1
+                continue
+            planned.append((file, _count_body_tokens(file, body_offset, encoder, cache, body)))
+        except Exception as e:
+            errors.append({"file": str(file), "error": str(e)})
+
+    # 每个请求为 (输入 token, 输出 token)
+    requests = []
+    small = []
+    map_reduce_files = 0
+    for file, tokens in planned:
+        if batch_tokens and tokens <= batch_tokens // 2:
+            small.append((file, tokens))
+        elif chunk_tokens > 0 and tokens > chunk_tokens:
+            map_reduce_files += 1
+            chunks = -(-tokens // chunk_tokens)
+            requests.extend([(chunk_prompt_tokens + chunk_tokens, output_tokens)] * (chunks - 1))
+            requests.append((chunk_prompt_tokens + tokens - chunk_tokens * (chunks - 1), output_tokens))
+            requests.append((prompt_tokens + chunks * output_tokens, output_tokens))
+        else:
+            requests.append((prompt_tokens + tokens, output_tokens))
+    batches = _pack_batches(small, batch_tokens, lambda item: item[1]) if small else []
+    for batch in batches:
+        requests.append((prompt_tokens + sum(tokens for _, tokens in batch), output_tokens * len(batch)))
+
+    router = _router()
+    models: dict[str, dict] = {}
+    cost_input = cost_output = 0.0
+    for input_tokens, request_output_tokens in requests:
+        model = format_model_spec(router.route(input_tokens)[0])
+        price_input, price_output = model_prices.get(model, default_price)
+        entry = models.setdefault(model, {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0})
+        entry["requests"] += 1
+        entry["input_tokens"] += input_tokens
+        entry["output_tokens"] += request_output_tokens
+        entry["cost"] += (input_tokens * price_input + request_output_tokens * price_output) / 1_000_000
+        cost_input += input_tokens / 1_000_000 * price_input
+        cost_output += request_output_tokens / 1_000_000 * price_output
+    for entry in models.values():
+        entry["cost"] = round(entry["cost"], 4)
+    input_total = sum(request[0] for request in requests)
+    output_total = sum(request[1] for request in requests)
+    request_seconds = sum(PLAN_REQUEST_OVERHEAD_SECONDS + out / output_tps for _, out in requests)
+    return {
+        "dry_run": True,
+        "routing": model_name,
+        "models": models,
+        "files": len(files),
+        "to_analyze": len(planned) + cached_files,
+        "cached_files": cached_files,
+        "skipped": skipped,
+        "errors": errors,
+        "batches": len(batches),
+        "batched_files": len(small),
+        "map_reduce_files": map_reduce_files,
+        "requests": len(requests),
+        "body_tokens": sum(tokens for _, tokens in planned),
+        "input_tokens": input_total,
+        "estimated_output_tokens": output_total,
+        "estimated_cost": {
+            "input": round(cost_input, 4),
+            "output": round(cost_output, 4),
+            "total": round(cost_input + cost_output, 4),
+        },
+        "concurrency": concurrency,
+        "estimated_seconds": round(request_seconds / concurrency, 1),
+        "largest_files": [
+            {"file": str(file), "tokens": tokens}
+            for file, tokens in sorted(planned, key=lambda item: item[1], reverse=True)[:10]
+        ],
+    }
+
+
 async def analyze_content(arguments: dict | None) -> list[types.TextContent]:
     """Analyze content of a file or directory and generate front matter description."""
     if not arguments or "file_path" not in arguments:
@@ -87,75 +856,73 @@ async def analyze_content(arguments: dict | None) -> list[types.TextContent]:
         
         if path.is_dir():
             logger.info("Processing directory: %s", file_path)
-            file_count = 0
-            for file in path.rglob('*'):
-                if file.is_file():
-                    file_count += 1
-                    logger.debug("[%d] Processing file: %s", file_count, file)
-                    try:
-                        # 递归调用时传递update_after参数
-                        file_args = {"file_path": str(file)}
-                        if update_after:
-                            file_args["update_after"] = update_after
-                        file_result = await analyze_content(file_args)
-                        results.extend(file_result)
-                    except Exception as e:
-                        logger.error("Error processing file %s: %s", file, str(e))
-                        results.append(types.TextContent(type="text", text=f"Error processing {file.name}: {str(e)}"))
-            logger.info("Processed %d files in directory", file_count)
+            manifest = AnalysisManifest(path)
+            # 遍历和二进制判断都要访问大量文件，放到线程中执行，不阻塞事件循环
+            files, unreadable = await asyncio.to_thread(_collect_files, path, arguments, manifest)
+            results.extend(
+                types.TextContent(type="text", text=f"Error processing {file.name}: {error}")
+                for file, error in unreadable
+            )
+            manifest.prune(files)
+            concurrency = _get_concurrency(arguments)
+            if arguments.get("dry_run"):
+                plan = await asyncio.to_thread(
+                    plan_analysis, files, update_after, manifest, concurrency, _get_batch_tokens(arguments)
+                )
+                plan["errors"] = [{"file": str(file), "error": error} for file, error in unreadable] + plan["errors"]
+                return [types.TextContent(type="text", text=json.dumps(plan, ensure_ascii=False, indent=2))]
+            logger.info("Analyzing %d files with concurrency %d", len(files), concurrency)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def process(index: int, file: Path) -> list[types.TextContent]:
+                try:
+                    # 清单中大小和修改时间未变的文件无需打开
+                    if manifest.is_current(file):
+                        logger.debug("[%d/%d] Unchanged since last run: %s", index, len(files), file)
+                        return [types.TextContent(type="text", text=f"File: {file} - No update needed (unchanged since last run)")]
+                    async with semaphore:
+                        logger.debug("[%d/%d] Processing file: %s", index, len(files), file)
+                        return await analyze_single_file(file, update_after, manifest)
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", file, str(e))
+                    return [types.TextContent(type="text", text=f"Error processing {file.name}: {str(e)}")]
+
+            # gather 按提交顺序返回结果，输出顺序与文件顺序一致；中断时也保存已完成的进度
+            batch_tokens = _get_batch_tokens(arguments)
+            # 只统计本次调用发出的请求，同时进行的其他调用不会混入
+            with usage_scope() as usage:
+                try:
+                    if batch_tokens:
+                        file_results = await _analyze_files_batched(
+                            files, update_after, manifest, semaphore, batch_tokens
+                        )
+                    else:
+                        file_results = await asyncio.gather(
+                            *(process(index, file) for index, file in enumerate(files, 1))
+                        )
+                finally:
+                    manifest.save()
+            for file_result in file_results:
+                results.extend(file_result)
+            cache_stats = response_cache_stats()
+            if cache_stats:
+                logger.info("LLM response cache: %s", cache_stats)
+            model_usage = usage.snapshot()
+            logger.info("Model usage in this run: %s", model_usage)
+            if model_usage:
+                results.append(types.TextContent(
+                    type="text", text=json.dumps({"model_usage": model_usage}, ensure_ascii=False, indent=2)
+                ))
+            logger.info("Processed %d files in directory", len(files))
             return results
         
         elif path.is_file():
             logger.debug("Processing single file: %s", file_path)
-            
-            # 检查是否需要更新
-            should_update = True
-            content = path.read_text(encoding='utf-8')
-            
-            # 如果指定了更新截止日期，检查文件的edit_time
-            if update_after and content.startswith('---'):
-                try:
-                    # 提取现有的front matter
-                    front_matter_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', content, re.DOTALL)
-                    if front_matter_match:
-                        existing_front_matter = yaml.safe_load(front_matter_match.group(1))
-                        if "edit_time" in existing_front_matter:
-                            file_edit_time = datetime.strptime(existing_front_matter["edit_time"], "%Y-%m-%d")
-                            update_after_time = datetime.strptime(update_after, "%Y-%m-%d")
-                            # 如果文件的编辑时间晚于指定的更新截止日期，则不需要更新
-                            if file_edit_time > update_after_time:
-                                logger.info("File %s was updated after %s, skipping", file_path, update_after)
-                                should_update = False
-                except Exception as e:
-                    logger.warning("Error parsing front matter for date check: %s", str(e))
-                    # 如果解析出错，继续更新文件
-            
-            if should_update:
-                description = await analyze_file_content(file_path)
-                logger.debug("Got description result: %s", description)
-                
-                logger.debug("Generating front matter...")
-                front_matter = generate_front_matter(file_path, description["text"])
-                logger.debug("Front matter generated successfully")
-                
-                # 更新文件的front matter
-                logger.debug("Original file content length: %d chars", len(content))
-                
-                # 移除现有的front matter（如果存在）
-                if content.startswith('---'):
-                    logger.debug("Removing existing front matter")
-                    content = re.sub(r'^---\s*\n.*?\n---\s*\n',
-                                    '', content, flags=re.DOTALL)
-                # 添加新的front matter
-                new_content = front_matter + content
-                logger.debug("New content length with front matter: %d chars", len(new_content))
-                path.write_text(new_content, encoding='utf-8')
-                logger.info("File updated successfully with new front matter")
-                
-                return [types.TextContent(type="text", text=f"File: {file_path} {front_matter}")]
-            else:
-                return [types.TextContent(type="text", text=f"File: {file_path} - No update needed (last edit was after {update_after})")]
-        
+            if arguments.get("dry_run"):
+                plan = await asyncio.to_thread(plan_analysis, [path], update_after, None, 1, 0)
+                return [types.TextContent(type="text", text=json.dumps(plan, ensure_ascii=False, indent=2))]
+            return await analyze_single_file(path, update_after)
+
         else:
             error_msg = f"Path {file_path} does not exist"
             logger.error(error_msg)
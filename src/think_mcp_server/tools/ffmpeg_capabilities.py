@@ -0,0 +1,176 @@
+"""Cached ffmpeg/ffprobe capability detection."""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import List, Optional
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 能力信息资源的 URI，读取时加上 ?refresh=true 会重新检测
+FFMPEG_URI_SCHEME = "ffmpeg"
+CAPABILITIES_URI = f"{FFMPEG_URI_SCHEME}://capabilities"
+
+# 检测时单个命令的最长运行时间（秒）
+DETECT_TIMEOUT = 30
+
+# 磁盘缓存文件名，位于缓存目录下
+CACHE_FILENAME = "ffmpeg_capabilities.json"
+
+CACHE_VERSION = 1
+
+
+def _run(cmd: List[str]) -> str:
+    """Run a detection command and return its stdout."""
+    process = subprocess.run(cmd, capture_output=True, text=True, errors="replace",
+                             timeout=DETECT_TIMEOUT, check=True)
+    return process.stdout
+
+
+def _parse_version(output: str) -> str:
+    """从 -version 输出的第一行取版本号，例如 "ffmpeg version 6.1.1 Copyright ..." 中的 6.1.1。"""
+    first_line = output.splitlines()[0] if output else ""
+    parts = first_line.split()
+    return parts[2] if len(parts) >= 3 and parts[1] == "version" else first_line
+
+
+def _parse_table(output: str, separator: str) -> List[tuple]:
+    """Parse the rows after the separator line of ffmpeg -encoders / -muxers into (flags, name)."""
+    rows = []
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = line.strip().startswith(separator)
+            continue
+        parts = line.split(None, 2)
+        if len(parts) >= 2:
+            rows.append((parts[0], parts[1]))
+    return rows
+
+
+def _binary_key(path: Optional[str]) -> Optional[list]:
+    """用路径、大小和修改时间标识一个可执行文件，升级或替换后缓存自然失效。"""
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+def _binaries_key() -> list:
+    """当前 PATH 中 ffmpeg 和 ffprobe 的标识，只 stat 文件，不启动子进程。"""
+    return [_binary_key(shutil.which("ffmpeg")), _binary_key(shutil.which("ffprobe"))]
+
+
+def detect_ffmpeg_capabilities() -> dict:
+    """检测 ffmpeg 和 ffprobe 的路径、版本，以及 ffmpeg 支持的编码器和封装格式。
+
+    会启动多个子进程，只应在缓存缺失或需要刷新时调用。
+    """
+    ffmpeg_path = shutil.which("ffmpeg")
+    ffprobe_path = shutil.which("ffprobe")
+    capabilities = {
+        "ffmpeg": None,
+        "ffprobe": None,
+        "encoders": {"audio": [], "video": [], "subtitle": []},
+        "muxers": [],
+        "detected_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if ffmpeg_path:
+        try:
+            capabilities["ffmpeg"] = {
+                "path": ffmpeg_path,
+                "version": _parse_version(_run([ffmpeg_path, "-hide_banner", "-version"])),
+            }
+            kinds = {"A": "audio", "V": "video", "S": "subtitle"}
+            for flags, name in _parse_table(_run([ffmpeg_path, "-hide_banner", "-encoders"]), "------"):
+                if flags[0] in kinds:
+                    capabilities["encoders"][kinds[flags[0]]].append(name)
+            capabilities["muxers"] = sorted({
+                muxer
+                for flags, names in _parse_table(_run([ffmpeg_path, "-hide_banner", "-muxers"]), "--")
+                if "E" in flags
+                for muxer in names.split(",")
+            })
+        except (OSError, subprocess.SubprocessError) as e:
+            # 记录失败原因；缓存以二进制的标识为键，二进制不变时不会反复重新检测
+            logger.warning("ffmpeg capability detection failed: %s", str(e))
+            capabilities["ffmpeg"] = None
+            capabilities["ffmpeg_error"] = f"{ffmpeg_path}: {e}"
+    if ffprobe_path:
+        try:
+            capabilities["ffprobe"] = {
+                "path": ffprobe_path,
+                "version": _parse_version(_run([ffprobe_path, "-hide_banner", "-version"])),
+            }
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("ffprobe detection failed: %s", str(e))
+    logger.info("Detected ffmpeg: %s, ffprobe: %s, %d audio encoders, %d muxers",
+                capabilities["ffmpeg"], capabilities["ffprobe"],
+                len(capabilities["encoders"]["audio"]), len(capabilities["muxers"]))
+    return capabilities
+
+
+_capabilities: Optional[dict] = None
+_capabilities_key: Optional[list] = None
+_lock = threading.Lock()
+
+
+def get_ffmpeg_capabilities(refresh: bool = False) -> dict:
+    """获取 ffmpeg 能力信息。
+
+    进程内只检测一次；检测结果同时保存在缓存目录下，以可执行文件的路径、大小和修改时间为键，
+    服务重启后二进制未变时不再启动任何子进程。refresh 为 True 时强制重新检测。
+    """
+    global _capabilities, _capabilities_key
+    with _lock:
+        if _capabilities is not None and not refresh:
+            return _capabilities
+        cache_path = get_cache_dir() / CACHE_FILENAME
+        key = _binaries_key()
+        _capabilities_key = key
+        if not refresh and cache_path.exists():
+            try:
+                cached = json.loads(cache_path.read_text(encoding="utf-8"))
+                if cached.get("version") == CACHE_VERSION and cached.get("key") == key:
+                    _capabilities = cached["capabilities"]
+                    logger.debug("Loaded ffmpeg capabilities from %s", cache_path)
+                    return _capabilities
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring unreadable ffmpeg capability cache: %s", str(e))
+        _capabilities = detect_ffmpeg_capabilities()
+        try:
+            temp_path = cache_path.with_name(cache_path.name + ".tmp")
+            temp_path.write_text(
+                json.dumps({"version": CACHE_VERSION, "key": key, "capabilities": _capabilities}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning("Failed to save ffmpeg capability cache: %s", str(e))
+        return _capabilities
+
+
+async def ensure_ffmpeg_capabilities(refresh: bool = False) -> dict:
+    """获取 ffmpeg 能力信息；已缓存时直接返回，否则在线程中检测，不阻塞事件循环。"""
+    if _capabilities is not None and not refresh:
+        return _capabilities
+    return await asyncio.to_thread(get_ffmpeg_capabilities, refresh)
+
+
+def ffmpeg_binaries_changed() -> bool:
+    """ffmpeg 或 ffprobe 在检测之后是否被安装、移除或替换；只 stat 文件，不启动子进程。"""
+    try:
+        return _binaries_key() != _capabilities_key
+    except OSError:
+        return True
+
+
+def capabilities_resource_text(refresh: bool = False) -> str:
+    """返回 ffmpeg://capabilities 资源的内容（JSON）。"""
+    return json.dumps(get_ffmpeg_capabilities(refresh), ensure_ascii=False, indent=2)
@@ -0,0 +1,144 @@
+"""Streaming front matter access for content analysis."""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+import yaml
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# front matter 最多读取的字节数，超出时视为没有 front matter
+MAX_HEADER_BYTES = 64 * 1024
+
+# 流式复制和哈希时每次读取的字节数
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+def _read_header(f) -> Tuple[Optional[bytes], int]:
+    """Read the front matter block from the start of a binary file.
+
+    Returns:
+        (front matter 的原始内容，没有时为 None, 正文起始偏移)
+    """
+    first = f.readline(MAX_HEADER_BYTES)
+    if first.rstrip() != b"---" or not first.endswith(b"\n"):
+        return None, 0
+    lines = []
+    size = len(first)
+    while size < MAX_HEADER_BYTES:
+        line = f.readline(MAX_HEADER_BYTES - size)
+        if not line:
+            break
+        size += len(line)
+        if line.rstrip() == b"---" and line.endswith(b"\n"):
+            return b"".join(lines), f.tell()
+        lines.append(line)
+    return None, 0
+
+
+def read_front_matter(path: Path) -> Tuple[Optional[dict], int]:
+    """只读取文件开头的 front matter。
+
+    Returns:
+        (解析后的 front matter，没有或无法解析时为 None, 正文起始偏移)
+    """
+    with open(path, "rb") as f:
+        header, body_offset = _read_header(f)
+    if header is None:
+        return None, body_offset
+    try:
+        front_matter = yaml.safe_load(header.decode("utf-8"))
+    except (UnicodeDecodeError, yaml.YAMLError) as e:
+        logger.warning("Error parsing front matter of %s: %s", path, str(e))
+        return None, body_offset
+    return (front_matter if isinstance(front_matter, dict) else None), body_offset
+
+
+def hash_file_body(path: Path, body_offset: int) -> str:
+    """流式计算正文（不含 front matter）的哈希。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(body_offset)
+        while chunk := f.read(COPY_CHUNK_BYTES):
+            digest.update(chunk)
+    return "sha256:" + digest.hexdigest()
+
+
+def read_body(path: Path, body_offset: int) -> str:
+    """读取正文（不含 front matter）。
+
+    body_offset 是字节偏移，只能在二进制模式下 seek，之后再按 UTF-8 解码（换行符与文本模式一样统一为 \n）。
+    """
+    with open(path, "rb") as raw:
+        raw.seek(body_offset)
+        with io.TextIOWrapper(raw, encoding="utf-8") as f:
+            return f.read()
+
+
+def read_body_and_hash(path: Path, body_offset: int) -> Tuple[str, str]:
+    """只读取一次正文，返回与 read_body 相同的正文和与 hash_file_body 相同的哈希。"""
+    with open(path, "rb") as f:
+        f.seek(body_offset)
+        raw = f.read()
+    body = io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8").read()
+    return body, "sha256:" + hashlib.sha256(raw).hexdigest()
+
+
+def _fsync_directory(directory: Path) -> None:
+    """fsync 目录，使其中的重命名落盘；不支持打开目录的平台（Windows）上跳过。"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def rewrite_front_matter(path: Path, front_matter: str, keep_hard_links: bool = False) -> None:
+    """用新的 front matter 替换文件原有的 front matter（如果存在）。
+
+    只读取文件开头的 front matter，正文按块流式复制到同目录下的临时文件，
+    写完并 fsync 后用 os.replace 原子替换原文件，再 fsync 所在目录使替换落盘，
+    中途失败不会损坏原文件。符号链接会先解析为目标文件，替换的是链接指向的文件。
+
+    替换会让文件成为新的 inode，其他硬链接仍指向旧内容。keep_hard_links 为 True 时，
+    有多个硬链接的文件改为把临时文件的内容写回原文件以保留链接，代价是写回过程不是原子的：
+    中途崩溃会留下截断或不完整的文件。
+    """
+    path = Path(os.path.realpath(path))
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with open(path, "rb") as source, os.fdopen(fd, "wb") as target:
+            _, body_offset = _read_header(source)
+            source.seek(body_offset)
+            target.write(front_matter.encode("utf-8"))
+            shutil.copyfileobj(source, target, COPY_CHUNK_BYTES)
+            target.flush()
+            os.fsync(target.fileno())
+            hard_linked = os.fstat(source.fileno()).st_nlink > 1
+        if keep_hard_links and hard_linked:
+            with open(temp_name, "rb") as source, open(path, "r+b") as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK_BYTES)
+                target.truncate()
+                target.flush()
+                os.fsync(target.fileno())
+            os.unlink(temp_name)
+            return
+        shutil.copymode(path, temp_name)
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(path.parent)
@@ -0,0 +1,196 @@
+"""Content-addressed disk cache for LLM responses."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir, expand_user_path
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 默认的缓存容量上限（MB）
+DEFAULT_MAX_MB = 256
+
+
+def response_cache_key(model: str, prompt_template: str, content: str) -> str:
+    """Build the cache key from the model, the prompt template hash and the content hash."""
+    prompt_hash = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{prompt_hash}\0{content_hash}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """基于 SQLite 的 LLM 响应缓存。
+
+    以模型、提示词模板哈希和内容哈希组成的键保存响应，与文件路径无关，
+    因此不同目录下的相同文件也能命中。总大小超过上限时按最近访问时间淘汰。
+    数据库使用 WAL 模式，只适合放在本地磁盘上，同一台机器上的多个进程可以共享；
+    总大小保存在数据库的 meta 表中并在写入事务内更新，多个进程写入时也不会偏差。
+    """
+
+    def __init__(self, db_path: Path, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        """初始化缓存。
+
+        Args:
+            db_path: SQLite 数据库文件路径
+            max_bytes: 缓存响应的总字节数上限
+        """
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) "
+                "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM responses"
+            )
+
+    def _total_bytes(self) -> int:
+        (total,) = self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()
+        return total
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存的响应，未命中返回 None。"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def has(self, key: str) -> bool:
+        """是否缓存了该键的响应；不计入命中统计，也不更新访问时间，供预估使用。"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """写入响应，并在超出容量上限时淘汰最久未访问的条目。"""
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            # 先更新 meta 以获得写锁，保证读取旧大小、写入和淘汰在同一个事务内
+            self._conn.execute(
+                "UPDATE meta SET value = value + ? - COALESCE((SELECT size FROM responses WHERE key = ?), 0) "
+                "WHERE key = 'total_bytes'",
+                (size, key),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, size, time.time()),
+            )
+            total_bytes = self._total_bytes()
+            evicted = 0
+            while total_bytes > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access, rowid LIMIT 64"
+                ).fetchall()
+                for old_key, old_size in oldest:
+                    if total_bytes <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total_bytes -= old_size
+                    evicted += 1
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'total_bytes'", (total_bytes,))
+        if evicted:
+            logger.debug("Evicted %d LLM cache entries", evicted)
+
+    def stats(self) -> dict:
+        """返回命中/未命中次数、条目数和占用字节数。"""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            total_bytes = self._total_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self) -> None:
+        """清空缓存。"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("UPDATE meta SET value = 0 WHERE key = 'total_bytes'")
+
+    def close(self) -> None:
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
+
+
+class NullResponseCache:
+    """llm_cache_max_mb 为 0 时使用的空缓存，不创建数据库，查询总是未命中。"""
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def has(self, key: str) -> bool:
+        return False
+
+    def put(self, key: str, model: str, response: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+_response_cache: Optional[Union[ResponseCache, NullResponseCache]] = None
+
+
+def get_response_cache() -> Union[ResponseCache, NullResponseCache]:
+    """获取进程内共享的 LLM 响应缓存。
+
+    缓存文件路径由 llm_cache_path 环境变量指定（须位于本地磁盘），默认位于缓存目录下的
+    llm_responses.db；容量上限由 llm_cache_max_mb 环境变量指定，为 0 时不缓存。
+    """
+    global _response_cache
+    if _response_cache is None:
+        max_mb = int(os.getenv("llm_cache_max_mb", str(DEFAULT_MAX_MB)))
+        if max_mb <= 0:
+            logger.info("LLM response cache disabled")
+            _response_cache = NullResponseCache()
+            return _response_cache
+        cache_path = os.getenv("llm_cache_path")
+        db_path = Path(expand_user_path(cache_path)) if cache_path else get_cache_dir() / "llm_responses.db"
+        logger.info("Using LLM response cache: %s (max %d MB)", db_path, max_mb)
+        _response_cache = ResponseCache(db_path, max_mb * 1024 * 1024)
+    return _response_cache
+
+
+def response_cache_stats() -> Optional[dict]:
+    """返回共享缓存的统计信息，本进程尚未使用缓存或缓存已禁用时返回 None。"""
+    return _response_cache.stats() if isinstance(_response_cache, ResponseCache) else None
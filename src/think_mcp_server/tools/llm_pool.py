@@ -0,0 +1,220 @@
+"""Process-wide pool of reusable LLM clients."""
+import asyncio
+import copy
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from think_llm_client import LLMClient
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 每个模型最多保留的空闲客户端数
+DEFAULT_MAX_IDLE = 8
+
+# 同时读取的流式响应数上限，每个流占用一个专用线程
+DEFAULT_STREAM_WORKERS = 32
+
+
+class LLMClientPool:
+    """同一模型的 LLMClient 池。
+
+    只有第一个客户端会读取配置并调用 set_model，之后的客户端都是它的浅拷贝，
+    共享同一个 OpenAI 客户端及其 keep-alive 连接池，各自拥有独立的对话历史。
+    客户端归还时清空历史，避免上一个文件的内容混入下一次请求。
+    """
+
+    def __init__(self, model_type: str, provider: str, model_name: str, max_idle: int = DEFAULT_MAX_IDLE):
+        """初始化客户端池。
+
+        Args:
+            model_type: 模型类型，例如 llm
+            provider: 供应商标识
+            model_name: 模型标识
+            max_idle: 最多保留的空闲客户端数
+        """
+        self.model = (model_type, provider, model_name)
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._template = None
+        self._idle: List = []
+        self.created = 0
+
+    def _new_client(self):
+        """Create a client; only the first one loads the config and builds the HTTP client."""
+        if self._template is None:
+            template = LLMClient()
+            template.set_model(*self.model)
+            logger.info("LLM client pool created for %s/%s/%s", *self.model)
+            self._template = template
+        client = copy.copy(self._template)
+        client.messages = []
+        self.created += 1
+        return client
+
+    @asynccontextmanager
+    async def client(self) -> AsyncIterator[LLMClient]:
+        """借出一个客户端，使用完毕后清空历史并归还。"""
+        with self._lock:
+            client = self._idle.pop() if self._idle else self._new_client()
+        try:
+            yield client
+        finally:
+            client.clear_history()
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(client)
+
+
+_stream_executor: Optional[ThreadPoolExecutor] = None
+_stream_executor_lock = threading.Lock()
+
+
+def _get_stream_executor() -> ThreadPoolExecutor:
+    """获取读取流式响应的专用线程池，大小由 llm_stream_workers 环境变量指定。
+
+    每个流在整个生成过程中都占用一个线程；与默认线程池分开，长时间的生成不会让
+    asyncio.to_thread 的文件读取、分词等任务排队。线程按需创建，上限只限制同时读取的流数。
+    """
+    global _stream_executor
+    with _stream_executor_lock:
+        if _stream_executor is None:
+            workers = max(1, int(os.getenv("llm_stream_workers", str(DEFAULT_STREAM_WORKERS))))
+            _stream_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-stream")
+        return _stream_executor
+
+
+async def stream_chat(
+    client: LLMClient,
+    message: str,
+    max_tokens: Optional[int] = None,
+    idle_timeout: Optional[float] = None,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> str:
+    """以流式方式发送一条消息并返回完整回复。
+
+    LLMClient.chat_stream 在事件循环中同步迭代 HTTP 流，会阻塞整个服务器；这里改为在专用线程池中
+    迭代，通过队列把增量交回事件循环。每收到一段内容调用 on_delta。max_tokens 作为
+    max_completion_tokens 由服务端限制；提供 count_tokens 时也在本地用它累计输出 token 数，
+    达到上限后截断并返回已有内容，防止服务端忽略该参数。流建立后超过 idle_timeout 秒没有任何
+    输出时抛出 TimeoutError；在线程池中排队和建立连接的时间不计入，连接本身的超时由 OpenAI 客户端负责。无论正常结束、截断、超时还是被取消，都会关闭 HTTP 流，使读取线程立即退出。
+
+    Args:
+        client: 已设置模型的客户端
+        message: 用户消息
+        max_tokens: 输出 token 上限，同时作为 max_completion_tokens 发送给服务端
+        idle_timeout: 两段输出之间允许的最长等待时间（秒）
+        on_delta: 收到内容增量时调用的协程函数
+        count_tokens: 计算一段内容 token 数的函数
+
+    Returns:
+        回复内容（被截断时为已收到的部分）
+    """
+    if client.client is None or not client.current_model:
+        raise RuntimeError("未设置模型")
+    model_config = client.model_types[client.current_model_type].providers[client.current_provider].model[client.current_model]
+    limit = getattr(model_config, "max_completion_tokens", None)
+    if max_tokens:
+        limit = min(limit, max_tokens) if limit else max_tokens
+    temperature = getattr(model_config, "temperature", None)
+    messages = [{"role": "system", "content": client.system_prompt}] if client.system_prompt else []
+    messages.extend(client.messages)
+    messages.append({"role": "user", "content": message})
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    stream: Dict[str, object] = {}
+
+    def put(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # 事件循环已关闭
+            stop.set()
+
+    def produce() -> None:
+        # 排队期间调用方可能已经放弃
+        if stop.is_set():
+            return
+        try:
+            response = client.client.chat.completions.create(
+                model=client.current_model,
+                messages=messages,
+                **({"max_completion_tokens": limit} if limit else {}),
+                **({"temperature": temperature} if temperature is not None else {}),
+                stream=True,
+            )
+            stream["response"] = response
+            put(("open", None))
+            try:
+                for chunk in response:
+                    if stop.is_set():
+                        break
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    # 推理内容不计入回复，但说明生成仍在进行
+                    put(("content", getattr(delta, "content", None) or ""))
+            finally:
+                response.close()
+            put(("done", None))
+        except Exception as e:
+            put(("error", e))
+
+    loop.run_in_executor(_get_stream_executor(), produce)
+    chunks: List[str] = []
+    used = 0
+    opened = False
+    try:
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), idle_timeout if opened else None)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"LLM stream produced no output for {idle_timeout} seconds")
+            if kind == "open":
+                opened = True
+                continue
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            if not value:
+                continue
+            chunks.append(value)
+            if on_delta is not None:
+                await on_delta(value)
+            if max_tokens and count_tokens is not None:
+                used += count_tokens(value)
+                if used >= max_tokens:
+                    logger.warning("LLM output reached %d tokens, truncating", max_tokens)
+                    break
+    finally:
+        # 通知线程停止读取并关闭连接，使阻塞在读取上的线程立即退出；
+        # 连接在此之后才建立时，线程会在读取第一段数据前看到 stop 并关闭连接
+        stop.set()
+        response = stream.get("response")
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                logger.debug("Error closing LLM stream: %s", str(e))
+    return "".join(chunks)
+
+
+_pools: Dict[Tuple[str, str, str], LLMClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_llm_pool(model_type: str, provider: str, model_name: str) -> LLMClientPool:
+    """获取指定模型的共享客户端池，空闲客户端数由 llm_pool_max_idle 环境变量指定。"""
+    key = (model_type, provider, model_name)
+    with _pools_lock:
+        if key not in _pools:
+            max_idle = int(os.getenv("llm_pool_max_idle", str(DEFAULT_MAX_IDLE)))
+            _pools[key] = LLMClientPool(model_type, provider, model_name, max_idle)
+        return _pools[key]
@@ -0,0 +1,191 @@
+"""Size-based model routing with fallback for content analysis."""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+import openai
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# (模型类型, 供应商, 模型标识)
+ModelSpec = Tuple[str, str, str]
+
+# 小模型默认处理的最大输入 token 数
+DEFAULT_SMALL_MAX_TOKENS = 8000
+
+# 可以换用备用模型重试的错误：超时、连接失败、限流和服务端错误
+RETRYABLE_ERRORS = (
+    TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+T = TypeVar("T")
+
+
+def parse_model_spec(spec: str) -> ModelSpec:
+    """解析 "类型/供应商/模型" 格式的模型配置，模型标识中可以包含 /。"""
+    parts = spec.strip().split("/", 2)
+    if len(parts) != 3 or not all(part.strip() for part in parts):
+        raise ValueError(f"Invalid model spec: {spec!r}, expected 'type/provider/model'")
+    return tuple(part.strip() for part in parts)
+
+
+def format_model_spec(model: ModelSpec) -> str:
+    """把模型配置格式化为 "类型/供应商/模型"。"""
+    return "/".join(model)
+
+
+class ModelUsage:
+    """每个模型的请求数、失败数、回退次数、输入字符数和耗时，可在多个任务和线程中共同记录。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, model: ModelSpec, key: str, chars: int = 0, seconds: float = 0.0) -> None:
+        """给模型的 key 计数加一，并累加输入字符数和耗时。"""
+        with self._lock:
+            entry = self._stats.setdefault(
+                format_model_spec(model),
+                {"requests": 0, "failures": 0, "fallbacks": 0, "input_chars": 0, "seconds": 0.0},
+            )
+            entry[key] += 1
+            entry["input_chars"] += chars
+            entry["seconds"] += seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """返回每个模型的统计副本，耗时保留两位小数。"""
+        with self._lock:
+            return {
+                model: {**entry, "seconds": round(entry["seconds"], 2)}
+                for model, entry in self._stats.items()
+            }
+
+
+_current_usage: ContextVar[Optional[ModelUsage]] = ContextVar("think_mcp_model_usage", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[ModelUsage]:
+    """在一次工具调用期间单独统计模型用量。
+
+    统计对象保存在 ContextVar 中，工具内部通过 asyncio.gather 或 asyncio.to_thread 创建的任务
+    记录到同一个对象；同时进行的其他调用有各自的统计，互不混入。
+    """
+    usage = ModelUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+class ModelRouter:
+    """按请求大小选择模型，失败时切换到备用模型。
+
+    输入不超过 small_max_tokens 的请求发给 small 模型（未配置时全部发给 large 模型），
+    其余请求发给长上下文的 large 模型。遇到超时、限流等错误时依次换用 fallbacks 中的模型。
+    每个模型的请求数、失败数、回退次数、输入字符数和耗时都会被统计，
+    在 usage_scope 内发出的请求同时记入该范围的统计。
+    """
+
+    def __init__(
+        self,
+        large: ModelSpec,
+        small: Optional[ModelSpec] = None,
+        small_max_tokens: int = DEFAULT_SMALL_MAX_TOKENS,
+        fallbacks: Sequence[ModelSpec] = (),
+    ):
+        """初始化路由。
+
+        Args:
+            large: 处理大请求（以及未配置小模型时所有请求）的模型
+            small: 处理小请求的模型
+            small_max_tokens: 交给小模型的最大输入 token 数
+            fallbacks: 主模型失败时依次尝试的备用模型
+        """
+        self.large = large
+        self.small = small
+        self.small_max_tokens = small_max_tokens
+        self.fallbacks = list(fallbacks)
+        self._usage = ModelUsage()
+
+    @property
+    def name(self) -> str:
+        """路由配置的标识，用作响应缓存键中的模型部分，配置变化后缓存自然失效。"""
+        if self.small is None:
+            return format_model_spec(self.large)
+        return f"{format_model_spec(self.small)}<={self.small_max_tokens}|{format_model_spec(self.large)}"
+
+    def route(self, tokens: int) -> List[ModelSpec]:
+        """返回处理 tokens 个输入 token 的请求时依次尝试的模型。"""
+        primary = self.small if self.small is not None and tokens <= self.small_max_tokens else self.large
+        return [primary] + [model for model in self.fallbacks if model != primary]
+
+    def _record(self, model: ModelSpec, key: str, chars: int = 0, seconds: float = 0.0) -> None:
+        self._usage.record(model, key, chars, seconds)
+        usage = _current_usage.get()
+        if usage is not None:
+            usage.record(model, key, chars, seconds)
+
+    async def call(self, tokens: int, chars: int, request: Callable[[ModelSpec], Awaitable[T]]) -> T:
+        """按路由结果调用 request(model)，可重试的错误换用下一个模型。
+
+        Args:
+            tokens: 请求的输入 token 数（或其上限），用于选择模型
+            chars: 请求的字符数，只用于统计
+            request: 用给定模型发送请求的协程函数
+        """
+        models = self.route(tokens)
+        for index, model in enumerate(models):
+            start = time.monotonic()
+            try:
+                result = await request(model)
+            except Exception as e:
+                self._record(model, "failures", chars, time.monotonic() - start)
+                if index + 1 < len(models) and isinstance(e, RETRYABLE_ERRORS):
+                    logger.warning("Model %s failed (%s), falling back to %s",
+                                   format_model_spec(model), str(e), format_model_spec(models[index + 1]))
+                    self._record(models[index + 1], "fallbacks")
+                    continue
+                raise
+            self._record(model, "requests", chars, time.monotonic() - start)
+            return result
+        raise RuntimeError("No model configured")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """返回每个模型在本进程内的累计统计。"""
+        return self._usage.snapshot()
+
+
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router(default: ModelSpec) -> ModelRouter:
+    """获取进程内共享的内容分析模型路由。
+
+    模型配置格式为 "类型/供应商/模型"，由以下环境变量指定：
+    content_analyzer_model_large（默认为 default）、content_analyzer_model_small（为空时不分流）、
+    content_analyzer_small_max_tokens 和逗号分隔的 content_analyzer_model_fallbacks。
+    """
+    global _model_router
+    if _model_router is None:
+        large = os.getenv("content_analyzer_model_large", "").strip()
+        small = os.getenv("content_analyzer_model_small", "").strip()
+        fallbacks = os.getenv("content_analyzer_model_fallbacks", "")
+        _model_router = ModelRouter(
+            parse_model_spec(large) if large else default,
+            parse_model_spec(small) if small else None,
+            int(os.getenv("content_analyzer_small_max_tokens", str(DEFAULT_SMALL_MAX_TOKENS))),
+            [parse_model_spec(spec) for spec in fallbacks.split(",") if spec.strip()],
+        )
+        logger.info("Content analyzer model routing: %s (fallbacks: %s)", _model_router.name,
+                    ", ".join(format_model_spec(model) for model in _model_router.fallbacks) or "none")
+    return _model_router
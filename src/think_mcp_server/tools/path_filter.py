@@ -0,0 +1,205 @@
+"""Gitignore-style path filtering for directory walks."""
+import codecs
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 默认排除的版本库、依赖和构建目录
+DEFAULT_EXCLUDE = [
+    ".git/", ".svn/", ".hg/", "node_modules/", "__pycache__/",
+    ".venv/", "venv/", ".tox/", ".mypy_cache/", ".pytest_cache/", ".DS_Store",
+]
+
+# 判断二进制文件时读取的字节数
+SNIFF_BYTES = 8192
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore glob (without leading/trailing slash) into a regex."""
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+class IgnoreRule:
+    """一条 gitignore 规则。
+
+    支持 # 注释、! 取反、末尾 / 只匹配目录、含 / 的模式相对于规则所在目录锚定，
+    以及 *、?、[...] 和 ** 通配符。
+    """
+
+    def __init__(self, pattern: str, base: str = ""):
+        """解析规则。
+
+        Args:
+            pattern: gitignore 格式的模式
+            base: 规则所在目录相对于遍历根目录的路径，根目录为空字符串
+        """
+        self.pattern = pattern
+        self.base = base
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+        self.regex = re.compile(prefix + _translate(pattern) + r"\Z", re.DOTALL)
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        """规则是否匹配相对于遍历根目录的路径。"""
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        return self.regex.match(rel_path) is not None
+
+
+def parse_rules(lines: Iterable[str], base: str = "") -> List[IgnoreRule]:
+    """Parse gitignore lines, skipping blanks and comments."""
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n\r")
+        if not line.strip() or line.startswith("#"):
+            continue
+        # 行尾未转义的空格不属于模式
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        rules.append(IgnoreRule(stripped, base))
+    return rules
+
+
+def is_binary_file(path: Path, sample_bytes: int = SNIFF_BYTES) -> bool:
+    """只读取文件开头的字节判断是否为二进制（含 NUL 或不是合法的 UTF-8）。"""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    if b"\0" in sample:
+        return True
+    try:
+        # 采样可能截断在多字节字符中间，使用增量解码器不把末尾视为错误
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+class PathFilter:
+    """按 gitignore 风格的规则遍历目录。
+
+    排除规则依次为 DEFAULT_EXCLUDE、exclude 参数和遍历过程中遇到的 .gitignore 文件，
+    后面的规则优先，! 规则可以重新包含文件。被排除的目录整体剪枝，不会再进入。
+    include 非空时文件必须匹配其中一条规则，extensions 非空时只保留这些扩展名的文件。
+    遍历只用到目录项，不打开任何文件（.gitignore 除外）。
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        extensions: Optional[Iterable[str]] = None,
+        use_gitignore: bool = True,
+    ):
+        """初始化过滤器。
+
+        Args:
+            root: 遍历的根目录
+            include: 文件必须匹配的规则，为空时不限制
+            exclude: 追加在默认规则之后的排除规则
+            extensions: 允许的扩展名，例如 [".md", "txt"]，为空时不限制
+            use_gitignore: 是否读取目录中的 .gitignore 文件
+        """
+        self.root = Path(root)
+        self.rules = parse_rules(DEFAULT_EXCLUDE) + parse_rules(exclude or [])
+        self.include = parse_rules(include or [])
+        self.extensions = {
+            ext.lower() if ext.startswith(".") else "." + ext.lower()
+            for ext in (extensions or []) if ext
+        }
+        self.use_gitignore = use_gitignore
+
+    @staticmethod
+    def _is_ignored(rules: List[IgnoreRule], rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for rule in rules:
+            if rule.matches(rel_path, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def _load_gitignore(self, directory: str, rel_dir: str) -> List[IgnoreRule]:
+        gitignore = os.path.join(directory, ".gitignore")
+        if not self.use_gitignore or not os.path.isfile(gitignore):
+            return []
+        try:
+            with open(gitignore, "r", encoding="utf-8", errors="replace") as f:
+                return parse_rules(f, rel_dir)
+        except OSError as e:
+            logger.warning("Cannot read %s: %s", gitignore, str(e))
+            return []
+
+    def _accepts_file(self, rules: List[IgnoreRule], rel_path: str) -> bool:
+        if self.extensions and os.path.splitext(rel_path)[1].lower() not in self.extensions:
+            return False
+        if self._is_ignored(rules, rel_path, False):
+            return False
+        return not self.include or any(rule.matches(rel_path, False) for rule in self.include)
+
+    def walk(self) -> Iterator[Path]:
+        """Yield the accepted files under root, pruning excluded directories."""
+        rules_by_dir = {"": self.rules + self._load_gitignore(str(self.root), "")}
+        for directory, dirnames, filenames in os.walk(self.root):
+            rel_dir = Path(directory).relative_to(self.root).as_posix()
+            rel_dir = "" if rel_dir == "." else rel_dir
+            rules = rules_by_dir.pop(rel_dir)
+            kept = []
+            for name in sorted(dirnames):
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                if self._is_ignored(rules, rel_path, True):
+                    logger.debug("Pruned directory: %s", rel_path)
+                    continue
+                kept.append(name)
+                rules_by_dir[rel_path] = rules + self._load_gitignore(os.path.join(directory, name), rel_path)
+            # 原地修改 dirnames 让 os.walk 跳过被排除的目录
+            dirnames[:] = kept
+            for name in sorted(filenames):
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                if self._accepts_file(rules, rel_path):
+                    yield Path(directory) / name
@@ -0,0 +1,77 @@
+"""MCP progress notifications for long-running tool calls."""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 两次进度通知之间的最小间隔（秒）
+MIN_INTERVAL_SECONDS = 0.5
+
+
+class ProgressReporter:
+    """向发起请求的 MCP 客户端发送进度通知。
+
+    进度只增不减，通知按 min_interval 节流；发送失败（例如客户端已断开）只记录日志，
+    不影响工具本身的执行。
+    """
+
+    def __init__(self, session, progress_token, min_interval: float = MIN_INTERVAL_SECONDS):
+        """初始化进度上报器。
+
+        Args:
+            session: 当前请求的 MCP ServerSession
+            progress_token: 客户端在请求 _meta 中提供的 progressToken
+            min_interval: 两次通知之间的最小间隔（秒）
+        """
+        self.session = session
+        self.progress_token = progress_token
+        self.min_interval = min_interval
+        self.progress = 0.0
+        self.total: Optional[float] = None
+        self._last_sent = 0.0
+
+    async def update(self, progress: float, total: Optional[float] = None, force: bool = False) -> None:
+        """设置当前进度，距离上次通知超过 min_interval 或 force 为 True 时发送通知。"""
+        if progress < self.progress:
+            return
+        self.progress = progress
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if not force and now - self._last_sent < self.min_interval:
+            return
+        self._last_sent = now
+        try:
+            await self.session.send_progress_notification(self.progress_token, self.progress, self.total)
+        except Exception as e:
+            logger.debug("Failed to send progress notification: %s", str(e))
+
+    async def advance(self, amount: float = 1.0) -> None:
+        """在当前进度上增加 amount。"""
+        await self.update(self.progress + amount)
+
+
+_current_progress: ContextVar[Optional[ProgressReporter]] = ContextVar("think_mcp_progress", default=None)
+
+
+@contextmanager
+def progress_scope(session, progress_token) -> Iterator[Optional[ProgressReporter]]:
+    """在工具调用期间设置当前请求的进度上报器，客户端没有提供 progressToken 时为 None。
+
+    上报器保存在 ContextVar 中，工具内部通过 asyncio.gather 等创建的任务也能取到。
+    """
+    reporter = ProgressReporter(session, progress_token) if session is not None and progress_token is not None else None
+    token = _current_progress.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _current_progress.reset(token)
+
+
+def current_progress() -> Optional[ProgressReporter]:
+    """获取当前请求的进度上报器，没有时返回 None。"""
+    return _current_progress.get()
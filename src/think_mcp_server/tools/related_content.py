@@ -0,0 +1,358 @@
+"""Offline related-content retrieval with hashed TF-IDF vectors."""
+import asyncio
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import mcp.types as types
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir
+from .article_analysis import article_uri
+from .article_catalog import get_article_catalog
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 默认的向量维度（哈希桶数），可通过 related_content_dim 环境变量调整，变化时重建索引
+DEFAULT_VECTOR_DIM = 4096
+
+# 向量矩阵的初始行数，不够时按倍数扩容
+INITIAL_CAPACITY = 1024
+
+# 查询时每批参与矩阵乘法的行数
+QUERY_BLOCK_ROWS = 4096
+
+# 默认返回的结果数
+DEFAULT_TOP_K = 10
+
+_WORD_PATTERN = re.compile(r"\w+")
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+def _import_numpy():
+    """Import numpy lazily; it is only needed by this tool."""
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError("related_content requires numpy, install it with: pip install 'think-mcp-server[related]'")
+    return numpy
+
+
+def extract_terms(text: str) -> List[str]:
+    """Split text into terms: lowercase words, and character bigrams for CJK runs."""
+    terms = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.search(word):
+            if len(word) == 1:
+                terms.append(word)
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        elif len(word) > 1:
+            terms.append(word)
+    return terms
+
+
+def hashed_vector(text: str, dim: int):
+    """Hash the text's terms into a dim-sized log term-frequency vector (float32)."""
+    np = _import_numpy()
+    vector = np.zeros(dim, dtype=np.float32)
+    for term, count in Counter(extract_terms(text)).items():
+        vector[zlib.crc32(term.encode("utf-8")) % dim] += 1.0 + math.log(count)
+    return vector
+
+
+class VectorStore:
+    """基于内存映射的哈希词频向量库。
+
+    每篇文档的对数词频向量写入磁盘上 float32 矩阵的一行，文档路径、行号以及文件大小和修改时间
+    保存在 SQLite 中，sync 只重新向量化新增或变化的文件。IDF 在查询时由当前矩阵计算，
+    文档增删后不需要重算已有的行。
+    """
+
+    def __init__(self, directory: Path, dim: int = DEFAULT_VECTOR_DIM):
+        """初始化向量库。
+
+        Args:
+            directory: 存放矩阵文件和 SQLite 元数据的目录
+            dim: 向量维度
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.matrix_path = self.directory / "vectors.f32"
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._idf = None
+        self._conn = sqlite3.connect(str(self.directory / "index.db"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    path TEXT PRIMARY KEY,
+                    row INTEGER NOT NULL UNIQUE,
+                    kind TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    date TEXT,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            if row is not None and row[0] != dim:
+                logger.info("Vector dimension changed from %d to %d, rebuilding", row[0], dim)
+                self._conn.execute("DELETE FROM docs")
+                self.matrix_path.unlink(missing_ok=True)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (dim,))
+
+    def _open_matrix(self, min_rows: int):
+        """Map the matrix file, growing it to at least min_rows rows."""
+        np = _import_numpy()
+        row_bytes = self.dim * 4
+        current_rows = self.matrix_path.stat().st_size // row_bytes if self.matrix_path.exists() else 0
+        if self._matrix is not None and current_rows >= min_rows:
+            return self._matrix
+        capacity = max(current_rows, INITIAL_CAPACITY)
+        while capacity < min_rows:
+            capacity *= 2
+        if capacity != current_rows:
+            self._matrix = None
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            logger.debug("Grew vector matrix to %d rows", capacity)
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        return self._matrix
+
+    def sync(self, documents: List[dict]) -> Tuple[int, int]:
+        """让向量库与文档列表一致，返回 (重新向量化的文档数, 删除的文档数)。
+
+        Args:
+            documents: [{"path", "kind", "title", "date"}, ...]
+        """
+        with self._lock:
+            known = {
+                path: (row, size, mtime_ns)
+                for path, row, size, mtime_ns in self._conn.execute(
+                    "SELECT path, row, size, mtime_ns FROM docs"
+                )
+            }
+
+        current = set()
+        updates = []
+        for document in documents:
+            path = document["path"]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            current.add(path)
+            entry = known.get(path)
+            if entry is None or entry[1:] != (stat.st_size, stat.st_mtime_ns):
+                updates.append((document, stat.st_size, stat.st_mtime_ns))
+
+        removed = [path for path in known if path not in current]
+        if not updates and not removed:
+            return 0, 0
+
+        with self._lock, self._conn:
+            # 删除文档留下的空行优先复用，不够时追加到末尾
+            used_rows = {row for path, (row, _, _) in known.items() if path in current}
+            end_row = max((row for row, _, _ in known.values()), default=-1) + 1
+            free_rows = sorted(set(range(end_row)) - used_rows, reverse=True)
+            new_count = sum(1 for document, _, _ in updates if document["path"] not in known)
+            matrix = self._open_matrix(end_row + max(0, new_count - len(free_rows)))
+            for path in removed:
+                matrix[known[path][0]] = 0
+                self._conn.execute("DELETE FROM docs WHERE path = ?", (path,))
+
+            vectorized = 0
+            for document, size, mtime_ns in updates:
+                path = document["path"]
+                try:
+                    with open(path, "r", encoding="utf-8", errors="replace") as f:
+                        vector = hashed_vector(document["title"] + "\n" + f.read(), self.dim)
+                except OSError as e:
+                    logger.warning("Failed to vectorize %s: %s", path, str(e))
+                    continue
+                if path in known:
+                    row = known[path][0]
+                elif free_rows:
+                    row = free_rows.pop()
+                else:
+                    row = end_row
+                    end_row += 1
+                matrix[row] = vector
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO docs (path, row, kind, title, date, size, mtime_ns) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, row, document["kind"], document["title"], document.get("date"), size, mtime_ns),
+                )
+                vectorized += 1
+            matrix.flush()
+            self._idf = None
+        logger.info("Vector store updated: %d documents vectorized, %d removed", vectorized, len(removed))
+        return vectorized, len(removed)
+
+    def vector_of(self, path: str):
+        """返回已入库文档的向量，不存在时返回 None。"""
+        with self._lock:
+            row = self._conn.execute("SELECT row FROM docs WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return None
+            return _import_numpy().array(self._open_matrix(row[0] + 1)[row[0]])
+
+    def query(self, vector, top_k: int = DEFAULT_TOP_K, exclude: Optional[str] = None) -> List[dict]:
+        """按 TF-IDF 余弦相似度返回最相似的 top_k 篇文档。
+
+        矩阵按 QUERY_BLOCK_ROWS 行分批加权并与查询向量做矩阵乘法，只有当前批次会被读入内存。
+        """
+        np = _import_numpy()
+        with self._lock:
+            docs = {
+                row: {"file_path": path, "kind": kind, "title": title, "date": date_str}
+                for path, row, kind, title, date_str in self._conn.execute(
+                    "SELECT path, row, kind, title, date FROM docs"
+                )
+            }
+            if not docs:
+                return []
+            rows = max(docs) + 1
+            matrix = self._open_matrix(rows)[:rows]
+            if self._idf is None:
+                document_frequency = np.zeros(self.dim, dtype=np.float64)
+                for start in range(0, rows, QUERY_BLOCK_ROWS):
+                    document_frequency += (matrix[start:start + QUERY_BLOCK_ROWS] > 0).sum(axis=0)
+                self._idf = (np.log((len(docs) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+            idf = self._idf
+
+            weighted_query = vector * idf
+            query_norm = float(np.linalg.norm(weighted_query))
+            if query_norm == 0:
+                return []
+            scores = np.empty(rows, dtype=np.float32)
+            for start in range(0, rows, QUERY_BLOCK_ROWS):
+                block = matrix[start:start + QUERY_BLOCK_ROWS] * idf
+                norms = np.linalg.norm(block, axis=1)
+                norms[norms == 0] = np.inf
+                scores[start:start + len(block)] = (block @ weighted_query) / (norms * query_norm)
+
+        ranked = []
+        for row in np.argsort(-scores):
+            if len(ranked) >= top_k or scores[row] <= 0:
+                break
+            document = docs.get(int(row))
+            if document is None or document["file_path"] == exclude:
+                continue
+            ranked.append(dict(document, score=round(float(scores[row]), 4)))
+        return ranked
+
+    def close(self) -> None:
+        """关闭数据库连接并释放矩阵映射。"""
+        with self._lock:
+            self._matrix = None
+            self._conn.close()
+
+
+_vector_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """获取进程内共享的向量库，保存在缓存目录下的 related_content 目录。"""
+    global _vector_store
+    dim = int(os.getenv("related_content_dim", str(DEFAULT_VECTOR_DIM)))
+    if _vector_store is None or _vector_store.dim != dim:
+        if _vector_store is not None:
+            _vector_store.close()
+        _vector_store = VectorStore(get_cache_dir() / "related_content", dim)
+    return _vector_store
+
+
+def collect_documents() -> List[dict]:
+    """列出参与检索的文档：article_base_path 下的文章和 resources_path 下的资源文件。"""
+    from ..resources import iter_resource_files
+
+    documents = []
+    base_path = os.getenv("article_base_path")
+    if base_path:
+        catalog = get_article_catalog(os.path.expanduser(base_path))
+        catalog.refresh()
+        for entry in catalog.all_articles():
+            documents.append({
+                "path": entry["file_path"],
+                "kind": "article",
+                "title": entry["title"],
+                "date": entry["date"],
+            })
+    for file_path in iter_resource_files():
+        documents.append({
+            "path": str(file_path.absolute()),
+            "kind": "resource",
+            "title": file_path.stem,
+            "date": None,
+        })
+    return documents
+
+
+def _document_uri(document: dict) -> str:
+    if document["kind"] == "article":
+        return article_uri(document["date"], document["file_path"])
+    return f"file://{document['file_path']}"
+
+
+def _find_related(query: Optional[str], file_path: Optional[str], top_k: int) -> Dict:
+    """Sync the vector store and run the query; runs in a worker thread."""
+    store = get_vector_store()
+    updated, removed = store.sync(collect_documents())
+    if file_path:
+        vector = store.vector_of(file_path)
+        if vector is None:
+            raise ValueError(f"File is not an indexed article or resource: {file_path}")
+    else:
+        vector = hashed_vector(query, store.dim)
+    return {"results": store.query(vector, top_k, exclude=file_path), "updated": updated, "removed": removed}
+
+
+async def related_content(arguments: dict | None) -> list[types.TextContent]:
+    """Find articles and resources related to a text or to an indexed file."""
+    arguments = arguments or {}
+    query = arguments.get("query")
+    file_path = arguments.get("file_path")
+    if not query and not file_path:
+        logger.error("Missing query or file_path argument")
+        raise ValueError("Either query or file_path is required")
+    if file_path:
+        file_path = os.path.abspath(os.path.expanduser(file_path))
+    try:
+        top_k = int(arguments.get("top_k") or DEFAULT_TOP_K)
+    except ValueError:
+        raise ValueError("top_k must be an integer")
+    if top_k <= 0:
+        raise ValueError("top_k must be > 0")
+
+    found = await asyncio.to_thread(_find_related, query, file_path, top_k)
+    logger.info("Related content: %d results (%d vectorized, %d removed)",
+                len(found["results"]), found["updated"], found["removed"])
+    results = [
+        {
+            "title": document["title"],
+            "kind": document["kind"],
+            "date": document["date"],
+            "uri": _document_uri(document),
+            "file_path": document["file_path"],
+            "score": document["score"],
+        }
+        for document in found["results"]
+    ]
+    return [
+        types.TextContent(
+            type="text",
+            text=json.dumps({"results": results}, ensure_ascii=False, indent=2),
+        )
+    ]
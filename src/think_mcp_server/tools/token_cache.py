@@ -0,0 +1,171 @@
+"""Persistent token count cache for article analysis."""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir, expand_user_path
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# (路径, 文件大小, 修改时间纳秒)
+FileStat = Tuple[str, int, int]
+
+# 单条 SQL 中允许的最大参数数量，避免超出 SQLite 限制
+_SQL_BATCH_SIZE = 500
+
+
+class TokenCache:
+    """基于 SQLite 的 token 计数缓存。
+
+    以 (路径, 编码) 为主键保存 token 数，并记录文件大小与修改时间；
+    只有大小、修改时间和编码都一致时才视为命中，因此命中时无需打开文件。
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 200000):
+        """初始化缓存。
+
+        Args:
+            db_path: SQLite 数据库文件路径
+            max_entries: 最多保留的缓存条目数，超出时按最近访问时间淘汰
+        """
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS token_counts (
+                    path TEXT NOT NULL,
+                    encoding TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    token_count INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (path, encoding)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_token_counts_last_access "
+                "ON token_counts (last_access)"
+            )
+
+    def get_many(self, stats: Iterable[FileStat], encoding: str) -> Dict[str, int]:
+        """批量查询 token 数，返回命中的 {路径: token 数}。"""
+        stats = list(stats)
+        hits: Dict[str, int] = {}
+        now = time.time()
+        with self._lock, self._conn:
+            for start in range(0, len(stats), _SQL_BATCH_SIZE):
+                batch = stats[start:start + _SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns, token_count FROM token_counts "
+                    f"WHERE encoding = ? AND path IN ({placeholders})",
+                    [encoding, *(path for path, _, _ in batch)],
+                ).fetchall()
+                cached = {row[0]: row[1:] for row in rows}
+                for path, size, mtime_ns in batch:
+                    entry = cached.get(path)
+                    if entry and entry[0] == size and entry[1] == mtime_ns:
+                        hits[path] = entry[2]
+            if hits:
+                self._conn.executemany(
+                    "UPDATE token_counts SET last_access = ? WHERE path = ? AND encoding = ?",
+                    [(now, path, encoding) for path in hits],
+                )
+        logger.debug("Token cache: %d/%d hits", len(hits), len(stats))
+        return hits
+
+    def get(self, path: str, size: int, mtime_ns: int, encoding: str) -> Optional[int]:
+        """查询单个文件的 token 数，未命中返回 None。"""
+        return self.get_many([(path, size, mtime_ns)], encoding).get(path)
+
+    def put_many(self, records: Iterable[Tuple[str, int, int, int]], encoding: str) -> None:
+        """批量写入 (路径, 大小, 修改时间, token 数) 记录，并按需淘汰旧条目。"""
+        now = time.time()
+        rows = [
+            (path, encoding, size, mtime_ns, token_count, now)
+            for path, size, mtime_ns, token_count in records
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO token_counts "
+                "(path, encoding, size, mtime_ns, token_count, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self.evict()
+
+    def put(self, path: str, size: int, mtime_ns: int, token_count: int, encoding: str) -> None:
+        """写入单个文件的 token 数。"""
+        self.put_many([(path, size, mtime_ns, token_count)], encoding)
+
+    def invalidate(self, path_prefix: Optional[str] = None) -> int:
+        """使缓存失效。
+
+        Args:
+            path_prefix: 只清除该路径（或目录）下的条目；为 None 时清空全部缓存
+
+        Returns:
+            被删除的条目数
+        """
+        with self._lock, self._conn:
+            if path_prefix is None:
+                cursor = self._conn.execute("DELETE FROM token_counts")
+            else:
+                prefix = path_prefix.rstrip(os.sep)
+                cursor = self._conn.execute(
+                    "DELETE FROM token_counts WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (prefix, len(prefix) + 1, prefix + os.sep),
+                )
+        logger.info("Invalidated %d token cache entries", cursor.rowcount)
+        return cursor.rowcount
+
+    def evict(self) -> int:
+        """按最近访问时间淘汰超出 max_entries 的条目，返回淘汰数量。"""
+        with self._lock, self._conn:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM token_counts").fetchone()
+            overflow = count - self.max_entries
+            if overflow <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM token_counts WHERE rowid IN ("
+                "SELECT rowid FROM token_counts ORDER BY last_access, rowid LIMIT ?)",
+                (overflow,),
+            )
+        logger.debug("Evicted %d token cache entries", overflow)
+        return overflow
+
+    def close(self) -> None:
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
+
+
+_token_cache: Optional[TokenCache] = None
+
+
+def get_token_cache() -> TokenCache:
+    """获取进程内共享的 token 缓存实例。
+
+    缓存文件路径由 token_cache_path 环境变量指定，默认位于缓存目录下的 token_cache.db；
+    最大条目数由 token_cache_max_entries 环境变量指定。
+    """
+    global _token_cache
+    if _token_cache is None:
+        cache_path = os.getenv("token_cache_path")
+        db_path = Path(expand_user_path(cache_path)) if cache_path else get_cache_dir() / "token_cache.db"
+        max_entries = int(os.getenv("token_cache_max_entries", "200000"))
+        logger.info("Using token cache: %s (max %d entries)", db_path, max_entries)
+        _token_cache = TokenCache(db_path, max_entries)
+    return _token_cache
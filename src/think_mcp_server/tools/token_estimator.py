@@ -0,0 +1,170 @@
+"""Calibrated token estimation for article analysis."""
+import json
+import math
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from think_llm_client.utils.logger import logging
+from ..init import get_cache_dir
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 语言类别：以中日韩文字为主、以拉丁字母为主、两者混合
+LANGUAGES = ("cjk", "latin", "mixed")
+
+# 未校准时每字节的 token 数，以及对应的相对误差
+DEFAULT_TOKENS_PER_BYTE = {"cjk": 0.45, "latin": 0.25, "mixed": 0.35}
+UNCALIBRATED_ERROR = 0.5
+
+# 判断语言时读取的文件前缀字节数
+SAMPLE_BYTES = 4096
+
+# 每种语言至少需要的校准样本数，以及最多保留的样本数
+MIN_SAMPLES = 8
+MAX_SAMPLES = 256
+
+# 所有编码共用一个校准文件，读取、合并和写入时持有该锁
+_calibration_lock = threading.Lock()
+
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+def classify_text(text: str) -> str:
+    """Classify text as cjk, latin or mixed by the share of CJK characters."""
+    visible = sum(1 for char in text if not char.isspace())
+    if visible == 0:
+        return "latin"
+    cjk_ratio = len(_CJK_PATTERN.findall(text)) / visible
+    if cjk_ratio >= 0.3:
+        return "cjk"
+    if cjk_ratio < 0.05:
+        return "latin"
+    return "mixed"
+
+
+def detect_language(file_path: str) -> str:
+    """Detect the language class of a file from its first SAMPLE_BYTES bytes."""
+    with open(file_path, "rb") as f:
+        prefix = f.read(SAMPLE_BYTES)
+    return classify_text(prefix.decode("utf-8", errors="ignore"))
+
+
+class TokenEstimator:
+    """按语言校准的 token 估算器。
+
+    用文件字节数乘以该语言的每字节 token 数来估算，比例由抽样的精确计数校准，
+    并按编码持久化到缓存目录；误差界取校准样本相对误差的 95 分位数。
+    不同编码的估算器共用同一个校准文件，写入前会重新读取文件，只替换本编码的数据。
+    """
+
+    def __init__(self, calibration_path: Path, encoding: str):
+        """初始化估算器。
+
+        Args:
+            calibration_path: 校准数据 JSON 文件路径
+            encoding: tiktoken 编码名，不同编码分别校准
+        """
+        self.calibration_path = Path(calibration_path)
+        self.encoding = encoding
+        self._data: Dict[str, Dict[str, dict]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, dict]]:
+        """读取校准文件，文件不存在或无法读取时返回空数据。"""
+        if not self.calibration_path.exists():
+            return {}
+        try:
+            return json.loads(self.calibration_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to load token calibration %s: %s", self.calibration_path, str(e))
+            return {}
+
+    def _save(self) -> None:
+        self.calibration_path.parent.mkdir(parents=True, exist_ok=True)
+        self.calibration_path.write_text(json.dumps(self._data), encoding="utf-8")
+
+    def _model(self, language: str) -> Optional[dict]:
+        return self._data.get(self.encoding, {}).get(language)
+
+    def is_calibrated(self, language: str) -> bool:
+        """该语言是否已有足够的校准样本。"""
+        model = self._model(language)
+        return bool(model) and len(model["samples"]) >= MIN_SAMPLES
+
+    def estimate(self, size: int, language: str) -> int:
+        """根据文件字节数估算 token 数。"""
+        model = self._model(language)
+        ratio = model["tokens_per_byte"] if model else DEFAULT_TOKENS_PER_BYTE[language]
+        return int(round(size * ratio))
+
+    def relative_error(self, language: str) -> float:
+        """单篇文章估算值的相对误差界。"""
+        if not self.is_calibrated(language):
+            return UNCALIBRATED_ERROR
+        return self._model(language)["relative_error"]
+
+    def calibrate(self, samples: Iterable[Tuple[str, str, int, int]]) -> None:
+        """加入 (语言, 文件路径, 字节数, 精确 token 数) 样本并重新计算比例和误差界。
+
+        样本按文件路径去重：已采样且未变化的文件不会重复加入，文件变化后替换原来的样本。
+        """
+        with _calibration_lock:
+            # 以文件中的最新数据为准，其他编码在此期间写入的校准不会被覆盖
+            self._data = self._load()
+            models = self._data.setdefault(self.encoding, {})
+            updated = set()
+            for language, file_path, size, token_count in samples:
+                if size <= 0 or token_count <= 0:
+                    continue
+                model = models.setdefault(language, {"samples": []})
+                sample = [size, token_count, file_path]
+                if sample in model["samples"]:
+                    continue
+                model["samples"] = [existing for existing in model["samples"] if existing[2] != file_path]
+                model["samples"].append(sample)
+                updated.add(language)
+            if not updated:
+                return
+
+            for language in updated:
+                model = models[language]
+                model["samples"] = model["samples"][-MAX_SAMPLES:]
+                total_bytes = sum(sample[0] for sample in model["samples"])
+                total_tokens = sum(sample[1] for sample in model["samples"])
+                ratio = total_tokens / total_bytes
+                errors = sorted(abs(sample[0] * ratio - sample[1]) / sample[1] for sample in model["samples"])
+                model["tokens_per_byte"] = ratio
+                model["relative_error"] = round(errors[min(len(errors) - 1, math.ceil(len(errors) * 0.95) - 1)], 4)
+                model["updated"] = time.time()
+                logger.info("Calibrated %s/%s: %.4f tokens/byte, ±%.1f%% (%d samples)",
+                            self.encoding, language, ratio, model["relative_error"] * 100,
+                            len(model["samples"]))
+            self._save()
+
+    def reset(self) -> None:
+        """清除当前编码的校准数据。"""
+        with _calibration_lock:
+            self._data = self._load()
+            self._data.pop(self.encoding, None)
+            self._save()
+
+
+_estimators: Dict[str, TokenEstimator] = {}
+
+
+def get_token_estimator(encoding: str) -> TokenEstimator:
+    """获取指定编码的共享估算器，校准数据保存在缓存目录下的 token_calibration.json。"""
+    if encoding not in _estimators:
+        _estimators[encoding] = TokenEstimator(get_cache_dir() / "token_calibration.json", encoding)
+    return _estimators[encoding]
+
+
+def pick_calibration_samples(entries: List[dict], language: str, limit: int) -> List[dict]:
+    """从同一语言的文章中均匀挑选最多 limit 篇作为校准样本。"""
+    candidates = [entry for entry in entries if entry.get("language") == language]
+    if len(candidates) <= limit:
+        return candidates
+    step = len(candidates) / limit
+    return [candidates[int(i * step)] for i in range(limit)]
@@ -0,0 +1,138 @@
+"""Parallel tokenization engine for article analysis."""
+import asyncio
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+import tiktoken
+from think_llm_client.utils.logger import logging
+
+# 获取模块的日志记录器
+logger = logging.getLogger("think-mcp-server")
+
+# 单个文件的统计结果：(token 数, 错误信息)，两者必有一个为 None
+CountResult = Tuple[Optional[int], Optional[str]]
+
+# 流式统计时每次编码的字符数，控制单个文件统计时的内存占用
+STREAM_CHUNK_CHARS = 1 << 20
+
+# 工作进程内的编码器，由 _init_worker 在进程启动时加载一次
+_worker_encoder = None
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_key: Optional[Tuple[str, int]] = None
+
+
+def _init_worker(encoding_name: str) -> None:
+    """Load the tokenizer once per worker process."""
+    global _worker_encoder
+    _worker_encoder = tiktoken.get_encoding(encoding_name)
+
+
+def count_file_tokens(file_path: str, encoder, chunk_chars: int = STREAM_CHUNK_CHARS) -> CountResult:
+    """Count the tokens of a single file without loading it whole.
+
+    The file is encoded in chunks of roughly chunk_chars characters. Chunks are only cut
+    before a line that starts with a non-whitespace character: no pre-tokenizer piece of
+    the tiktoken encodings spans a newline followed by such a character, so the summed
+    count is identical to encoding the whole file at once.
+    """
+    try:
+        total = 0
+        buffer: List[str] = []
+        buffered_chars = 0
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if buffered_chars >= chunk_chars and not line[:1].isspace():
+                    total += len(encoder.encode("".join(buffer)))
+                    buffer = []
+                    buffered_chars = 0
+                buffer.append(line)
+                buffered_chars += len(line)
+        if buffer:
+            total += len(encoder.encode("".join(buffer)))
+        return total, None
+    except Exception as e:
+        return None, str(e)
+
+
+def _count_chunk(file_paths: Sequence[str]) -> List[Tuple[str, CountResult]]:
+    """Count tokens for a chunk of files inside a worker process."""
+    return [(path, count_file_tokens(path, _worker_encoder)) for path in file_paths]
+
+
+def _count_serial(file_paths: Sequence[str], encoder) -> Dict[str, CountResult]:
+    """Count tokens for files one by one in the calling thread."""
+    return {path: count_file_tokens(path, encoder) for path in file_paths}
+
+
+def get_worker_count() -> int:
+    """获取工作进程数，由 tokenizer_workers 环境变量指定，默认为 CPU 核数。"""
+    workers = int(os.getenv("tokenizer_workers", "0"))
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _get_executor(encoding_name: str, max_workers: int) -> ProcessPoolExecutor:
+    """获取（必要时创建）共享进程池，编码或进程数变化时重建。"""
+    global _executor, _executor_key
+    key = (encoding_name, max_workers)
+    if _executor is None or _executor_key != key:
+        shutdown_tokenizer_pool()
+        logger.info("Starting tokenizer pool with %d workers (%s)", max_workers, encoding_name)
+        _executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(encoding_name,),
+        )
+        _executor_key = key
+    return _executor
+
+
+def shutdown_tokenizer_pool() -> None:
+    """关闭共享进程池。"""
+    global _executor, _executor_key
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_key = None
+
+
+atexit.register(shutdown_tokenizer_pool)
+
+
+async def count_tokens(file_paths: Sequence[str], encoder) -> Dict[str, CountResult]:
+    """统计一组文件的 token 数，返回 {路径: (token 数, 错误信息)}。
+
+    文件数达到 tokenizer_parallel_threshold 时，按 tokenizer_chunk_size 分块提交到进程池并行统计；
+    否则在线程中串行统计。两种方式都不会阻塞事件循环，结果与逐个调用 encoder.encode 一致。
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return {}
+
+    max_workers = get_worker_count()
+    chunk_size = max(1, int(os.getenv("tokenizer_chunk_size", "16")))
+    threshold = int(os.getenv("tokenizer_parallel_threshold", "64"))
+
+    if max_workers <= 1 or len(file_paths) < threshold:
+        logger.debug("Counting %d files serially", len(file_paths))
+        return await asyncio.to_thread(_count_serial, file_paths, encoder)
+
+    logger.debug("Counting %d files with %d workers, chunk size %d",
+                 len(file_paths), max_workers, chunk_size)
+    loop = asyncio.get_running_loop()
+    try:
+        executor = _get_executor(encoder.name, max_workers)
+        futures = [
+            loop.run_in_executor(executor, _count_chunk, file_paths[start:start + chunk_size])
+            for start in range(0, len(file_paths), chunk_size)
+        ]
+        results: Dict[str, CountResult] = {}
+        for chunk_result in await asyncio.gather(*futures):
+            results.update(chunk_result)
+        return results
+    except BrokenProcessPool as e:
+        logger.warning("Tokenizer pool failed, falling back to serial counting: %s", str(e))
+        shutdown_tokenizer_pool()
+        return await asyncio.to_thread(_count_serial, file_paths, encoder)
@@ -1,13 +1,233 @@
 """Video audio extraction tool."""
+import asyncio
+import json
 import os
-import subprocess
+import re
+from collections import deque
 from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
 import mcp.types as types
 from think_llm_client.utils.logger import logging
+from .ffmpeg_capabilities import ensure_ffmpeg_capabilities, ffmpeg_binaries_changed
+from .progress import current_progress
 
 # 获取模块的日志记录器
 logger = logging.getLogger("think-mcp-server")
 
+# ffmpeg 默认的最长运行时间（秒）
+DEFAULT_TIMEOUT = 3600
+
+# 出错时在错误信息中保留的 stderr 行数
+STDERR_TAIL_LINES = 20
+
+# ffprobe 探测输入的最长时间（秒）
+PROBE_TIMEOUT = 60
+
+# 各输出格式可以直接复制（不重新编码）的音频编码；None 表示容器接受任意编码
+COPY_COMPATIBLE_CODECS = {
+    "mp3": {"mp3"},
+    "aac": {"aac"},
+    "m4a": {"aac", "alac"},
+    "ogg": {"vorbis", "opus", "flac"},
+    "opus": {"opus"},
+    "flac": {"flac"},
+    "mka": None,
+}
+
+# 重新编码为各输出格式时 ffmpeg 可能使用的编码器，都不可用时提前报错
+TRANSCODE_ENCODERS = {
+    "mp3": {"libmp3lame", "mp3_mf"},
+    "aac": {"aac", "libfdk_aac", "aac_at"},
+    "m4a": {"aac", "libfdk_aac", "aac_at"},
+    "ogg": {"libvorbis", "vorbis"},
+    "opus": {"libopus", "opus"},
+    "flac": {"flac"},
+    "wav": {"pcm_s16le"},
+}
+
+DURATION_PATTERN = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+TIME_PATTERN = re.compile(r"\btime=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg 以非零状态退出。"""
+
+    def __init__(self, returncode: int, stderr: str):
+        super().__init__(f"ffmpeg exited with status {returncode}: {stderr}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+def _parse_seconds(match: re.Match) -> float:
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+async def run_ffmpeg(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    on_progress: Optional[Callable[[float, Optional[float]], Awaitable[None]]] = None,
+) -> str:
+    """以异步子进程运行 ffmpeg，不阻塞事件循环。
+
+    stderr 按行（ffmpeg 用 \\r 分隔进度行）流式解析：从 Duration 得到总时长，从 time= 得到
+    已处理的时长，并调用 on_progress(已处理秒数, 总秒数)。超过 timeout 秒或请求被取消时
+    终止子进程后再抛出异常，不留下孤儿进程。
+
+    Args:
+        cmd: ffmpeg 命令及参数
+        timeout: 最长运行时间（秒），None 表示不限制
+        on_progress: 进度回调
+
+    Returns:
+        stderr 的最后若干行
+
+    Raises:
+        FFmpegError: ffmpeg 以非零状态退出
+        TimeoutError: 超过 timeout 秒仍未结束
+    """
+    logger.debug("Running command: %s", " ".join(cmd))
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+    duration: Optional[float] = None
+
+    async def read_stderr() -> None:
+        nonlocal duration
+        buffer = b""
+        while chunk := await process.stderr.read(4096):
+            buffer += chunk
+            *lines, buffer = re.split(rb"[\r\n]", buffer)
+            for raw in lines:
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                tail.append(line)
+                if duration is None and (match := DURATION_PATTERN.search(line)):
+                    duration = _parse_seconds(match)
+                elif on_progress is not None and (match := TIME_PATTERN.search(line)):
+                    await on_progress(_parse_seconds(match), duration)
+        if buffer.strip():
+            tail.append(buffer.decode("utf-8", errors="replace").strip())
+
+    try:
+        await asyncio.wait_for(asyncio.gather(read_stderr(), process.wait()), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"ffmpeg did not finish within {timeout} seconds")
+    finally:
+        # 超时、取消或读取出错时终止子进程，并等待其退出
+        if process.returncode is None:
+            logger.warning("Killing ffmpeg process %d", process.pid)
+            process.kill()
+            await process.wait()
+
+    stderr_tail = "\n".join(tail)
+    if process.returncode != 0:
+        raise FFmpegError(process.returncode, stderr_tail)
+    return stderr_tail
+
+
+async def probe_audio_codec(
+    source: str, ffprobe_path: str = "ffprobe", timeout: float = PROBE_TIMEOUT
+) -> Optional[str]:
+    """用 ffprobe 获取第一条音频流的编码名称。
+
+    没有音频流、ffprobe 不可用或探测失败时返回 None，调用方应退回重新编码。
+    """
+    cmd = [
+        ffprobe_path, "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name",
+        "-of", "json",
+        source,
+    ]
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        logger.info("ffprobe is not installed, audio will be transcoded")
+        return None
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("ffprobe did not finish within %s seconds", timeout)
+        return None
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        logger.warning("ffprobe failed: %s", stderr.decode("utf-8", errors="replace").strip())
+        return None
+    try:
+        streams = json.loads(stdout).get("streams") or []
+    except ValueError:
+        return None
+    return streams[0].get("codec_name") if streams else None
+
+
+def can_stream_copy(codec: Optional[str], output_format: str) -> bool:
+    """判断编码为 codec 的音频流能否不经重新编码直接写入 output_format 格式的文件。"""
+    if not codec:
+        return False
+    output_format = output_format.lower()
+    if output_format == "wav":
+        return codec.startswith("pcm_")
+    if output_format not in COPY_COMPATIBLE_CODECS:
+        return False
+    codecs = COPY_COMPATIBLE_CODECS[output_format]
+    return codecs is None or codec in codecs
+
+
+def build_ffmpeg_command(
+    source: str, output_file: str, stream_copy: bool, ffmpeg_path: str = "ffmpeg"
+) -> List[str]:
+    """构建提取音频的 ffmpeg 命令，stream_copy 为 True 时直接复制第一条音频流。"""
+    if stream_copy:
+        return [
+            ffmpeg_path,
+            "-i", source,       # 输入文件
+            "-map", "0:a:0",    # 只取第一条音频流
+            "-c:a", "copy",     # 不重新编码，只重新封装
+            "-y",               # 覆盖输出文件（如果存在）
+            output_file,        # 输出文件
+        ]
+    return [
+        ffmpeg_path,
+        "-i", source,  # 输入文件
+        "-q:a", "0",   # 最高音频质量
+        "-map", "a",   # 只提取音频流
+        "-y",          # 覆盖输出文件（如果存在）
+        output_file,   # 输出文件
+    ]
+
+
+async def _report_progress(processed: float, duration: Optional[float]) -> None:
+    """Forward ffmpeg progress, in seconds of media processed, to the MCP client."""
+    progress = current_progress()
+    if progress is not None:
+        await progress.update(processed, duration)
+
+
+def _get_timeout(arguments: dict) -> Optional[float]:
+    """获取 ffmpeg 最长运行时间，优先取参数 timeout，其次取 video_audio_extractor_timeout 环境变量，0 表示不限制。"""
+    value = arguments.get("timeout")
+    if value is None:
+        value = os.getenv("video_audio_extractor_timeout", str(DEFAULT_TIMEOUT))
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timeout: {value}")
+    return timeout if timeout > 0 else None
+
 
 async def extract_audio_from_video(arguments: dict | None) -> list[types.TextContent]:
     """Extract audio from video file and save to specified location."""
@@ -63,58 +283,80 @@ async def extract_audio_from_video(arguments: dict | None) -> list[types.TextCon
         # 使用ffmpeg提取音频
         logger.debug("Starting audio extraction with ffmpeg")
 
-        # 检查ffmpeg是否安装
-        try:
-            subprocess.run(["ffmpeg", "-version"],
-                           check=True, capture_output=True)
-            logger.debug("ffmpeg is installed")
-        except (subprocess.SubprocessError, FileNotFoundError):
+        # 检查ffmpeg是否安装：使用启动时检测并缓存的结果，不再每次启动 ffmpeg -version
+        capabilities = await ensure_ffmpeg_capabilities()
+        if capabilities["ffmpeg"] is None and ffmpeg_binaries_changed():
+            # 检测之后才安装或替换的 ffmpeg；同一个二进制检测失败时不再重复启动检测进程
+            capabilities = await ensure_ffmpeg_capabilities(refresh=True)
+        if capabilities["ffmpeg"] is None:
             error_msg = "ffmpeg is not installed. Please install ffmpeg to use this tool."
             logger.error(error_msg)
             return [types.TextContent(type="text", text=error_msg)]
+        ffmpeg_path = capabilities["ffmpeg"]["path"]
 
-        # 构建ffmpeg命令
-        cmd = [
-            "ffmpeg",
-            "-i", video_url,  # 输入文件
-            "-q:a", "0",      # 最高音频质量
-            "-map", "a",      # 只提取音频流
-            "-y",             # 覆盖输出文件（如果存在）
-            output_file       # 输出文件
-        ]
-
-        logger.debug("Running command: %s", " ".join(cmd))
+        # 源音频的编码可以直接放进目标格式时只复制音频流，比解码再编码快得多
+        codec = None
+        if arguments.get("stream_copy", True) and capabilities["ffprobe"] is not None:
+            codec = await probe_audio_codec(video_url, capabilities["ffprobe"]["path"])
+            logger.debug("Source audio codec: %s", codec)
+        stream_copy = can_stream_copy(codec, output_format)
+        timeout = _get_timeout(arguments)
 
-        # 执行命令
-        process = subprocess.run(
-            cmd,
-            check=True,
-            capture_output=True,
-            text=True
-        )
-
-        logger.debug("ffmpeg stdout: %s", process.stdout)
-        if process.stderr:
-            logger.debug("ffmpeg stderr: %s", process.stderr)
+        # 以异步子进程执行命令，进度通过 MCP 进度通知转发
+        try:
+            if stream_copy:
+                try:
+                    stderr = await run_ffmpeg(
+                        build_ffmpeg_command(video_url, output_file, True, ffmpeg_path),
+                        timeout=timeout, on_progress=_report_progress,
+                    )
+                except FFmpegError as e:
+                    logger.warning("Stream copy of %s audio failed, transcoding instead: %s", codec, e.stderr)
+                    stream_copy = False
+            if not stream_copy:
+                encoders = TRANSCODE_ENCODERS.get(output_format.lower())
+                available = set(capabilities["encoders"]["audio"])
+                if encoders and available and not encoders & available:
+                    error_msg = (f"ffmpeg ({ffmpeg_path}) has no encoder for {output_format} "
+                                 f"(needs one of: {', '.join(sorted(encoders))})")
+                    logger.error(error_msg)
+                    return [types.TextContent(type="text", text=error_msg)]
+                stderr = await run_ffmpeg(
+                    build_ffmpeg_command(video_url, output_file, False, ffmpeg_path),
+                    timeout=timeout, on_progress=_report_progress,
+                )
+        except (asyncio.CancelledError, TimeoutError):
+            # 不保留被中断的半成品
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+        if stderr:
+            logger.debug("ffmpeg stderr: %s", stderr)
 
         # 检查输出文件是否存在
         if os.path.exists(output_file):
             file_size = os.path.getsize(output_file)
+            method = f"直接复制音频流（{codec}）" if stream_copy else f"重新编码为 {output_format}"
             logger.info(
-                "Audio extraction completed successfully. File size: %d bytes", file_size)
+                "Audio extraction completed successfully (%s). File size: %d bytes",
+                "stream copy" if stream_copy else "transcode", file_size)
             return [types.TextContent(
                 type="text",
-                text=f"音频提取成功!\n文件路径: {output_file}\n文件大小: {file_size} 字节"
+                text=f"音频提取成功!\n文件路径: {output_file}\n文件大小: {file_size} 字节\n处理方式: {method}"
             )]
         else:
             error_msg = f"Audio extraction failed. Output file not found: {output_file}"
             logger.error(error_msg)
             return [types.TextContent(type="text", text=error_msg)]
 
-    except subprocess.CalledProcessError as e:
+    except FFmpegError as e:
         error_msg = f"ffmpeg error: {e.stderr}"
         logger.error(error_msg)
         return [types.TextContent(type="text", text=error_msg)]
+    except TimeoutError as e:
+        error_msg = f"ffmpeg timed out: {str(e)}"
+        logger.error(error_msg)
+        return [types.TextContent(type="text", text=error_msg)]
     except Exception as e:
         error_msg = f"Error extracting audio: {str(e)}"
         logger.error(error_msg, exc_info=True)
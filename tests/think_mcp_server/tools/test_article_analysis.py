@@ -0,0 +1,405 @@
+"""Test article analysis tool."""
+import json
+import os
+import pytest
+import tempfile
+from pathlib import Path
+from think_mcp_server.tools import article_analysis, token_cache as token_cache_module
+from think_mcp_server.tools.article_analysis import analyze_token_content, parse_date_range, resolve_article_uri
+from think_mcp_server.tools.article_dedup import find_duplicate_clusters, minhash_signature
+from think_mcp_server.tools.article_catalog import ArticleCatalog
+from think_mcp_server.tools.article_search import ArticleSearchIndex
+from think_mcp_server.tools.article_packing import pack_articles
+from think_mcp_server.tools.token_cache import TokenCache
+from think_mcp_server.tools.token_estimator import TokenEstimator, classify_text
+from think_mcp_server.tools.tokenizer_pool import count_file_tokens, count_tokens, shutdown_tokenizer_pool
+
+class WhitespaceEncoder:
+    """Minimal encoder that treats whitespace-separated words as tokens."""
+    name = "whitespace"
+
+    def encode(self, text):
+        return text.split()
+
+@pytest.fixture
+def token_cache():
+    """Create a temporary token cache."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = TokenCache(Path(temp_dir) / "token_cache.db", max_entries=2)
+        yield cache
+        cache.close()
+
+def test_token_cache_hit_requires_same_stat(token_cache):
+    """Test that cache hits require matching size, mtime and encoding."""
+    token_cache.put("/articles/a.md", 10, 100, 42, "cl100k_base")
+
+    assert token_cache.get("/articles/a.md", 10, 100, "cl100k_base") == 42
+    assert token_cache.get("/articles/a.md", 11, 100, "cl100k_base") is None
+    assert token_cache.get("/articles/a.md", 10, 101, "cl100k_base") is None
+    assert token_cache.get("/articles/a.md", 10, 100, "o200k_base") is None
+
+def test_token_cache_eviction(token_cache):
+    """Test that the least recently used entries are evicted."""
+    token_cache.put("/articles/a.md", 1, 1, 1, "cl100k_base")
+    token_cache.put("/articles/b.md", 1, 1, 2, "cl100k_base")
+    token_cache.put("/articles/c.md", 1, 1, 3, "cl100k_base")
+
+    assert token_cache.get("/articles/a.md", 1, 1, "cl100k_base") is None
+    assert token_cache.get("/articles/c.md", 1, 1, "cl100k_base") == 3
+
+def test_token_cache_invalidate_prefix(token_cache):
+    """Test invalidating entries under a directory."""
+    token_cache.put_many([
+        (os.path.join("/articles", "a.md"), 1, 1, 1),
+        (os.path.join("/articles-old", "b.md"), 1, 1, 2),
+    ], "cl100k_base")
+
+    assert token_cache.invalidate("/articles") == 1
+    assert token_cache.get(os.path.join("/articles-old", "b.md"), 1, 1, "cl100k_base") == 2
+
+def test_parse_date_range_across_month_end():
+    """Test parsing single dates and ranges that cross month ends."""
+    assert parse_date_range("2025-01-31") == ("2025-01-31", "2025-01-31")
+    assert parse_date_range("2025-01-31~2025-02-01") == ("2025-01-31", "2025-02-01")
+    with pytest.raises(ValueError):
+        parse_date_range("2025-02-01~2025-01-31")
+
+@pytest.fixture
+def article_base(tmp_path, monkeypatch):
+    """Create an article tree and point the analysis tool and its caches at temporary paths."""
+    base_dir = tmp_path / "articles"
+    for date_str, name, words in [("2025-01-01", "a", 30), ("2025-01-01", "b", 20), ("2025-01-02", "c", 10)]:
+        (base_dir / date_str).mkdir(parents=True, exist_ok=True)
+        (base_dir / date_str / f"{name}.md").write_text("word " * words, encoding="utf-8")
+    (tmp_path / "secret.md").write_text("secret", encoding="utf-8")
+    monkeypatch.setenv("article_base_path", str(base_dir))
+    monkeypatch.setenv("cache_path", str(tmp_path / "cache"))
+    monkeypatch.setenv("max_tokens_limit", "50")
+    monkeypatch.setattr(token_cache_module, "_token_cache", None)
+    monkeypatch.setattr(article_analysis.tiktoken, "encoding_for_model", lambda model: WhitespaceEncoder())
+    return base_dir
+
+@pytest.mark.asyncio
+async def test_manifest_output_mode_paginates(article_base):
+    """Test that manifest mode returns URIs and counts without bodies, one page at a time."""
+    arguments = {"date_input": "2025-01-01~2025-01-02", "output_mode": "manifest", "page_size": 2}
+    first = json.loads((await analyze_token_content(arguments))[0].text)
+    assert [item["title"] for item in first["articles"]] == ["a", "b"]
+    assert first["articles"][0] == {
+        "title": "a", "date": "2025-01-01", "uri": "article:///2025-01-01/a.md",
+        "token_count": 30, "selected": True,
+    }
+    assert first["article_count"] == 3
+    assert first["total_tokens"] == 60
+    assert first["next_cursor"] == "2"
+    assert all("content" not in item for item in first["articles"])
+
+    second = json.loads((await analyze_token_content({**arguments, "cursor": first["next_cursor"]}))[0].text)
+    assert [item["title"] for item in second["articles"]] == ["c"]
+    assert "next_cursor" not in second
+
+    with pytest.raises(ValueError):
+        await analyze_token_content({**arguments, "cursor": "-1"})
+    with pytest.raises(ValueError):
+        await analyze_token_content({**arguments, "page_size": "many"})
+
+@pytest.mark.asyncio
+async def test_content_mode_reads_only_selected_articles(article_base, monkeypatch):
+    """Test that the second pass opens only the selected articles and never loads a large unselected one."""
+    import builtins
+
+    (article_base / "2025-01-02" / "huge.md").write_text("word word word word\n" * 50000, encoding="utf-8")
+    opened = []
+
+    def tracking_open(file, *args, **kwargs):
+        opened.append(str(file))
+        return builtins.open(file, *args, **kwargs)
+
+    monkeypatch.setattr(article_analysis, "open", tracking_open, raising=False)
+    result = json.loads((await analyze_token_content({"date_input": "2025-01-01~2025-01-02"}))[0].text)
+
+    articles = {article["title"]: article for article in result["articles"]}
+    assert articles["huge"]["token_count"] == 200000
+    assert articles["huge"]["content"] == ""
+    loaded = [article for article in result["articles"] if article["content"]]
+    assert sum(article["token_count"] for article in loaded) <= 50
+    assert sorted(opened) == sorted(article["file_path"] for article in loaded)
+    assert str(article_base / "2025-01-02" / "huge.md") not in opened
+
+def test_article_uri_stays_under_base_path(article_base):
+    """Test that article:// URIs resolve under article_base_path and cannot escape it."""
+    from pydantic import AnyUrl
+    from think_mcp_server.resources import read_resource
+
+    assert resolve_article_uri("/2025-01-01/a.md") == os.path.join(str(article_base), "2025-01-01", "a.md")
+    assert read_resource(AnyUrl("article:///2025-01-02/c.md")) == "word " * 10
+    for uri_path in [
+        "/2025-01-01/..%2F..%2Fsecret.md",
+        "/2025-01-01/../../secret.md",
+        "/2025-01-01//etc/passwd",
+        "/2025-01-01/..",
+        "/../secret.md",
+        "/%2Fetc/passwd",
+        "/2025-01-01/",
+    ]:
+        with pytest.raises(ValueError):
+            resolve_article_uri(uri_path)
+    with pytest.raises(ValueError):
+        read_resource(AnyUrl("article:///2025-01-01/%2E%2E%2F%2E%2E%2Fsecret.md"))
+    with pytest.raises(ValueError):
+        read_resource(AnyUrl("article:///2025-01-01/missing.md"))
+
+def test_article_catalog_incremental_refresh():
+    """Test that the catalog picks up new date folders and files."""
+    with tempfile.TemporaryDirectory() as base_dir, tempfile.TemporaryDirectory() as cache_dir:
+        os.makedirs(os.path.join(base_dir, "2024-12-31"))
+        Path(base_dir, "2024-12-31", "a.md").write_text("a", encoding="utf-8")
+        catalog = ArticleCatalog(base_dir, os.path.join(cache_dir, "catalog.db"))
+
+        assert catalog.refresh() == 1
+        assert catalog.refresh() == 0
+
+        os.makedirs(os.path.join(base_dir, "2025-01-01"))
+        Path(base_dir, "2025-01-01", "b.md").write_text("b", encoding="utf-8")
+        Path(base_dir, "2025-01-01", "image.png").write_bytes(b"png")
+        catalog.refresh()
+
+        entries = catalog.articles_in_range("2024-12-01", "2025-01-31")
+        assert [entry["title"] for entry in entries] == ["a", "b"]
+        catalog.close()
+
+def test_count_file_tokens_streams_in_chunks():
+    """Test that chunked counting matches counting the whole file."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False, encoding='utf-8') as f:
+        f.write("first line\n  indented line\n\nlast line without newline")
+        temp_path = f.name
+    try:
+        encoder = WhitespaceEncoder()
+        whole, error = count_file_tokens(temp_path, encoder)
+        chunked, _ = count_file_tokens(temp_path, encoder, chunk_chars=1)
+        assert error is None
+        assert whole == chunked == 8
+    finally:
+        os.unlink(temp_path)
+
+@pytest.fixture
+def tiktoken_encoder():
+    """Load the cl100k_base encoding, skipping when it cannot be downloaded."""
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        pytest.skip(f"cl100k_base encoding unavailable: {e}")
+
+@pytest.mark.asyncio
+async def test_count_tokens_matches_tiktoken(tiktoken_encoder, monkeypatch):
+    """Test that serial, pooled and chunked counting all match encoding the whole file."""
+    texts = [
+        "# 标题\n\n这是一段中文内容，包含标点。\n  indented line\n\n\n" * 40,
+        "def f(x):\n    return x  \n\n\tclass A:\n        pass\n" * 40,
+        "word " * 500 + "\n" + "https://example.com/a?b=c " * 30,
+    ]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index, text in enumerate(texts):
+            path = Path(temp_dir) / f"{index}.md"
+            path.write_text(text, encoding="utf-8")
+            paths.append(str(path))
+        expected = {path: (len(tiktoken_encoder.encode(text)), None) for path, text in zip(paths, texts)}
+
+        for path in paths:
+            assert count_file_tokens(path, tiktoken_encoder, chunk_chars=16) == expected[path]
+
+        monkeypatch.setenv("tokenizer_parallel_threshold", "1000")
+        assert await count_tokens(paths, tiktoken_encoder) == expected
+
+        monkeypatch.setenv("tokenizer_parallel_threshold", "1")
+        monkeypatch.setenv("tokenizer_workers", "2")
+        monkeypatch.setenv("tokenizer_chunk_size", "1")
+        try:
+            assert await count_tokens(paths, tiktoken_encoder) == expected
+        finally:
+            shutdown_tokenizer_pool()
+
+def test_pack_articles_exact_fills_budget():
+    """Test that exact packing beats greedy when one big article blocks smaller ones."""
+    articles = [
+        {"title": "big", "date": "2025-01-01", "token_count": 60},
+        {"title": "a", "date": "2025-01-02", "token_count": 50},
+        {"title": "b", "date": "2025-01-03", "token_count": 50},
+        {"title": "broken", "date": "2025-01-03", "error": "unreadable"},
+    ]
+
+    greedy, greedy_stats = pack_articles(articles, 100, "greedy")
+    exact, exact_stats = pack_articles(articles, 100, "exact")
+
+    assert [article["title"] for article in greedy] == ["big"]
+    assert sorted(article["title"] for article in exact) == ["a", "b"]
+    assert exact_stats["utilization"] == 1.0 > greedy_stats["utilization"]
+    assert exact_stats["candidate_count"] == 3
+
+def test_pack_articles_recency_prefers_newest():
+    """Test that recency packing keeps the newest articles first."""
+    articles = [
+        {"title": "old", "date": "2024-01-01", "token_count": 10},
+        {"title": "new", "date": "2025-01-01", "token_count": 10},
+    ]
+    selected, _ = pack_articles(articles, 10, "recency")
+    assert [article["title"] for article in selected] == ["new"]
+
+def test_token_estimator_calibration():
+    """Test that calibration sets the ratio and error bound per language."""
+    assert classify_text("plain english text") == "latin"
+    assert classify_text("这是一段中文内容") == "cjk"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        calibration_path = Path(temp_dir) / "token_calibration.json"
+        estimator = TokenEstimator(calibration_path, "cl100k_base")
+        assert not estimator.is_calibrated("latin")
+
+        samples = [("latin", f"/a/{i}.md", 400, 100) for i in range(7)]
+        estimator.calibrate(samples)
+        estimator.calibrate(samples)
+        assert not estimator.is_calibrated("latin")
+
+        estimator.calibrate([("latin", "/a/7.md", 400, 120)])
+        assert estimator.is_calibrated("latin")
+        assert estimator.estimate(4000, "latin") == 1025
+        assert 0 < estimator.relative_error("latin") < 0.2
+
+        reloaded = TokenEstimator(calibration_path, "cl100k_base")
+        assert reloaded.estimate(4000, "latin") == 1025
+
+        # 另一个编码的估算器写入时保留已有编码的校准
+        other = TokenEstimator(calibration_path, "o200k_base")
+        estimator.calibrate([("latin", "/a/7.md", 400, 100)])
+        other.calibrate([("cjk", "/b/0.md", 300, 100)])
+        merged = TokenEstimator(calibration_path, "cl100k_base")
+        assert merged.estimate(4000, "latin") == 1000
+        assert TokenEstimator(calibration_path, "o200k_base").estimate(300, "cjk") == 100
+
+def test_find_duplicate_clusters_keeps_newest():
+    """Test that near-duplicate articles cluster around the newest copy."""
+    text = " ".join(f"word{i % 97} item{i % 13}" for i in range(500))
+    entries = [
+        {"file_path": "/a/old.md", "date": "2025-01-01", "token_count": 100},
+        {"file_path": "/a/new.md", "date": "2025-01-02", "token_count": 100},
+        {"file_path": "/a/other.md", "date": "2025-01-02", "token_count": 100},
+    ]
+    signatures = {
+        "/a/old.md": minhash_signature(text),
+        "/a/new.md": minhash_signature("Reposted: " + text),
+        "/a/other.md": minhash_signature("completely different content about something else entirely"),
+    }
+    clusters = find_duplicate_clusters(entries, signatures, 0.8)
+    assert len(clusters) == 1
+    assert clusters[0]["representative"]["file_path"] == "/a/new.md"
+    assert [entry["file_path"] for entry, _ in clusters[0]["duplicates"]] == ["/a/old.md"]
+
+def test_find_duplicate_clusters_skips_empty_and_merges_identical():
+    """Test that empty articles are ignored and identical boilerplate is merged without pairwise checks."""
+    entries = [{"file_path": f"/a/empty{i}.md", "date": "2025-01-01"} for i in range(300)]
+    entries += [{"file_path": f"/a/boilerplate{i}.md", "date": f"2025-01-{i + 1:02d}"} for i in range(20)]
+    signatures = {entry["file_path"]: minhash_signature("") for entry in entries[:300]}
+    signatures.update({entry["file_path"]: minhash_signature("Subscribe to our newsletter!") for entry in entries[300:]})
+
+    clusters = find_duplicate_clusters(entries, signatures)
+    assert len(clusters) == 1
+    assert clusters[0]["representative"]["file_path"] == "/a/boilerplate19.md"
+    assert len(clusters[0]["duplicates"]) == 19
+
+def test_find_duplicate_clusters_compares_oversized_buckets(monkeypatch):
+    """Test that near-duplicates sharing only oversized LSH buckets are still merged."""
+    from think_mcp_server.tools import article_dedup
+
+    monkeypatch.setattr(article_dedup, "MAX_BUCKET_SIZE", 32)
+    text = " ".join(f"word{i % 97} item{i % 13}" for i in range(500))
+    entries = [{"file_path": f"/a/copy{i}.md", "date": "2025-01-01", "token_count": i} for i in range(100)]
+    signatures = {
+        entry["file_path"]: minhash_signature(f"{text} {i * 7919:x} {i * 104729:x} {i * 1299709:x}")
+        for i, entry in enumerate(entries)
+    }
+    assert len({tuple(signature) for signature in signatures.values()}) == 100
+
+    clusters = find_duplicate_clusters(entries, signatures, 0.8)
+    assert len(clusters) == 1
+    assert len(clusters[0]["duplicates"]) == 99
+
+@pytest.mark.asyncio
+async def test_dedup_collapses_reposted_article(article_base, monkeypatch):
+    """Test that analyze_token_content keeps only the newest copy of a reposted article."""
+    from think_mcp_server.tools import article_dedup
+
+    monkeypatch.setattr(article_dedup, "_signature_cache", None)
+    text = " ".join(f"word{i % 97} item{i % 13}" for i in range(20))
+    (article_base / "2025-01-01" / "a.md").write_text(text, encoding="utf-8")
+    (article_base / "2025-01-02" / "repost.md").write_text("Reposted: " + text, encoding="utf-8")
+    (article_base / "2025-01-01" / "b.md").write_text("notes about something else entirely", encoding="utf-8")
+    (article_base / "2025-01-02" / "c.md").write_text("a short diary entry written on another day", encoding="utf-8")
+
+    arguments = {"date_input": "2025-01-01~2025-01-02", "output_mode": "manifest", "dedup": True}
+    manifest = json.loads((await analyze_token_content(arguments))[0].text)
+    articles = {article["title"]: article for article in manifest["articles"]}
+    assert articles["a"]["duplicate_of"] == "article:///2025-01-02/repost.md"
+    assert not articles["a"]["selected"]
+    assert articles["repost"]["selected"]
+    assert manifest["duplicates"]["collapsed_tokens"] == 40
+    assert [cluster["representative"]["title"] for cluster in manifest["duplicates"]["clusters"]] == ["repost"]
+
+def test_article_search_index_incremental():
+    """Test that the search index finds CJK text and picks up edits and deletions."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        first = Path(temp_dir) / "first.md"
+        second = Path(temp_dir) / "second.md"
+        first.write_text("全文检索的实现细节", encoding="utf-8")
+        second.write_text("vector search notes", encoding="utf-8")
+        entries = [
+            {"file_path": str(first), "date": "2025-01-01", "title": "first", "size": 1, "mtime_ns": 1},
+            {"file_path": str(second), "date": "2025-01-02", "title": "second", "size": 1, "mtime_ns": 1},
+        ]
+        index = ArticleSearchIndex(str(Path(temp_dir) / "search.db"))
+        assert index.sync(entries, batch_size=1) == 2
+        assert index.sync(entries) == 0
+        assert [hit["file_path"] for hit in index.search("全文检索")] == [str(first)]
+        assert [hit["file_path"] for hit in index.search("检索")] == [str(first)]
+        assert index.search("search", "2025-01-01", "2025-01-01") == []
+
+        # 原地编辑不会改变目录记录的大小和修改时间，索引重新 stat 后仍能发现
+        mtime_ns = second.stat().st_mtime_ns
+        second.write_text("vector search notes, updated with 全文检索", encoding="utf-8")
+        os.utime(second, ns=(mtime_ns + 1_000_000, mtime_ns + 1_000_000))
+        assert index.sync(entries) == 1
+        assert sorted(hit["file_path"] for hit in index.search("全文检索")) == sorted([str(first), str(second)])
+
+        first.unlink()
+        assert index.sync(entries) == 0
+        assert [hit["file_path"] for hit in index.search("全文检索")] == [str(second)]
+        index.close()
+
+def test_vector_store_incremental_sync():
+    """Test that only changed documents are re-vectorized and removed rows are reused."""
+    pytest.importorskip("numpy")
+    from think_mcp_server.tools.related_content import VectorStore, hashed_vector
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for name, text in [("db", "vector database index search"), ("food", "pasta tomato recipe"),
+                           ("notes", "search index notes")]:
+            path = Path(temp_dir) / f"{name}.md"
+            path.write_text(text, encoding="utf-8")
+            paths.append(path)
+        documents = [{"path": str(path), "kind": "resource", "title": path.stem} for path in paths]
+
+        store = VectorStore(Path(temp_dir) / "vectors", dim=256)
+        assert store.sync(documents) == (3, 0)
+        assert store.sync(documents) == (0, 0)
+        results = store.query(hashed_vector("search index", 256), top_k=2)
+        assert {result["title"] for result in results} == {"db", "notes"}
+
+        extra = Path(temp_dir) / "extra.md"
+        extra.write_text("pasta sauce", encoding="utf-8")
+        documents = documents[:2] + [{"path": str(extra), "kind": "resource", "title": "extra"}]
+        assert store.sync(documents) == (1, 1)
+        results = store.query(store.vector_of(str(paths[1])), exclude=str(paths[1]))
+        assert results[0]["title"] == "extra"
+        store.close()
@@ -25,6 +25,13 @@ def temp_test_dir():
                 f.write(f"Test content {i}")
         yield temp_dir
 
+@pytest.fixture
+def chat_without_stream(monkeypatch):
+    """Route streamed requests through the mocked client's chat method."""
+    async def fake_stream_chat(client, message, **kwargs):
+        return (await client.chat(message, stream=False))[1]
+    monkeypatch.setattr('think_mcp_server.tools.content_analyzer.stream_chat', fake_stream_chat)
+
 @pytest.mark.asyncio
 async def test_analyze_file_content_single_file(temp_test_file):
     """Test analyzing a single file."""
@@ -96,3 +103,510 @@ async def test_analyze_content_no_arguments():
     """Test analyze_content with no arguments."""
     with pytest.raises(ValueError, match="Missing file_path argument"):
         await analyze_content(None)
+
+@pytest.mark.asyncio
+async def test_analyze_content_directory_concurrent(temp_test_dir):
+    """Test that directory mode runs files concurrently, keeps order and isolates errors."""
+    async def fake_analyze(file_path):
+        if file_path.endswith("test_0.txt"):
+            raise RuntimeError("LLM failed")
+        return {"type": "text", "text": f"Analysis of {Path(file_path).name}"}
+
+    with patch('think_mcp_server.tools.content_analyzer.analyze_file_content', side_effect=fake_analyze):
+        results = await analyze_content({"file_path": temp_test_dir, "concurrency": 2})
+
+    assert len(results) == 2
+    assert "Error processing test_0.txt" in results[0].text
+    assert "Analysis of test_1.txt" in results[1].text
+    assert "description: Analysis of test_1.txt" in Path(temp_test_dir, "test_1.txt").read_text()
+
+@pytest.mark.asyncio
+async def test_llm_client_pool_reuses_clients():
+    """Test that pooled clients are configured once, reused and returned with empty history."""
+    from think_mcp_server.tools.llm_pool import LLMClientPool
+
+    with patch('think_mcp_server.tools.llm_pool.LLMClient') as mock_client:
+        mock_instance = MagicMock()
+        mock_instance.messages = []
+        mock_client.return_value = mock_instance
+
+        pool = LLMClientPool("llm", "provider", "model")
+        async with pool.client() as first:
+            async with pool.client() as second:
+                assert first is not second
+        async with pool.client() as reused:
+            assert reused in (first, second)
+
+        assert mock_client.call_count == 1
+        mock_instance.set_model.assert_called_once_with("llm", "provider", "model")
+        assert pool.created == 2
+
+def test_prompt_template_reloads_on_change(monkeypatch, temp_test_file):
+    """Test that the prompt template is cached until the file changes."""
+    from think_mcp_server.tools.content_analyzer import get_prompt_template
+
+    monkeypatch.setenv("content_analyzer_prompt_path", temp_test_file)
+    assert get_prompt_template() == "Test content for analysis"
+    Path(temp_test_file).write_text("New prompt ", encoding="utf-8")
+    os.utime(temp_test_file, ns=(1, 1))
+    assert get_prompt_template() == "New prompt"
+
+@pytest.mark.asyncio
+async def test_analyze_content_skips_unchanged_body(temp_test_file):
+    """Test that files whose body hash matches the front matter are not sent to the LLM."""
+    with patch('think_mcp_server.tools.content_analyzer.analyze_file_content') as mock_analyze:
+        mock_analyze.return_value = {"type": "text", "text": "Test analysis"}
+
+        await analyze_content({"file_path": temp_test_file})
+        assert "content_hash: sha256:" in Path(temp_test_file).read_text()
+        assert Path(temp_test_file).read_text().endswith("Test content for analysis")
+
+        result = await analyze_content({"file_path": temp_test_file, "update_after": None})
+        assert "content unchanged" in result[0].text
+        assert mock_analyze.call_count == 1
+
+        with open(temp_test_file, "a") as f:
+            f.write(" with an edit")
+        await analyze_content({"file_path": temp_test_file})
+        assert mock_analyze.call_count == 2
+
+@pytest.mark.asyncio
+async def test_analyze_content_directory_manifest(temp_test_dir):
+    """Test that a re-run skips files recorded in the sidecar manifest without reading them."""
+    from think_mcp_server.tools.analysis_manifest import MANIFEST_FILENAME
+
+    with patch('think_mcp_server.tools.content_analyzer.analyze_file_content') as mock_analyze:
+        mock_analyze.return_value = {"type": "text", "text": "Test analysis"}
+        await analyze_content({"file_path": temp_test_dir})
+        assert mock_analyze.call_count == 2
+        assert Path(temp_test_dir, MANIFEST_FILENAME).exists()
+
+        with patch('think_mcp_server.tools.content_analyzer.analyze_single_file') as mock_single:
+            results = await analyze_content({"file_path": temp_test_dir})
+            assert not mock_single.called
+        assert len(results) == 2
+        assert all("unchanged since last run" in result.text for result in results)
+
+        with open(os.path.join(temp_test_dir, "test_1.txt"), "a") as f:
+            f.write(" edited")
+        await analyze_content({"file_path": temp_test_dir})
+        assert mock_analyze.call_count == 3
+
+def test_response_cache_lru_eviction():
+    """Test that the response cache counts hits and evicts least recently used entries."""
+    from think_mcp_server.tools.llm_cache import ResponseCache, response_cache_key
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResponseCache(Path(temp_dir) / "responses.db", max_bytes=10)
+        first = response_cache_key("model", "prompt", "first")
+        second = response_cache_key("model", "prompt", "second")
+        assert first != response_cache_key("model", "other prompt", "first")
+
+        cache.put(first, "model", "aaaa")
+        cache.put(second, "model", "bbbb")
+        assert cache.get(first) == "aaaa"
+        cache.put(response_cache_key("model", "prompt", "third"), "model", "cccc")
+
+        assert cache.get(second) is None
+        assert cache.get(first) == "aaaa"
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 2)
+        cache.close()
+
+def test_response_cache_shared_db_and_disabled(monkeypatch):
+    """Test that eviction counts other writers' entries and that llm_cache_max_mb=0 disables the cache."""
+    from think_mcp_server.tools import llm_cache
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "responses.db"
+        first = llm_cache.ResponseCache(db_path, max_bytes=10)
+        second = llm_cache.ResponseCache(db_path, max_bytes=10)
+        first.put("a", "model", "aaaa")
+        second.put("b", "model", "bbbb")
+        first.put("c", "model", "cccc")
+        assert first.get("a") is None
+        assert first.stats()["bytes"] == 8
+        first.close()
+        second.close()
+
+        monkeypatch.setattr(llm_cache, "_response_cache", None)
+        monkeypatch.setenv("llm_cache_max_mb", "0")
+        monkeypatch.setenv("llm_cache_path", str(Path(temp_dir) / "disabled.db"))
+        cache = llm_cache.get_response_cache()
+        cache.put("a", "model", "aaaa")
+        assert cache.get("a") is None
+        assert llm_cache.response_cache_stats() is None
+        assert not (Path(temp_dir) / "disabled.db").exists()
+
+@pytest.mark.asyncio
+async def test_analyze_file_content_uses_response_cache(monkeypatch, temp_test_file, chat_without_stream):
+    """Test that identical content is answered from the response cache without an LLM call."""
+    from think_mcp_server.tools.llm_cache import ResponseCache
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        prompt_path = Path(temp_dir) / "prompt.md"
+        prompt_path.write_text("Describe", encoding="utf-8")
+        monkeypatch.setenv("content_analyzer_prompt_path", str(prompt_path))
+        cache = ResponseCache(Path(temp_dir) / "responses.db")
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.get_response_cache', lambda: cache)
+
+        with patch('think_mcp_server.tools.content_analyzer.get_llm_pool') as mock_pool:
+            mock_instance = MagicMock()
+            mock_instance.chat = AsyncMock(return_value=(None, "Cached analysis"))
+            mock_pool.return_value.client.return_value.__aenter__.return_value = mock_instance
+
+            first = await analyze_file_content(temp_test_file)
+            second = await analyze_file_content(temp_test_file)
+
+        assert first["text"] == second["text"] == "Cached analysis"
+        assert mock_instance.chat.call_count == 1
+        assert cache.stats()["hits"] == 1
+        cache.close()
+
+@pytest.mark.asyncio
+async def test_analyze_content_batches_small_files(monkeypatch, temp_test_dir, chat_without_stream):
+    """Test that small files share one LLM request and each gets its own description."""
+    import json
+    from think_mcp_server.tools.llm_cache import ResponseCache
+
+    encoder = MagicMock()
+    encoder.encode.side_effect = lambda text: text.split()
+    monkeypatch.setattr('think_mcp_server.tools.content_analyzer.tiktoken.encoding_for_model', lambda model: encoder)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        prompt_path = Path(cache_dir) / "prompt.md"
+        prompt_path.write_text("Describe", encoding="utf-8")
+        monkeypatch.setenv("content_analyzer_prompt_path", str(prompt_path))
+        cache = ResponseCache(Path(cache_dir) / "responses.db")
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.get_response_cache', lambda: cache)
+
+        with patch('think_mcp_server.tools.content_analyzer.get_llm_pool') as mock_pool:
+            mock_instance = MagicMock()
+            mock_instance.chat = AsyncMock(return_value=(None, '```json\n{"1": "First file", "2": "Second file"}\n```'))
+            mock_pool.return_value.client.return_value.__aenter__.return_value = mock_instance
+
+            results = await analyze_content({"file_path": temp_test_dir, "batch_tokens": 100})
+
+        assert mock_instance.chat.call_count == 1
+        assert len(results) == 3
+        # 最后一项是本次调用的模型用量
+        usage = json.loads(results[-1].text)["model_usage"]
+        assert [entry["requests"] for entry in usage.values()] == [1]
+        assert "description: First file" in Path(temp_test_dir, "test_0.txt").read_text()
+        assert "description: Second file" in Path(temp_test_dir, "test_1.txt").read_text()
+        cache.close()
+
+@pytest.mark.asyncio
+async def test_analyze_file_content_map_reduce(monkeypatch, temp_test_file, chat_without_stream):
+    """Test that large files are summarized chunk by chunk and then reduced."""
+    from think_mcp_server.tools.content_analyzer import split_by_tokens
+    from think_mcp_server.tools.llm_cache import ResponseCache
+
+    encoder = MagicMock()
+    encoder.encode.side_effect = lambda text: text.split()
+    encoder.decode.side_effect = lambda tokens: " ".join(tokens)
+    assert split_by_tokens("a b\nc d\ne f g h i\n", encoder, 4) == ["a b\nc d\n", "e f g h", "i"]
+
+    monkeypatch.setattr('think_mcp_server.tools.content_analyzer.tiktoken.encoding_for_model', lambda model: encoder)
+    monkeypatch.setenv("content_analyzer_chunk_tokens", "4")
+    Path(temp_test_file).write_text("one two\nthree four\nfive six\n", encoding="utf-8")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        prompt_path = Path(cache_dir) / "prompt.md"
+        prompt_path.write_text("Describe", encoding="utf-8")
+        monkeypatch.setenv("content_analyzer_prompt_path", str(prompt_path))
+        cache = ResponseCache(Path(cache_dir) / "responses.db")
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.get_response_cache', lambda: cache)
+
+        with patch('think_mcp_server.tools.content_analyzer.get_llm_pool') as mock_pool:
+            mock_instance = MagicMock()
+            mock_instance.chat = AsyncMock(side_effect=[(None, "s1"), (None, "s2"), (None, "final")])
+            mock_pool.return_value.client.return_value.__aenter__.return_value = mock_instance
+
+            result = await analyze_file_content(temp_test_file)
+
+        assert result["text"] == "final"
+        assert mock_instance.chat.call_count == 3
+        reduce_message = mock_instance.chat.call_args_list[-1].args[0]
+        assert "s1" in reduce_message and "s2" in reduce_message
+        cache.close()
+
+def test_rewrite_front_matter_streams_body(temp_test_file):
+    """Test that the front matter is replaced in place and the body bytes are kept."""
+    from think_mcp_server.tools.front_matter import hash_file_body, read_front_matter, rewrite_front_matter
+
+    body = "第一行\r\n---\nsecond line\n" * 1000
+    Path(temp_test_file).write_bytes(("---\nname: old\n---\n" + body).encode("utf-8"))
+    os.chmod(temp_test_file, 0o640)
+    front_matter, body_offset = read_front_matter(Path(temp_test_file))
+    assert front_matter == {"name": "old"}
+    body_hash = hash_file_body(Path(temp_test_file), body_offset)
+
+    rewrite_front_matter(Path(temp_test_file), "---\nname: new\n---\n")
+
+    assert Path(temp_test_file).read_bytes() == ("---\nname: new\n---\n" + body).encode("utf-8")
+    assert os.stat(temp_test_file).st_mode & 0o777 == 0o640
+    front_matter, body_offset = read_front_matter(Path(temp_test_file))
+    assert front_matter == {"name": "new"}
+    assert hash_file_body(Path(temp_test_file), body_offset) == body_hash
+    temp_prefix = "." + os.path.basename(temp_test_file) + "."
+    assert not [name for name in os.listdir(os.path.dirname(temp_test_file)) if name.startswith(temp_prefix)]
+
+def test_rewrite_front_matter_keeps_links(tmp_path):
+    """Test that symlinks are written through, hard links are kept only on request, and bodies read from byte offsets."""
+    from think_mcp_server.tools.front_matter import (
+        hash_file_body, read_body, read_body_and_hash, read_front_matter, rewrite_front_matter
+    )
+
+    target = tmp_path / "note.md"
+    target.write_bytes("---\nname: 旧\n---\n正文\r\nline\n".encode("utf-8"))
+    symlink = tmp_path / "link.md"
+    symlink.symlink_to(target)
+    hard_link = tmp_path / "hard.md"
+    os.link(target, hard_link)
+
+    _, body_offset = read_front_matter(symlink)
+    assert read_body(symlink, body_offset) == "正文\nline\n"
+    assert read_body_and_hash(symlink, body_offset) == ("正文\nline\n", hash_file_body(symlink, body_offset))
+
+    # 默认原子替换：链接指向的文件被更新，硬链接仍指向旧内容
+    rewrite_front_matter(symlink, "---\nname: new\n---\n")
+    assert symlink.is_symlink()
+    assert target.read_bytes() == "---\nname: new\n---\n正文\r\nline\n".encode("utf-8")
+    assert not os.path.samefile(target, hard_link)
+    assert hard_link.read_bytes() == "---\nname: 旧\n---\n正文\r\nline\n".encode("utf-8")
+
+    os.unlink(hard_link)
+    os.link(target, hard_link)
+    rewrite_front_matter(symlink, "---\nname: newer\n---\n", keep_hard_links=True)
+    assert os.path.samefile(target, hard_link)
+    assert hard_link.read_bytes() == "---\nname: newer\n---\n正文\r\nline\n".encode("utf-8")
+
+def test_path_filter_rules_and_binary_sniff(tmp_path):
+    """Test gitignore rules, directory pruning, extension allowlist and binary detection."""
+    from think_mcp_server.tools.path_filter import PathFilter, is_binary_file
+
+    for rel_path in [".git/config", "build/out.md", "docs/a.md", "docs/b.txt", "docs/keep.log",
+                     "docs/skip.log", "sub/c.md", "sub/tmp/d.md", "node_modules/x/e.md"]:
+        (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel_path).write_text("text", encoding="utf-8")
+    (tmp_path / ".gitignore").write_text("# comment\n/build/\n*.log\n!keep.log\n", encoding="utf-8")
+    (tmp_path / "sub" / ".gitignore").write_text("tmp/\n", encoding="utf-8")
+
+    def walk(**kwargs):
+        return sorted(path.relative_to(tmp_path).as_posix() for path in PathFilter(tmp_path, **kwargs).walk())
+
+    assert walk() == [".gitignore", "docs/a.md", "docs/b.txt", "docs/keep.log", "sub/.gitignore", "sub/c.md"]
+    assert walk(extensions=["md"], exclude=["sub/"]) == ["docs/a.md"]
+    assert walk(include=["docs/**"], use_gitignore=False) == ["docs/a.md", "docs/b.txt", "docs/keep.log", "docs/skip.log"]
+
+    (tmp_path / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\0\0")
+    (tmp_path / "latin1.txt").write_bytes("café au lait".encode("latin-1"))
+    (tmp_path / "cut.txt").write_bytes("中文".encode("utf-8") * 5000)
+    assert is_binary_file(tmp_path / "image.png")
+    assert is_binary_file(tmp_path / "latin1.txt")
+    assert not is_binary_file(tmp_path / "cut.txt", sample_bytes=4)
+
+@pytest.mark.asyncio
+async def test_analyze_content_dry_run(monkeypatch, temp_test_dir):
+    """Test that dry_run plans tokens and cost without calling the LLM or writing files."""
+    import json
+    from think_mcp_server.tools import content_analyzer
+    from think_mcp_server.tools.llm_cache import ResponseCache, response_cache_key
+    from think_mcp_server.tools.token_cache import TokenCache
+
+    encoder = MagicMock()
+    encoder.name = "fake"
+    encoder.encode.side_effect = lambda text: text.split()
+    monkeypatch.setattr('think_mcp_server.tools.content_analyzer.tiktoken.encoding_for_model', lambda model: encoder)
+    monkeypatch.setenv("content_analyzer_price_input", "1000000")
+    monkeypatch.setenv("content_analyzer_plan_output_tokens", "10")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        prompt_path = Path(cache_dir) / "prompt.md"
+        prompt_path.write_text("Describe this", encoding="utf-8")
+        monkeypatch.setenv("content_analyzer_prompt_path", str(prompt_path))
+        cache = TokenCache(Path(cache_dir) / "tokens.db")
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.get_token_cache', lambda: cache)
+        response_cache = ResponseCache(Path(cache_dir) / "responses.db")
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.get_response_cache', lambda: response_cache)
+        before = {name: Path(temp_test_dir, name).read_text() for name in os.listdir(temp_test_dir)}
+
+        # 预估时每个文件的正文只读取一次
+        def read_twice(*args):
+            raise AssertionError("body read a second time")
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.hash_file_body', read_twice)
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.read_body', read_twice)
+
+        with patch('think_mcp_server.tools.content_analyzer.get_llm_pool') as mock_pool:
+            results = await analyze_content({"file_path": temp_test_dir, "dry_run": True, "concurrency": 2})
+            mock_pool.assert_not_called()
+
+        plan = json.loads(results[0].text)
+        assert plan["files"] == plan["to_analyze"] == plan["requests"] == 2
+        # 每个文件 3 个正文 token 加 2 个提示词 token
+        assert plan["input_tokens"] == 10
+        assert plan["estimated_cost"]["input"] == 10
+        assert plan["routing"] == content_analyzer._router().name
+        assert [entry["requests"] for entry in plan["models"].values()] == [2]
+        assert plan["estimated_output_tokens"] == 20
+        assert {name: Path(temp_test_dir, name).read_text() for name in os.listdir(temp_test_dir)} == before
+        encoder.encode.reset_mock()
+        await analyze_content({"file_path": temp_test_dir, "dry_run": True})
+        # 第二次预估命中 token 缓存，只统计提示词
+        assert encoder.encode.call_count == 2
+
+        # 响应已缓存的文件不计入请求和费用，也不影响缓存的命中统计
+        response_cache.put(
+            response_cache_key(content_analyzer._router().name, "Describe this", "Test content 1"), "model", "cached"
+        )
+        plan = json.loads((await analyze_content({"file_path": temp_test_dir, "dry_run": True}))[0].text)
+        assert (plan["to_analyze"], plan["cached_files"], plan["requests"], plan["input_tokens"]) == (2, 1, 1, 5)
+        assert response_cache.stats()["hits"] == 0
+
+        # 按路由选中的模型计价
+        model = content_analyzer.format_model_spec(content_analyzer._router().route(5)[0])
+        monkeypatch.setenv("content_analyzer_model_prices", f"{model}=500000:0")
+        plan = json.loads((await analyze_content({"file_path": temp_test_dir, "dry_run": True}))[0].text)
+        assert plan["estimated_cost"]["input"] == plan["models"][model]["cost"] == 2.5
+        monkeypatch.delenv("content_analyzer_model_prices")
+
+        # 无法读取的文件单独报告，不影响其他文件
+        def denied(file, *args):
+            if file.name == "test_0.txt":
+                raise PermissionError("Permission denied")
+            return False
+        monkeypatch.setattr('think_mcp_server.tools.content_analyzer.is_binary_file', denied)
+        plan = json.loads((await analyze_content({"file_path": temp_test_dir, "dry_run": True}))[0].text)
+        assert plan["files"] == 1
+        assert plan["errors"] == [{"file": str(Path(temp_test_dir, "test_0.txt")), "error": "Permission denied"}]
+        cache.close()
+        response_cache.close()
+
+@pytest.mark.asyncio
+async def test_stream_chat_reports_progress_and_truncates():
+    """Test that streamed chunks are forwarded as progress, cut off at the token ceiling and the stream closed."""
+    import threading
+    from types import SimpleNamespace
+    from think_mcp_server.tools.llm_pool import stream_chat
+    from think_mcp_server.tools.progress import current_progress, progress_scope
+
+    def chunk(text):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    closed = threading.Event()
+    released = threading.Event()
+
+    def chunks():
+        yield chunk("ab")
+        yield chunk(None)
+        yield chunk("cd")
+        # 模拟服务端不再发送数据：只有关闭连接才能让读取线程退出
+        closed.wait(5)
+        released.set()
+
+    response = MagicMock()
+    response.__iter__.return_value = chunks()
+    response.close.side_effect = closed.set
+    client = MagicMock()
+    client.system_prompt = None
+    client.messages = []
+    client.current_model = "model"
+    model_config = SimpleNamespace(max_completion_tokens=100, temperature=None)
+    client.model_types = {"llm": SimpleNamespace(providers={"p": SimpleNamespace(model={"model": model_config})})}
+    client.current_model_type, client.current_provider = "llm", "p"
+    client.client.chat.completions.create.return_value = response
+
+    session = MagicMock()
+    session.send_progress_notification = AsyncMock()
+    with progress_scope(session, "token") as reporter:
+        reporter.min_interval = 0
+        result = await stream_chat(
+            client, "hi", max_tokens=3, on_delta=lambda _: current_progress().advance(), count_tokens=len
+        )
+
+    # 按 token 数而不是按段数截断
+    assert result == "abcd"
+    assert client.client.chat.completions.create.call_args.kwargs["max_completion_tokens"] == 3
+    assert [call.args for call in session.send_progress_notification.call_args_list] == [
+        ("token", 1.0, None), ("token", 2.0, None)
+    ]
+    assert current_progress() is None
+    assert released.wait(1) and closed.is_set()
+
+@pytest.mark.asyncio
+async def test_stream_chat_idle_timer_starts_after_open(monkeypatch):
+    """Test that a stream queued behind a busy worker does not time out before it opens."""
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+    from think_mcp_server.tools import llm_pool
+
+    def make_client(chunks):
+        response = MagicMock()
+        response.__iter__.return_value = chunks
+        client = MagicMock()
+        client.system_prompt = None
+        client.messages = []
+        client.current_model = "model"
+        model_config = SimpleNamespace(max_completion_tokens=None, temperature=None)
+        client.model_types = {"llm": SimpleNamespace(providers={"p": SimpleNamespace(model={"model": model_config})})}
+        client.current_model_type, client.current_provider = "llm", "p"
+        client.client.chat.completions.create.return_value = response
+        return client
+
+    def chunk(text):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    release = threading.Event()
+
+    def slow_chunks():
+        release.wait(5)
+        yield chunk("slow")
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(llm_pool, "_stream_executor", executor)
+    slow = asyncio.ensure_future(llm_pool.stream_chat(make_client(slow_chunks()), "hi"))
+    await asyncio.sleep(0.05)
+    queued = asyncio.ensure_future(llm_pool.stream_chat(make_client(iter([chunk("fast")])), "hi", idle_timeout=0.1))
+    await asyncio.sleep(0.3)
+    release.set()
+    assert await asyncio.gather(slow, queued) == ["slow", "fast"]
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_model_router_routes_by_size_and_falls_back():
+    """Test size-based model selection, fallback on timeouts and per-model stats."""
+    from think_mcp_server.tools.model_router import ModelRouter, parse_model_spec, usage_scope
+
+    small = parse_model_spec("llm/cheap/Qwen/Qwen2.5-7B-Instruct")
+    large = parse_model_spec("llm/硅基流动/Pro/deepseek-ai/DeepSeek-V3")
+    backup = parse_model_spec("llm/backup/deepseek-chat")
+    assert small == ("llm", "cheap", "Qwen/Qwen2.5-7B-Instruct")
+    with pytest.raises(ValueError):
+        parse_model_spec("deepseek-chat")
+
+    router = ModelRouter(large, small, small_max_tokens=100, fallbacks=[backup])
+    assert router.route(100) == [small, backup]
+    assert router.route(101) == [large, backup]
+
+    async def request(model):
+        if model == large:
+            raise TimeoutError("stalled")
+        return model[1]
+
+    assert await router.call(50, 10, request) == "cheap"
+    with usage_scope() as usage:
+        assert await router.call(500, 20, request) == "backup"
+    assert await router.call(50, 10, request) == "cheap"
+    # 范围内只统计范围内的请求，进程内的累计统计包含全部请求
+    assert set(usage.snapshot()) == {"llm/硅基流动/Pro/deepseek-ai/DeepSeek-V3", "llm/backup/deepseek-chat"}
+    stats = router.stats()
+    assert stats["llm/硅基流动/Pro/deepseek-ai/DeepSeek-V3"]["failures"] == 1
+    assert stats["llm/backup/deepseek-chat"]["requests"] == stats["llm/backup/deepseek-chat"]["fallbacks"] == 1
+    assert stats["llm/cheap/Qwen/Qwen2.5-7B-Instruct"]["input_chars"] == 20
+
+    async def broken(model):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await router.call(500, 20, broken)
+    assert router.stats()["llm/backup/deepseek-chat"]["failures"] == 0
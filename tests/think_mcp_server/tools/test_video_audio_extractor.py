@@ -0,0 +1,121 @@
+"""Tests for video audio extractor."""
+import asyncio
+import sys
+import time
+import pytest
+from think_mcp_server.tools.video_audio_extractor import FFmpegError, run_ffmpeg
+
+FAKE_FFMPEG = """
+import sys, time
+sys.stderr.write("Input #0, mov,mp4\\n  Duration: 00:01:40.00, start: 0.000000\\n")
+for seconds in (25, 50, 75):
+    sys.stderr.write(f"size=  1kB time=00:00:{seconds}.00 bitrate= 1kbits/s\\r")
+    sys.stderr.flush()
+    time.sleep(float(sys.argv[1]))
+sys.exit(int(sys.argv[2]))
+"""
+
+
+def fake_ffmpeg(tmp_path, delay: float, status: int) -> list:
+    script = tmp_path / "fake_ffmpeg.py"
+    script.write_text(FAKE_FFMPEG, encoding="utf-8")
+    return [sys.executable, str(script), str(delay), str(status)]
+
+
+@pytest.mark.asyncio
+async def test_run_ffmpeg_reports_progress(tmp_path):
+    """Test that time= lines are parsed against the input duration."""
+    updates = []
+
+    async def on_progress(processed, duration):
+        updates.append((processed, duration))
+
+    await run_ffmpeg(fake_ffmpeg(tmp_path, 0, 0), timeout=30, on_progress=on_progress)
+    assert updates == [(25.0, 100.0), (50.0, 100.0), (75.0, 100.0)]
+
+    with pytest.raises(FFmpegError) as error:
+        await run_ffmpeg(fake_ffmpeg(tmp_path, 0, 1), timeout=30)
+    assert error.value.returncode == 1
+    assert "time=00:00:75.00" in error.value.stderr
+
+
+@pytest.mark.asyncio
+async def test_run_ffmpeg_kills_process_on_timeout_and_cancel(tmp_path):
+    """Test that a slow ffmpeg is killed on timeout and when the request is cancelled."""
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        await run_ffmpeg(fake_ffmpeg(tmp_path, 10, 0), timeout=0.5)
+    assert time.monotonic() - start < 5
+
+    task = asyncio.create_task(run_ffmpeg(fake_ffmpeg(tmp_path, 10, 0)))
+    await asyncio.sleep(0.5)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert time.monotonic() - start < 5
+
+
+def test_stream_copy_compatibility():
+    """Test which source codecs can be remuxed into each output format."""
+    from think_mcp_server.tools.video_audio_extractor import build_ffmpeg_command, can_stream_copy
+
+    assert can_stream_copy("aac", "m4a")
+    assert can_stream_copy("mp3", "MP3")
+    assert can_stream_copy("pcm_s16le", "wav")
+    assert can_stream_copy("eac3", "mka")
+    assert not can_stream_copy("aac", "mp3")
+    assert not can_stream_copy(None, "m4a")
+    assert not can_stream_copy("opus", "wma")
+    assert build_ffmpeg_command("in.mp4", "out.m4a", True)[3:7] == ["-map", "0:a:0", "-c:a", "copy"]
+    assert "-q:a" in build_ffmpeg_command("in.mp4", "out.mp3", False)
+
+
+FAKE_FFMPEG_BINARY = """#!/bin/sh
+echo "$0 $*" >> "${0%/*}/calls.log"
+case "$2" in
+  -version) echo "${0##*/} version 6.1.1 Copyright (c) 2000-2023 the FFmpeg developers" ;;
+  -encoders) printf 'Encoders:\\n V..... = Video\\n ------\\n V....D libx264  H.264\\n A....D aac      AAC\\n A....D libmp3lame  MP3\\n S..... srt  SubRip\\n' ;;
+  -muxers) printf 'File formats:\\n  .E = Muxing supported\\n  --\\n  E ipod            iPod H.264 MP4\\n  E mp3             MP3\\n D  aac             raw ADTS AAC\\n' ;;
+esac
+"""
+
+
+def test_ffmpeg_capabilities_are_detected_once_and_cached(tmp_path, monkeypatch):
+    """Test capability parsing, the in-process and on-disk caches, and refresh."""
+    from think_mcp_server.tools import ffmpeg_capabilities
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name in ("ffmpeg", "ffprobe"):
+        (bin_dir / name).write_text(FAKE_FFMPEG_BINARY, encoding="utf-8")
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir))
+    monkeypatch.setenv("cache_path", str(tmp_path / "cache"))
+    monkeypatch.setattr(ffmpeg_capabilities, "_capabilities", None)
+    calls = bin_dir / "calls.log"
+
+    capabilities = ffmpeg_capabilities.get_ffmpeg_capabilities()
+    assert capabilities["ffmpeg"] == {"path": str(bin_dir / "ffmpeg"), "version": "6.1.1"}
+    assert capabilities["ffprobe"]["version"] == "6.1.1"
+    assert capabilities["encoders"]["audio"] == ["aac", "libmp3lame"]
+    assert capabilities["muxers"] == ["ipod", "mp3"]
+    detect_calls = len(calls.read_text().splitlines())
+    assert detect_calls == 4
+
+    # 进程内和磁盘缓存都不再启动子进程
+    ffmpeg_capabilities.get_ffmpeg_capabilities()
+    monkeypatch.setattr(ffmpeg_capabilities, "_capabilities", None)
+    assert ffmpeg_capabilities.get_ffmpeg_capabilities() == capabilities
+    assert len(calls.read_text().splitlines()) == detect_calls
+
+    ffmpeg_capabilities.get_ffmpeg_capabilities(refresh=True)
+    assert len(calls.read_text().splitlines()) == 2 * detect_calls
+    assert not ffmpeg_capabilities.ffmpeg_binaries_changed()
+
+    # 检测失败与二进制的标识一起记录，二进制不变时不会触发重新检测
+    (bin_dir / "ffmpeg").write_text("#!/bin/sh\nexit 1\n", encoding="utf-8")
+    failed = ffmpeg_capabilities.get_ffmpeg_capabilities(refresh=True)
+    assert failed["ffmpeg"] is None and "ffmpeg_error" in failed
+    assert not ffmpeg_capabilities.ffmpeg_binaries_changed()
+    (bin_dir / "ffmpeg").write_text(FAKE_FFMPEG_BINARY, encoding="utf-8")
+    assert ffmpeg_capabilities.ffmpeg_binaries_changed()